@@ -1,263 +1,341 @@
-# app/pages/2_🧭_PCA.py
-import os
-import numpy as np
-import pandas as pd
-import streamlit as st
-import plotly.express as px
-from sklearn.decomposition import PCA
-
-# --- Dependencia del proyecto ---
-import cimcb_lite as cb  # requiere scipy<=1.11.4 o el shim numpy.interp según tu entorno
-
-st.set_page_config(page_title="PCA", page_icon="🧭", layout="wide")
-
-# ===============================
-# 1) CONFIG & CARGA DE DATOS
-# ===============================
-DEFAULT_XLSX = r"C:\Users\Momentum\Desktop\Claudia\Cursos\Bootcamp_Data_e_IA\Proyecto_EDA\study_data.xlsx"
-
-st.header("🧭 PCA — Metabolomics")
-
-xlsx_path = st.text_input("Ruta del archivo Excel (study_data.xlsx):", DEFAULT_XLSX)
-if not os.path.exists(xlsx_path):
-    st.error(f"No se encuentra el archivo: {xlsx_path}")
-    st.stop()
-
-@st.cache_data(show_spinner=False)
-def load_sheets(path):
-    sample_metadata = pd.read_excel(path, sheet_name="sample_metadata")
-    data_matrix     = pd.read_excel(path, sheet_name="data_matrix")
-    data_dictionary = pd.read_excel(path, sheet_name="data_dictionary")
-    return sample_metadata, data_matrix, data_dictionary
-
-sample_metadata, data_matrix, data_dictionary = load_sheets(xlsx_path)
-
-# ===============================
-# 2) CONSTRUIR hoja2 (como en tu notebook)
-#    - data_matrix_pca -> transpose -> dataTable
-#    - añadir Idx, Class, SampleID en primeras n filas
-# ===============================
-@st.cache_data(show_spinner=False)
-def build_hoja2(sample_metadata: pd.DataFrame, data_matrix: pd.DataFrame):
-    # Copia y añade Idx al data_matrix (como en tu notebook)
-    data_matrix_pca = data_matrix.copy()
-    data_matrix_pca["Idx"] = range(1, len(data_matrix_pca) + 1)
-
-    # Transponer a "matrix" y volver a DataFrame
-    matrix = data_matrix_pca.transpose()
-
-    # Añadir Idx secuencial a la matriz transpuesta
-    rn1 = range(1, len(matrix) + 1)
-    dataTable = matrix.assign(Idx=list(rn1))
-
-    # Crear columnas Class y SampleID en las primeras n filas (n = número de muestras)
-    n_samples = len(sample_metadata)
-    sample_rows = dataTable.iloc[:n_samples].copy()
-
-    # Asegúrate de que existen las columnas en sample_metadata
-    # En tu notebook usas 'Health' para clase y 'sample_id' para IDs
-    if "Health" not in sample_metadata.columns or "sample_id" not in sample_metadata.columns:
-        raise ValueError("El sample_metadata debe contener columnas 'Health' y 'sample_id'.")
-
-    # Asignar
-    sample_rows = sample_rows.assign(
-        Class    = list(sample_metadata["Health"]),
-        SampleID = list(sample_metadata["sample_id"])
-    )
-    # Reconstruir dataTable
-    hoja2 = pd.concat([sample_rows, dataTable.iloc[n_samples:]], axis=0)
-    hoja2 = hoja2.reset_index(drop=True)
-
-    return hoja2
-
-hoja2 = build_hoja2(sample_metadata, data_matrix)
-
-# ===============================
-# 3) CONSTRUIR hoja3 (como en tu notebook)
-#    - Idx = rango
-#    - renombrar compound_id->Name, BIOCHEMICAL->Label
-# ===============================
-@st.cache_data(show_spinner=False)
-def build_hoja3(data_dictionary: pd.DataFrame):
-    hoja3 = data_dictionary.copy()
-    hoja3 = hoja3.reset_index(drop=True)
-    hoja3["Idx"] = range(1, len(hoja3) + 1)
-    if "compound_id" in hoja3.columns:
-        hoja3 = hoja3.rename(columns={"compound_id": "Name"})
-    if "BIOCHEMICAL" in hoja3.columns:
-        hoja3 = hoja3.rename(columns={"BIOCHEMICAL": "Label"})
-    return hoja3
-
-hoja3 = build_hoja3(data_dictionary)
-
-# ===============================
-# 4) ARREGLO DE CABECERAS EN hoja2
-#    - Promociona primera fila a cabecera si columnas numeradas (0..N)
-#    - Preserva Idx, Class, SampleID
-#    - Convierte features (compound_####) a numérico
-#    - Alinea con hoja3['Name']
-# ===============================
-def _norm(s: str) -> str:
-    return str(s).strip().lower().replace(" ", "_").replace("-", "_")
-
-@st.cache_data(show_spinner=False)
-def clean_and_match(hoja2_in: pd.DataFrame, hoja3_in: pd.DataFrame):
-    h2 = hoja2_in.copy()
-
-    # Reordenar para dejar meta al final (sin perder columnas)
-    meta_cols = [c for c in ["Idx", "Class", "SampleID"] if c in h2.columns]
-    other_cols = [c for c in h2.columns if c not in meta_cols]
-    h2 = h2[other_cols + meta_cols]
-
-    # Detecta columnas numeradas y renómbralas usando la primera fila como cabecera si aplica
-    num_like_cols = [
-        c for c in h2.columns
-        if isinstance(c, (int, np.integer)) or (isinstance(c, str) and c.isdigit())
-    ]
-    if num_like_cols:
-        header_row = h2.loc[h2.index[0], num_like_cols].astype(str)
-        # ¿Se parecen a 'compound_####' o 'compound_id'?
-        mask_names = header_row.str.fullmatch(r"(compound_\d+|compound_id)", case=False)
-        if mask_names.mean() > 0.8:
-            rename_map = dict(zip(num_like_cols, header_row))
-            h2 = h2.rename(columns=rename_map)
-            # Si esa fila era textual, elimínala
-            is_header = pd.to_numeric(h2.loc[h2.index[0], list(rename_map.values())], errors="coerce").isna().any()
-            if is_header:
-                h2 = h2.iloc[1:].reset_index(drop=True)
-
-    # Normaliza ID si viene como compound_id
-    if "compound_id" in h2.columns and "SampleID" not in h2.columns:
-        h2 = h2.rename(columns={"compound_id": "SampleID"})
-
-    # Limpia filas sin SampleID
-    if "SampleID" in h2.columns:
-        h2 = h2[h2["SampleID"].notna()].reset_index(drop=True)
-
-    # Features = columnas que empiezan por 'compound_'
-    meta_cols = [c for c in ["Idx", "Class", "SampleID"] if c in h2.columns]
-    feature_cols = [c for c in h2.columns if isinstance(c, str) and c.startswith("compound_") and c not in meta_cols]
-    # A numérico solo features
-    if feature_cols:
-        h2[feature_cols] = h2[feature_cols].apply(pd.to_numeric, errors="coerce")
-
-    # Alinear con hoja3['Name']
-    if "Name" not in hoja3_in.columns:
-        raise ValueError("La hoja3 debe tener una columna 'Name' con los compound_id.")
-
-    peaklist_raw = hoja3_in["Name"].dropna().astype(str).tolist()
-    presentes = [c for c in peaklist_raw if c in h2.columns]
-    if not presentes:
-        col_map = {_norm(c): c for c in feature_cols}
-        presentes = [col_map[_norm(p)] for p in peaklist_raw if _norm(p) in col_map]
-
-    return h2, presentes, peaklist_raw
-
-hoja2, presentes, peaklist_raw = clean_and_match(hoja2, hoja3)
-st.caption(f"Emparejadas (hoja2 vs hoja3['Name']): {len(presentes)} / {len(peaklist_raw)}")
-
-# ===============================
-# 5) UI: método de escalado y filtro de clases
-# ===============================
-ALLOWED = {"auto", "pareto", "vast", "level", "range"}
-ALIASES = {
-    "autoscale": "auto", "zscore": "auto", "z-score": "auto", "standard": "auto",
-    "paretto": "pareto", "pareto scaling": "pareto",
-    "vast scaling": "vast", "level scaling": "level", "range scaling": "range",
-    "none": "auto", "": "auto", None: "auto",
-}
-
-def sanitize_scale_method(value):
-    key = "auto" if value is None else str(value).strip().lower()
-    key = ALIASES.get(key, key)
-    return key if key in ALLOWED else "auto"
-
-col1, col2 = st.columns(2)
-with col1:
-    options = {
-        "Auto (z-score)": "auto",
-        "Pareto": "pareto",
-        "VAST": "vast",
-        "Level": "level",
-        "Range": "range",
-    }
-    choice = st.selectbox("Scaling method", list(options.keys()))
-    scale_method = sanitize_scale_method(options[choice])
-with col2:
-    filter_two = st.checkbox("Mostrar PCA solo para Healthy vs diabetic", value=False)
-
-# ===============================
-# 6) PCA PIPELINE (log10 seguro + scale + KNN + PCA Plotly)
-# ===============================
-def pca_pipeline(df: pd.DataFrame, feat_cols: list, class_col: str = "Class", method: str = "auto"):
-    if not feat_cols:
-        st.error("No hay columnas de features para PCA.")
-        st.stop()
-
-    X = df[feat_cols].to_numpy()
-
-    # Log10 seguro
-    pos_mask = (X > 0)
-    minpos = np.nanmin(X[pos_mask]) if np.any(pos_mask) else 1e-6
-    X = np.where(~pos_mask | np.isnan(X), minpos * 0.5, X)
-    Xlog = np.log10(X)
-
-    # Escalado con cimcb_lite (sanitizado)
-    method = sanitize_scale_method(method)
-    try:
-        Xscale = cb.utils.scale(Xlog, method=method)
-    except ValueError:
-        st.info(f"Método '{method}' no válido para cimcb_lite. Se usa 'auto'.")
-        Xscale = cb.utils.scale(Xlog, method="auto")
-        method = "auto"
-
-    # Imputación kNN
-    Xknn = cb.utils.knnimpute(Xscale, k=3)
-    st.write(f"Xknn: {Xknn.shape[0]} filas × {Xknn.shape[1]} variables | método: **{method}**")
-
-    # PCA con scikit-learn (para graficar estable en Streamlit)
-    pca = PCA(n_components=2, random_state=42)
-    scores = pca.fit_transform(Xknn)
-    var_exp = pca.explained_variance_ratio_
-
-    # DataFrame de scores
-    if class_col in df.columns:
-        classes = df[class_col].astype(str).values
-    else:
-        classes = np.array(["NA"] * len(df))
-
-    sample_ids = df["SampleID"].astype(str).values if "SampleID" in df.columns else np.arange(len(df)).astype(str)
-
-    df_scores = pd.DataFrame({
-        "PC1": scores[:, 0],
-        "PC2": scores[:, 1],
-        "Class": classes,
-        "SampleID": sample_ids
-    })
-
-    title = f"PCA — PC1 {var_exp[0]:.1%} | PC2 {var_exp[1]:.1%}"
-    fig = px.scatter(
-        df_scores, x="PC1", y="PC2", color="Class",
-        hover_data=["SampleID"], title=title
-    )
-    st.plotly_chart(fig, use_container_width=True)
-
-    return Xknn, var_exp, df_scores
-
-# --- PCA (todos los grupos)
-st.subheader("PCA — Todos los grupos")
-Xknn_all, var_all, scores_all = pca_pipeline(hoja2, presentes, class_col="Class", method=scale_method)
-
-# --- PCA filtrado (Healthy vs diabetic)
-if filter_two:
-    st.subheader("PCA — Healthy vs diabetic")
-    if "Class" in hoja2.columns:
-        filt = hoja2["Class"].isin(["Healthy", "diabetic"])
-        df_two = hoja2.loc[filt].copy()
-        common_feats = [c for c in presentes if c in df_two.columns]
-        if len(df_two) > 0 and common_feats:
-            Xknn_two, var_two, scores_two = pca_pipeline(df_two, common_feats, class_col="Class", method=scale_method)
-        else:
-            st.warning("No hay datos suficientes tras el filtro.")
-    else:
-        st.warning("No existe la columna 'Class' para filtrar grupos.")
+# app/pages/2_🧭_PCA.py
+import io
+import os
+import sys
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# --- Dependencia del proyecto ---
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from src.config import get_config, get_paths, get_cache_settings, get_prefilter_settings, get_viz_settings
+from src.io_utils import load_excel_cached
+from src.pca_store import PCAResultStore
+from src.pca_utils import PCAModel, compound_annotations, top_loadings
+from src.prefilter import prefilter_from_settings
+from src.preprocess import (
+    Preprocessor, feature_cache_key, feature_table, load_cached_preprocessor, match_peaklist, preprocess_cached,
+    sample_feature_block,
+)
+from src.projection import PCAArtifact, samples_frame
+from src.resampling import bootstrap_pca
+from src.viz import add_confidence_ellipses, overlay_projected_samples, pca_scores_figure
+
+st.set_page_config(page_title="PCA", page_icon="🧭", layout="wide")
+
+# ===============================
+# 1) CONFIG & CARGA DE DATOS (loader tipado + caché Parquet)
+# ===============================
+config = get_config()
+paths = get_paths(config)
+cache_settings = get_cache_settings(config)
+prefilter_cfg = get_prefilter_settings(config)
+pca_cfg = config.get("pca", {})
+viz_cfg = get_viz_settings(config)
+
+st.header("🧭 PCA — Metabolomics")
+
+xlsx_path = st.text_input("Ruta del archivo Excel (study_data.xlsx):", paths["data_path"])
+if not os.path.exists(xlsx_path):
+    st.error(f"No se encuentra el archivo: {xlsx_path}")
+    st.stop()
+
+@st.cache_data(show_spinner=False)
+def load_sheets(path):
+    return load_excel_cached(
+        path,
+        paths["meta_sheet"],
+        paths["matrix_sheet"],
+        paths["dict_sheet"],
+        cache_dir=Path(cache_settings["cache_dir"]) / "workbooks",
+        max_bytes=cache_settings["max_bytes"],
+    )
+
+sample_metadata, data_matrix, data_dictionary = load_sheets(xlsx_path)
+
+# ===============================
+# 2) CONSTRUIR hoja2 tipada
+#    - bloque float muestras × compuestos (sin transponer objetos)
+#    - metadatos aparte: SampleID, Idx, Class (por etiqueta de muestra)
+# ===============================
+@st.cache_data(show_spinner=False)
+def build_hoja2(sample_metadata: pd.DataFrame, data_matrix: pd.DataFrame, data_dictionary: pd.DataFrame):
+    if "Health" not in sample_metadata.columns or "sample_id" not in sample_metadata.columns:
+        raise ValueError("El sample_metadata debe contener columnas 'Health' y 'sample_id'.")
+
+    sample_info, block, compounds = sample_feature_block(data_matrix, sample_metadata)
+    hoja2 = feature_table(sample_info, block, compounds)
+
+    # Alinear con data_dictionary['compound_id'] (hoja3['Name'])
+    positions, peaklist_raw = match_peaklist(compounds, data_dictionary)
+    presentes = [compounds[j] for j in positions]
+    return hoja2, presentes, peaklist_raw
+
+hoja2, presentes, peaklist_raw = build_hoja2(sample_metadata, data_matrix, data_dictionary)
+st.caption(f"Emparejadas (hoja2 vs hoja3['Name']): {len(presentes)} / {len(peaklist_raw)}")
+
+# Prefiltro opcional (preprocessing.prefilter): descarta compuestos con muchos
+# faltantes, casi constantes o con RSD alto en QC antes de log/escalado/kNN
+@st.cache_data(show_spinner=False)
+def prefilter_presentes(hoja2: pd.DataFrame, presentes: list):
+    keep, report = prefilter_from_settings(
+        hoja2[presentes].to_numpy(dtype=float), presentes, prefilter_cfg, hoja2["Class"]
+    )
+    return [c for c, k in zip(presentes, keep) if k], report
+
+if prefilter_cfg["enabled"]:
+    presentes, prefilter_report = prefilter_presentes(hoja2, presentes)
+    st.caption(f"Prefiltro: {len(prefilter_report)} compuestos descartados, {len(presentes)} se usan en el PCA")
+    if not prefilter_report.empty:
+        with st.expander("Compuestos descartados"):
+            st.dataframe(prefilter_report)
+
+# ===============================
+# 3) UI: método de escalado y filtro de clases
+# ===============================
+ALLOWED = {"auto", "pareto", "vast", "level", "range"}
+ALIASES = {
+    "autoscale": "auto", "zscore": "auto", "z-score": "auto", "standard": "auto",
+    "paretto": "pareto", "pareto scaling": "pareto",
+    "vast scaling": "vast", "level scaling": "level", "range scaling": "range",
+    "none": "auto", "": "auto", None: "auto",
+}
+
+def sanitize_scale_method(value):
+    key = "auto" if value is None else str(value).strip().lower()
+    key = ALIASES.get(key, key)
+    return key if key in ALLOWED else "auto"
+
+col1, col2, col3 = st.columns(3)
+with col1:
+    options = {
+        "Auto (z-score)": "auto",
+        "Pareto": "pareto",
+        "VAST": "vast",
+        "Level": "level",
+        "Range": "range",
+    }
+    choice = st.selectbox("Scaling method", list(options.keys()))
+    scale_method = sanitize_scale_method(options[choice])
+with col2:
+    # Se ajusta una sola vez con n_components; cambiar el par de PCs no reajusta
+    n_components = int(pca_cfg.get("n_components", 10))
+    pc_options = list(range(1, n_components + 1))
+    pcx = st.selectbox("PC eje X", pc_options, index=min(int(pca_cfg.get("pcx", 1)), n_components) - 1)
+    pcy = st.selectbox("PC eje Y", pc_options, index=min(int(pca_cfg.get("pcy", 2)), n_components) - 1)
+with col3:
+    filter_two = st.checkbox("Mostrar PCA solo para Healthy vs diabetic", value=False)
+    # Reajustes bootstrap + permutaciones de etiquetas: bajo demanda (segundos)
+    run_stability = st.checkbox("Estabilidad (bootstrap + permutaciones)", value=False)
+
+# Nuevas muestras (QC o pacientes) a proyectar sobre el PCA existente, sin reajustar
+new_file = st.file_uploader(
+    "Proyectar nuevas muestras (hoja data_matrix .xlsx o .csv: compuestos × muestras)",
+    type=["xlsx", "csv"],
+)
+
+@st.cache_data(show_spinner=False)
+def load_new_samples(content: bytes, name: str) -> pd.DataFrame:
+    buffer = io.BytesIO(content)
+    if name.lower().endswith(".csv"):
+        raw = pd.read_csv(buffer)
+    else:
+        sheets = pd.read_excel(buffer, sheet_name=None)
+        raw = sheets.get(paths["matrix_sheet"], next(iter(sheets.values())))
+    return samples_frame(raw)
+
+new_samples = load_new_samples(new_file.getvalue(), new_file.name) if new_file is not None else None
+
+# Etiquetas de compuestos (BIOCHEMICAL, SUPER_PATHWAY...) indexadas por nombre normalizado
+annotations = st.cache_data(show_spinner=False)(compound_annotations)(data_dictionary)
+
+# ===============================
+# 4) PCA PIPELINE (log10 seguro + scale + KNN + PCA Plotly)
+#    - cohorte preprocesada una vez por método (caché en disco features/)
+#    - modelos PCA en un almacén en disco (pca/) por huella de datos + subconjunto
+#      + ajustes: cambiar widgets es una consulta + re-render
+# ===============================
+pca_store = PCAResultStore(Path(cache_settings["cache_dir"]) / "pca", max_bytes=cache_settings["max_bytes"])
+
+def preprocess_cohort(df: pd.DataFrame, feat_cols: list, method: str):
+    # Log10 seguro (minpos * 0.5) + escalado (sanitizado) + imputación kNN,
+    # compartidos con las demás páginas a través de la caché en disco
+    X = df[feat_cols].to_numpy(dtype=float)
+    data_key = feature_cache_key(X, method, 3, 0.5)
+    Xknn = preprocess_cached(
+        X, scale_method=method, knn_k=3, log_offset=0.5,
+        cache_dir=Path(cache_settings["cache_dir"]) / "features",
+        max_bytes=cache_settings["max_bytes"], key=data_key,
+    )
+    return Xknn, data_key
+
+def fit_pca(Xknn: np.ndarray, data_key: str, rows=None) -> PCAModel:
+    # Solver elegido según la forma (SVD completa / aleatorizada / truncada), o
+    # por lotes de muestras (memoria acotada por batch_size) si incremental
+    return pca_store.get_or_fit(
+        Xknn, data_key, rows=rows,
+        n_components=n_components,
+        incremental=bool(pca_cfg.get("incremental", False)),
+        batch_size=pca_cfg.get("batch_size"),
+    )
+
+@st.cache_resource(show_spinner=False)
+def build_artifact(
+    _df: pd.DataFrame, _Xknn: np.ndarray, feat_cols: list, class_col: str, method: str, data_key: str, rows=None
+) -> PCAArtifact:
+    # Preprocesador ajustado + modelo PCA + etiquetas: todo lo necesario para proyectar.
+    # Clave: data_key (huella de la cohorte preprocesada); el preprocesador y el PCA
+    # salen de las cachés en disco, solo se reajusta si la entrada es antigua
+    pre = load_cached_preprocessor(
+        data_key, Path(cache_settings["cache_dir"]) / "features",
+        max_bytes=cache_settings["max_bytes"], feature_names=feat_cols,
+    )
+    if pre is None:
+        pre = Preprocessor(method, knn_k=3, log_offset=0.5)
+        pre.fit(_df[feat_cols], feature_names=feat_cols)
+    view = _df if rows is None else _df.iloc[list(rows)]
+    return PCAArtifact(
+        pre,
+        fit_pca(_Xknn, data_key, None if rows is None else np.asarray(rows)),
+        labels=view[class_col] if class_col in view.columns else None,
+        sample_ids=view["SampleID"] if "SampleID" in view.columns else None,
+        metadata={"source": os.path.basename(xlsx_path), "prefilter": prefilter_cfg["enabled"]},
+    )
+
+@st.cache_data(show_spinner="Bootstrap y permutaciones…")
+def stability(Xknn: np.ndarray, classes: np.ndarray, sample_ids: np.ndarray, pcx: int, pcy: int) -> dict:
+    boot_cfg = pca_cfg.get("bootstrap", {})
+    return bootstrap_pca(
+        Xknn, classes,
+        n_boot=int(boot_cfg.get("n_boot", 200)),
+        n_perm=int(boot_cfg.get("n_perm", 1000)),
+        confidence=float(boot_cfg.get("confidence", 0.95)),
+        pcx=pcx, pcy=pcy,
+        n_jobs=boot_cfg.get("n_jobs"),
+        sample_ids=sample_ids,
+    )
+
+def pca_pipeline(
+    df: pd.DataFrame,
+    feat_cols: list,
+    Xknn: np.ndarray,
+    data_key: str,
+    rows: np.ndarray = None,
+    class_col: str = "Class",
+    method: str = "auto",
+    new_samples: pd.DataFrame = None,
+    export: bool = False,
+):
+    # rows: subconjunto de muestras (posiciones en df/Xknn) cortado de la cohorte ya preprocesada
+    cohort = df
+    rows_key = None if rows is None else tuple(int(r) for r in rows)
+    if rows is not None:
+        df = df.iloc[rows]
+    st.write(f"Xknn: {len(df)} filas × {Xknn.shape[1]} variables | método: **{method}**")
+
+    model = fit_pca(Xknn, data_key, rows)
+    k = model.components_.shape[0]
+    if max(pcx, pcy) > k:
+        st.warning(f"Solo hay {k} componentes para estos datos; se muestran PC1 y PC2.")
+    x_pc, y_pc = (pcx, pcy) if max(pcx, pcy) <= k else (1, min(2, k))
+
+    if class_col in df.columns:
+        classes = df[class_col].astype(str).values
+    else:
+        classes = np.array(["NA"] * len(df))
+
+    sample_ids = df["SampleID"].astype(str).values if "SampleID" in df.columns else np.arange(len(df)).astype(str)
+
+    # WebGL por encima de webgl_threshold puntos; submuestreo en servidor por encima de downsample_threshold
+    fig = pca_scores_figure(model, classes, pcx=x_pc, pcy=y_pc, sample_ids=sample_ids, **viz_cfg)
+    if fig.layout.meta["n_shown"] < fig.layout.meta["n_points"]:
+        st.caption(
+            f"Se dibujan {fig.layout.meta['n_shown']:,} de {fig.layout.meta['n_points']:,} muestras "
+            "(submuestreo por densidad; se conservan los atípicos)."
+        )
+
+    if new_samples is not None:
+        try:
+            start = time.perf_counter()
+            artifact = build_artifact(cohort, Xknn, feat_cols, class_col, method, data_key, rows_key)
+            projected = artifact.project(new_samples)
+            elapsed_ms = 1000 * (time.perf_counter() - start)
+        except ValueError as e:
+            st.error(f"No se pudieron proyectar las nuevas muestras: {e}")
+        else:
+            overlay_projected_samples(
+                fig, projected[:, [x_pc - 1, y_pc - 1]], new_samples.index, name="Nuevas muestras"
+            )
+            st.caption(f"Proyectadas {len(new_samples)} muestras nuevas en {elapsed_ms:.1f} ms (sin reajustar el PCA)")
+
+    if run_stability and class_col in df.columns and df[class_col].nunique() >= 2:
+        X_view = Xknn if rows is None else Xknn[rows]
+        res = stability(X_view, df[class_col].to_numpy(dtype=object), sample_ids, x_pc, y_pc)
+        add_confidence_ellipses(fig, res["group_ellipses"])
+        lo, hi = res["separation_ci"]
+        tp = res["throughput"]
+        st.caption(
+            f"Separación (silhouette): {res['separation']:.3f} [IC {lo:.3f}, {hi:.3f}] | "
+            f"p permutación = {res['perm_pvalue']:.4f} | "
+            f"{tp['fits']} ajustes en {tp['wall_seconds']:.1f}s con {tp['workers']} procesos "
+            f"({tp['fits_per_second_per_core']:.1f} ajustes/s por núcleo)"
+        )
+        with st.expander("Elipses de confianza por muestra (bootstrap)"):
+            st.dataframe(res["sample_ellipses"])
+    st.plotly_chart(fig, use_container_width=True)
+
+    # Compuestos con mayor |loading| en el par de PCs (argpartition sobre el modelo guardado)
+    with st.expander(f"Loadings principales — PC{x_pc} / PC{y_pc}"):
+        top_k = st.number_input("Compuestos por componente", 1, len(feat_cols), min(15, len(feat_cols)),
+                                key=f"top_k_{'all' if rows is None else 'subset'}")
+        st.dataframe(
+            top_loadings(model, feat_cols, k=int(top_k), components=sorted({x_pc, y_pc}), annotations=annotations),
+            hide_index=True,
+        )
+
+    if export:
+        # Se serializa en memoria solo al pulsar el botón (nada en disco por rerun)
+        st.download_button(
+            "Descargar modelo PCA (.npz)",
+            lambda: build_artifact(cohort, Xknn, feat_cols, class_col, method, data_key, rows_key).to_bytes(),
+            file_name=f"pca_{method}.npz", mime="application/octet-stream",
+        )
+
+    scores, var_exp = model.pair(x_pc, y_pc)
+    df_scores = pd.DataFrame({
+        f"PC{x_pc}": scores[:, 0],
+        f"PC{y_pc}": scores[:, 1],
+        "Class": classes,
+        "SampleID": sample_ids
+    })
+    return var_exp, df_scores
+
+if not presentes:
+    st.error("No hay columnas de features para PCA.")
+    st.stop()
+
+Xknn_all, data_key = preprocess_cohort(hoja2, presentes, scale_method)
+
+# --- PCA (todos los grupos)
+st.subheader("PCA — Todos los grupos")
+var_all, scores_all = pca_pipeline(
+    hoja2, presentes, Xknn_all, data_key, class_col="Class", method=scale_method,
+    new_samples=new_samples, export=True,
+)
+
+# --- PCA filtrado (Healthy vs diabetic): filas de la cohorte ya preprocesada
+if filter_two:
+    st.subheader("PCA — Healthy vs diabetic")
+    if "Class" in hoja2.columns:
+        rows = np.flatnonzero(hoja2["Class"].isin(["Healthy", "diabetic"]).to_numpy())
+        if len(rows) > 0:
+            st.caption("Escalado e imputación de la cohorte completa; el PCA se ajusta sobre el subconjunto.")
+            var_two, scores_two = pca_pipeline(
+                hoja2, presentes, Xknn_all, data_key, rows=rows, class_col="Class", method=scale_method
+            )
+        else:
+            st.warning("No hay datos suficientes tras el filtro.")
+    else:
+        st.warning("No existe la columna 'Class' para filtrar grupos.")
@@ -0,0 +1,73 @@
+"""
+Benchmark: typed build_feature_matrix vs the legacy transpose/apply path.
+
+The legacy path (data_matrix.copy() → .T → reset_index → copy →
+apply(pd.to_numeric) per compound) is reproduced here for comparison; both
+finish with the same Preprocessor, so differences come from extraction.
+
+Usage:
+    python benchmarks/bench_feature_matrix.py [n_samples] [n_compounds]
+"""
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.preprocess import Preprocessor, build_feature_matrix
+
+
+def _legacy(data_matrix, data_dict, meta):
+    matrix_t = data_matrix.copy().set_index("compound_id").T
+    matrix_t = matrix_t.reset_index(drop=False)
+    matrix_t.columns.name = None
+    matrix_t = matrix_t.rename(columns={matrix_t.columns[0]: "SampleID"})
+    matrix_t["Idx"] = range(1, len(matrix_t) + 1)
+    health = dict(zip(meta["sample_id"].astype(str), meta["Health"]))
+    matrix_t["Class"] = matrix_t["SampleID"].astype(str).map(health)
+    hoja2 = matrix_t.copy()
+    peaklist = data_dict["compound_id"].astype(str).tolist()
+    X = hoja2[peaklist].apply(pd.to_numeric, errors="coerce").to_numpy()
+    return hoja2, Preprocessor("auto").fit_transform(X), peaklist
+
+
+def _measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main(n_samples: int = 2000, n_compounds: int = 1500) -> None:
+    rng = np.random.default_rng(0)
+    samples = [f"sample_{i:05d}" for i in range(n_samples)]
+    compounds = [f"compound_{i:05d}" for i in range(n_compounds)]
+    values = rng.lognormal(10, 2, size=(n_compounds, n_samples))
+    values[rng.random(values.shape) < 0.05] = np.nan
+    data_matrix = pd.DataFrame(values, columns=samples)
+    data_matrix.insert(0, "compound_id", compounds)
+    data_dict = pd.DataFrame({"compound_id": compounds, "BIOCHEMICAL": compounds})
+    meta = pd.DataFrame({"sample_id": samples, "Health": ["Healthy", "Diabetes"] * (n_samples // 2)
+                         + ["Healthy"] * (n_samples % 2)})
+    del values
+
+    mb = n_samples * n_compounds * 8 / 1e6
+    print(f"data_matrix: {n_compounds} compounds × {n_samples} samples ({mb:.1f} MB as float64)")
+
+    (_, X_old, _), t_old, m_old = _measure(lambda: _legacy(data_matrix, data_dict, meta))
+    (_, X_new, _), t_new, m_new = _measure(lambda: build_feature_matrix(data_matrix, data_dict, meta))
+    print(f"{'':8s} {'seconds':>8s} {'peak MB':>9s} {'peak / matrix':>14s}")
+    print(f"{'legacy':8s} {t_old:8.2f} {m_old / 1e6:9.1f} {m_old / 1e6 / mb:14.1f}")
+    print(f"{'typed':8s} {t_new:8.2f} {m_new / 1e6:9.1f} {m_new / 1e6 / mb:14.1f}")
+    print(f"max |Δ Xknn| = {np.nanmax(np.abs(X_old - X_new)):.2e}")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:3]))
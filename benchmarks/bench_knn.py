@@ -0,0 +1,46 @@
+"""
+Benchmark: src.impute.knn_impute vs cimcb_lite.utils.knnimpute.
+
+Usage:
+    python benchmarks/bench_knn.py [n_samples] [n_features] [missing_frac]
+"""
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import cimcb_lite as cb
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.impute import knn_impute
+
+
+def main(n_samples: int = 2000, n_features: int = 1500, missing_frac: float = 0.02) -> None:
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(n_samples, n_features))
+    # Keep a block of complete compounds so distances are defined
+    holes = rng.random(X.shape) < missing_frac
+    holes[:, : n_features // 5] = False
+    X[holes] = np.nan
+    print(f"X: {n_samples} × {n_features} float64, {int(holes.sum())} missing values")
+
+    start = time.perf_counter()
+    ref = cb.utils.knnimpute(X, k=3)
+    t_ref = time.perf_counter() - start
+
+    for n_jobs in (1, None):
+        start = time.perf_counter()
+        out = knn_impute(X, k=3, n_jobs=n_jobs)
+        t_new = time.perf_counter() - start
+        diff = np.nanmax(np.abs(out - ref))
+        label = "all CPUs" if n_jobs is None else f"{n_jobs} thread"
+        print(
+            f"cimcb {t_ref:7.2f} s | native ({label}) {t_new:6.2f} s "
+            f"({t_ref / t_new:5.1f}x) | max |Δ| {diff:.2e}"
+        )
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:4]
+    main(*(int(a) for a in args[:2]), *(float(a) for a in args[2:3]))
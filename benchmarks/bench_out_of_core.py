@@ -0,0 +1,55 @@
+"""
+Benchmark: out-of-core preprocess_store vs in-memory Preprocessor.fit_transform.
+
+Usage:
+    python benchmarks/bench_out_of_core.py [n_samples] [n_features] [budget_mb]
+"""
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.matrix_store import MatrixStore
+from src.out_of_core import preprocess_store
+from src.preprocess import Preprocessor
+
+
+def _measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main(n_samples: int = 500, n_features: int = 50000, budget_mb: int = 64) -> None:
+    rng = np.random.default_rng(0)
+    X = rng.lognormal(3, 1, size=(n_samples, n_features))
+    X[rng.random(X.shape) < 0.05] = 0.0
+    print(f"X: {n_samples} × {n_features} float64 ({X.nbytes / 1e6:.1f} MB), budget {budget_mb} MB")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = MatrixStore(tmp)
+        store.write("raw", X, [f"S{i}" for i in range(n_samples)], [f"C{j}" for j in range(n_features)])
+
+        ref, t_ref, m_ref = _measure(lambda: Preprocessor("auto").fit_transform(X))
+        _, t_new, m_new = _measure(
+            lambda: preprocess_store(store, memory_budget=budget_mb * 2**20)
+        )
+        out, _, _ = store.read("preprocessed")
+        diff = np.nanmax(np.abs(out - ref))
+        print(f"{'path':12s} {'s':>8s} {'peak MB':>9s}")
+        print(f"{'in-memory':12s} {t_ref:8.3f} {m_ref / 1e6:9.1f}")
+        print(f"{'out-of-core':12s} {t_new:8.3f} {m_new / 1e6:9.1f}")
+        print(f"max |Δ| = {diff:.2e}")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:4]))
@@ -0,0 +1,43 @@
+"""
+Benchmark: PCAModel (auto solver, float32/float64) and IncrementalPCAModel vs full sklearn PCA.
+
+Usage:
+    python benchmarks/bench_pca.py [n_samples] [n_features] [n_components]
+"""
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from sklearn.decomposition import PCA
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.pca_utils import IncrementalPCAModel, PCAModel
+
+
+def main(n_samples: int = 4000, n_features: int = 8000, n_components: int = 10) -> None:
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(n_samples, 30)) @ rng.normal(size=(30, n_features))
+    X += rng.normal(size=X.shape)
+    print(f"X: {n_samples} × {n_features} float64 ({X.nbytes / 1e6:.1f} MB), k={n_components}")
+
+    start = time.perf_counter()
+    ref = PCA(n_components=n_components, svd_solver="full").fit(X)
+    t_ref = time.perf_counter() - start
+    print(f"{'engine':28s} {'s':>8s} {'max |Δ var ratio|':>18s}")
+    print(f"{'sklearn full':28s} {t_ref:8.2f} {0.0:18.2e}")
+
+    for dtype in (np.float64, np.float32):
+        model = PCAModel(n_components=n_components, dtype=dtype).fit(X)
+        diff = np.abs(model.explained_variance_ratio_ - ref.explained_variance_ratio_).max()
+        name = f"PCAModel {model.solver_} {np.dtype(dtype).name}"
+        print(f"{name:28s} {model.fit_seconds_:8.2f} {diff:18.2e}")
+
+    inc = IncrementalPCAModel(n_components=n_components, batch_size=500).fit(X)
+    diff = np.abs(inc.explained_variance_ratio_ - ref.explained_variance_ratio_).max()
+    print(f"{'IncrementalPCAModel b=500':28s} {inc.fit_seconds_:8.2f} {diff:18.2e}")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:4]))
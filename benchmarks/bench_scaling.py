@@ -0,0 +1,50 @@
+"""
+Benchmark: src.scaling.Scaler vs cimcb_lite.utils.scale.
+
+Usage:
+    python benchmarks/bench_scaling.py [n_samples] [n_features]
+"""
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import cimcb_lite as cb
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.scaling import SCALE_METHODS, Scaler
+
+
+def _measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main(n_samples: int = 2000, n_features: int = 1500) -> None:
+    rng = np.random.default_rng(0)
+    X = np.log10(rng.lognormal(size=(n_samples, n_features)))
+    X[rng.random(X.shape) < 0.05] = np.nan
+    mb = X.nbytes / 1e6
+    print(f"X: {n_samples} × {n_features} float64 ({mb:.1f} MB)")
+    print(f"{'method':8s} {'cimcb s':>9s} {'native s':>9s} {'cimcb MB':>9s} {'native MB':>10s} {'max |Δ|':>9s}")
+
+    for method in SCALE_METHODS:
+        ref, t_ref, m_ref = _measure(lambda: cb.utils.scale(X, method=method))
+        work = X.copy()  # in-place target, allocated outside the measurement
+        out, t_new, m_new = _measure(lambda: Scaler(method).fit_transform(work, copy=False))
+        diff = np.nanmax(np.abs(out - ref))
+        print(
+            f"{method:8s} {t_ref:9.3f} {t_new:9.3f} {m_ref / 1e6:9.1f} "
+            f"{m_new / 1e6:10.1f} {diff:9.2e}"
+        )
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:3]))
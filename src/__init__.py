@@ -1,4 +1,4 @@
-"""
-Metabolomics EDA modular package.
-"""
-__version__ = "1.0.0"
+"""
+Metabolomics EDA modular package.
+"""
+__version__ = "1.0.0"
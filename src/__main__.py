@@ -0,0 +1,7 @@
+"""
+Entry point for ``python -m src``: run the batch analysis pipeline.
+"""
+from src.pipeline import main
+
+if __name__ == "__main__":
+    main()
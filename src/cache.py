@@ -0,0 +1,346 @@
+"""
+Size-bounded on-disk cache for intermediate results (workbooks, matrices).
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+_ENTRY_FILE = "_entry.json"
+_STATS_FILE = "_stats.json"
+
+
+def file_fingerprint(file_path: Union[str, Path], chunk_size: int = 1 << 20) -> str:
+    """
+    Fingerprint a file by content hash and modification time.
+
+    Parameters
+    ----------
+    file_path : str or Path
+        File to fingerprint.
+    chunk_size : int
+        Read size in bytes for hashing.
+
+    Returns
+    -------
+    str
+        Key of the form '<sha256[:32]>-<mtime_ns>'.
+    """
+    path = Path(file_path)
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return f"{digest.hexdigest()[:32]}-{path.stat().st_mtime_ns}"
+
+
+def parquet_compatible(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Shallow copy of a frame as it reads back from Parquet.
+
+    Column labels become strings and object columns mixing numbers with text
+    are stored as strings (missing values stay missing); columns of tuples
+    (stored as Parquet lists) and other columns are shared with the input.
+    ``attrs`` are dropped (they are not JSON-able in general); store them
+    separately.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Frame to normalize.
+
+    Returns
+    -------
+    pd.DataFrame
+        Normalized frame.
+    """
+    out = df.copy(deep=False)
+    out.attrs = {}
+    out.columns = out.columns.astype(str)
+    for col in out.columns[out.dtypes == object]:
+        if pd.api.types.infer_dtype(out[col], skipna=True).startswith("mixed") and not is_tuple_column(out[col]):
+            out[col] = out[col].astype(str).where(out[col].notna())
+    return out
+
+
+def is_tuple_column(values: pd.Series) -> bool:
+    """Whether every non-missing value of an object column is a tuple (e.g. 95% CI columns)."""
+    present = values.dropna()
+    return len(present) > 0 and all(isinstance(v, tuple) for v in present)
+
+
+def write_parquet(df: pd.DataFrame, path: Union[str, Path]) -> None:
+    """
+    Write :func:`parquet_compatible` ``(df)`` to a Parquet file.
+
+    The index is kept (a RangeIndex is stored as metadata only), which also
+    preserves the name of the column index.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Frame to store.
+    path : str or Path
+        Target ``.parquet`` file.
+    """
+    parquet_compatible(df).to_parquet(path)
+
+
+def _dir_size(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+class DiskCache:
+    """
+    Directory-backed key/value cache with LRU eviction by total bytes.
+
+    Each entry is a sub-directory named after its key. Writers fill a
+    temporary directory that is renamed into place, so readers never
+    see partially written entries. Entry bookkeeping (size, creation and
+    last access time, hit count) lives in ``_entry.json`` inside the entry;
+    hit/miss totals of every instance and process using the directory live
+    in ``_stats.json`` at its root (``hits``/``misses`` attributes count this
+    instance only).
+
+    Parameters
+    ----------
+    root : str or Path
+        Cache directory (created if missing).
+    max_bytes : int, optional
+        Upper bound for the total size of all entries. ``None`` disables
+        eviction.
+    """
+
+    def __init__(self, root: Union[str, Path], max_bytes: Optional[int] = None):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    # ---- entry helpers ----
+    def _entry_dir(self, key: str) -> Path:
+        return self.root / key
+
+    def _read_entry(self, entry_dir: Path) -> Optional[Dict[str, Any]]:
+        try:
+            with open(entry_dir / _ENTRY_FILE, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_entry(self, entry_dir: Path, info: Dict[str, Any]) -> None:
+        tmp = entry_dir / f"{_ENTRY_FILE}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(info, f)
+        os.replace(tmp, entry_dir / _ENTRY_FILE)
+
+    def _totals(self) -> Dict[str, int]:
+        try:
+            with open(self.root / _STATS_FILE, "r", encoding="utf-8") as f:
+                totals = json.load(f)
+        except (OSError, ValueError):
+            totals = {}
+        return {"hits": int(totals.get("hits", 0)), "misses": int(totals.get("misses", 0))}
+
+    def _count(self, field: str) -> None:
+        # Read-modify-replace: concurrent writers may drop an increment, never corrupt the file
+        totals = self._totals()
+        totals[field] += 1
+        tmp = self.root / f".{_STATS_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(totals, f)
+            os.replace(tmp, self.root / _STATS_FILE)
+        except OSError as e:
+            logger.warning(f"Could not update cache totals in {self.root}: {e}")
+
+    # ---- public API ----
+    def get(self, key: str) -> Optional[Path]:
+        """
+        Look up an entry and mark it as recently used.
+
+        Parameters
+        ----------
+        key : str
+            Entry key.
+
+        Returns
+        -------
+        Path or None
+            Entry directory on a hit, None on a miss.
+        """
+        entry_dir = self._entry_dir(key)
+        info = self._read_entry(entry_dir) if entry_dir.is_dir() else None
+        if info is None:
+            self.misses += 1
+            self._count("misses")
+            logger.info(f"Cache miss: {key}")
+            return None
+
+        self.hits += 1
+        self._count("hits")
+        info["last_access"] = time.time()
+        info["hits"] = info.get("hits", 0) + 1
+        try:
+            self._write_entry(entry_dir, info)
+        except OSError as e:
+            logger.warning(f"Could not update cache entry {key}: {e}")
+        logger.info(f"Cache hit: {key}")
+        return entry_dir
+
+    def put(
+        self,
+        key: str,
+        writer: Callable[[Path], None],
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> Path:
+        """
+        Create an entry by calling ``writer`` on an empty directory.
+
+        Parameters
+        ----------
+        key : str
+            Entry key. An existing entry with the same key is replaced.
+        writer : Callable[[Path], None]
+            Function that writes the entry files into the given directory.
+        metadata : Dict[str, Any], optional
+            Extra JSON-serializable information stored with the entry.
+
+        Returns
+        -------
+        Path
+            Final entry directory.
+        """
+        tmp_dir = Path(tempfile.mkdtemp(prefix=f".{key}.", dir=self.root))
+        try:
+            writer(tmp_dir)
+            now = time.time()
+            info = {
+                "key": key,
+                "created": now,
+                "last_access": now,
+                "hits": 0,
+                "nbytes": _dir_size(tmp_dir),
+                "metadata": metadata or {},
+            }
+            self._write_entry(tmp_dir, info)
+
+            entry_dir = self._entry_dir(key)
+            if entry_dir.exists():
+                shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(tmp_dir, entry_dir)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        logger.info(f"Cached {key} ({info['nbytes'] / 1e6:.1f} MB)")
+        self.evict()
+        return entry_dir
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """
+        List the bookkeeping records of all complete entries.
+
+        Returns
+        -------
+        List[Dict[str, Any]]
+            One record per entry (key, created, last_access, hits, nbytes, metadata).
+        """
+        records = []
+        for entry_dir in self.root.iterdir():
+            if not entry_dir.is_dir() or entry_dir.name.startswith("."):
+                continue
+            info = self._read_entry(entry_dir)
+            if info is not None:
+                records.append(info)
+        return records
+
+    def invalidate(self, key: Optional[str] = None) -> int:
+        """
+        Remove one entry, or every entry when ``key`` is None.
+
+        Parameters
+        ----------
+        key : str, optional
+            Entry key to drop.
+
+        Returns
+        -------
+        int
+            Number of entries removed.
+        """
+        if key is not None:
+            targets = [self._entry_dir(key)]
+        else:
+            targets = [p for p in self.root.iterdir() if p.is_dir()]
+
+        removed = 0
+        for entry_dir in targets:
+            if entry_dir.exists():
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                removed += 1
+        logger.info(f"Invalidated {removed} cache entries in {self.root}")
+        return removed
+
+    def evict(self, max_bytes: Optional[int] = None) -> List[str]:
+        """
+        Drop least recently used entries until the cache fits ``max_bytes``.
+
+        Parameters
+        ----------
+        max_bytes : int, optional
+            Size bound; defaults to the bound given at construction.
+
+        Returns
+        -------
+        List[str]
+            Keys of evicted entries.
+        """
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        if limit is None:
+            return []
+
+        records = sorted(self.entries(), key=lambda r: r.get("last_access", 0))
+        total = sum(r.get("nbytes", 0) for r in records)
+        evicted = []
+        for record in records:
+            if total <= limit:
+                break
+            shutil.rmtree(self._entry_dir(record["key"]), ignore_errors=True)
+            total -= record.get("nbytes", 0)
+            evicted.append(record["key"])
+
+        if evicted:
+            logger.info(f"Evicted {len(evicted)} cache entries (limit {limit} bytes).")
+        return evicted
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Summarize cache usage.
+
+        Returns
+        -------
+        Dict[str, Any]
+            Keys: 'root', 'entries', 'total_bytes', 'max_bytes', 'hits', 'misses'
+            (hits and misses are the directory totals across instances and
+            processes).
+        """
+        records = self.entries()
+        return {
+            "root": str(self.root),
+            "entries": len(records),
+            "total_bytes": sum(r.get("nbytes", 0) for r in records),
+            "max_bytes": self.max_bytes,
+            **self._totals(),
+        }
@@ -1,70 +1,160 @@
-"""
-Configuration loader for paths and parameters.
-"""
-import yaml
-import logging
-from pathlib import Path
-from typing import Dict, Any
-
-logger = logging.getLogger(__name__)
-
-
-def get_config(config_path: str = "config/config.yaml") -> Dict[str, Any]:
-    """
-    Load configuration from YAML file.
-
-    Parameters
-    ----------
-    config_path : str
-        Path to config.yaml file.
-
-    Returns
-    -------
-    Dict[str, Any]
-        Configuration dictionary.
-    """
-    config_file = Path(config_path)
-    if not config_file.exists():
-        logger.warning(f"Config file {config_path} not found, using defaults.")
-        return {
-            "data": {
-                "path": "data/study_data.xlsx",
-                "sheets": {
-                    "metadata": "sample_metadata",
-                    "matrix": "data_matrix",
-                    "dictionary": "data_dictionary",
-                },
-            },
-            "preprocessing": {"scale_method": "auto", "knn_k": 3, "log_offset": 0.5},
-            "pca": {"pcx": 1, "pcy": 2},
-            "stats": {"parametric": True, "pvalue_threshold": 0.05},
-        }
-
-    with open(config_file, "r", encoding="utf-8") as f:
-        config = yaml.safe_load(f)
-    logger.info(f"Configuration loaded from {config_path}")
-    return config
-
-
-def get_paths(config: Dict[str, Any]) -> Dict[str, str]:
-    """
-    Extract data paths from configuration.
-
-    Parameters
-    ----------
-    config : Dict[str, Any]
-        Configuration dictionary.
-
-    Returns
-    -------
-    Dict[str, str]
-        Dictionary with keys: 'data_path', 'meta_sheet', 'matrix_sheet', 'dict_sheet'.
-    """
-    data_cfg = config.get("data", {})
-    sheets = data_cfg.get("sheets", {})
-    return {
-        "data_path": data_cfg.get("path", "data/study_data.xlsx"),
-        "meta_sheet": sheets.get("metadata", "sample_metadata"),
-        "matrix_sheet": sheets.get("matrix", "data_matrix"),
-        "dict_sheet": sheets.get("dictionary", "data_dictionary"),
-    }
+"""
+Configuration loader for paths and parameters.
+"""
+import yaml
+import logging
+from pathlib import Path
+from typing import Dict, Any
+
+logger = logging.getLogger(__name__)
+
+_PREFILTER_DEFAULTS = {
+    "enabled": False,
+    "max_missing_frac": 0.5,
+    "min_variance": 1.0e-4,
+    "max_qc_rsd": 30.0,
+    "qc_label": "QC",
+}
+
+_VIZ_DEFAULTS = {
+    "webgl_threshold": 5_000,
+    "downsample_threshold": 50_000,
+    "max_points": 20_000,
+    "bins": 200,
+}
+
+
+def get_config(config_path: str = "config/config.yaml") -> Dict[str, Any]:
+    """
+    Load configuration from YAML file.
+
+    Parameters
+    ----------
+    config_path : str
+        Path to config.yaml file.
+
+    Returns
+    -------
+    Dict[str, Any]
+        Configuration dictionary.
+    """
+    config_file = Path(config_path)
+    if not config_file.exists():
+        logger.warning(f"Config file {config_path} not found, using defaults.")
+        return {
+            "data": {
+                "path": "data/study_data.xlsx",
+                "sheets": {
+                    "metadata": "sample_metadata",
+                    "matrix": "data_matrix",
+                    "dictionary": "data_dictionary",
+                },
+            },
+            "preprocessing": {
+                "scale_method": "auto",
+                "knn_k": 3,
+                "log_offset": 0.5,
+                "prefilter": dict(_PREFILTER_DEFAULTS),
+            },
+            "pca": {
+                "n_components": 10,
+                "pcx": 1,
+                "pcy": 2,
+                "incremental": False,
+                "batch_size": 256,
+                "bootstrap": {"n_boot": 200, "n_perm": 1000, "confidence": 0.95, "n_jobs": None},
+            },
+            "stats": {"parametric": True, "pvalue_threshold": 0.05, "engine": "native"},
+            "viz": dict(_VIZ_DEFAULTS),
+            "cache": {"dir": ".cache", "max_bytes": 2_000_000_000},
+        }
+
+    with open(config_file, "r", encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+    logger.info(f"Configuration loaded from {config_path}")
+    return config
+
+
+def get_paths(config: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Extract data paths from configuration.
+
+    Parameters
+    ----------
+    config : Dict[str, Any]
+        Configuration dictionary.
+
+    Returns
+    -------
+    Dict[str, str]
+        Dictionary with keys: 'data_path', 'meta_sheet', 'matrix_sheet', 'dict_sheet'.
+    """
+    data_cfg = config.get("data", {})
+    sheets = data_cfg.get("sheets", {})
+    return {
+        "data_path": data_cfg.get("path", "data/study_data.xlsx"),
+        "meta_sheet": sheets.get("metadata", "sample_metadata"),
+        "matrix_sheet": sheets.get("matrix", "data_matrix"),
+        "dict_sheet": sheets.get("dictionary", "data_dictionary"),
+    }
+
+
+def get_cache_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Extract on-disk cache settings from configuration.
+
+    Parameters
+    ----------
+    config : Dict[str, Any]
+        Configuration dictionary.
+
+    Returns
+    -------
+    Dict[str, Any]
+        Dictionary with keys: 'cache_dir', 'max_bytes'.
+    """
+    cache_cfg = config.get("cache", {})
+    return {
+        "cache_dir": cache_cfg.get("dir", ".cache"),
+        "max_bytes": cache_cfg.get("max_bytes", 2_000_000_000),
+    }
+
+
+def get_prefilter_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Extract feature prefilter settings from ``preprocessing.prefilter``.
+
+    Parameters
+    ----------
+    config : Dict[str, Any]
+        Configuration dictionary.
+
+    Returns
+    -------
+    Dict[str, Any]
+        Dictionary with keys: 'enabled', 'max_missing_frac', 'min_variance',
+        'max_qc_rsd', 'qc_label' (a threshold of None disables that check).
+    """
+    prefilter_cfg = config.get("preprocessing", {}).get("prefilter") or {}
+    return {key: prefilter_cfg.get(key, default) for key, default in _PREFILTER_DEFAULTS.items()}
+
+
+def get_viz_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Extract large scatter plot settings from ``viz``.
+
+    Parameters
+    ----------
+    config : Dict[str, Any]
+        Configuration dictionary.
+
+    Returns
+    -------
+    Dict[str, Any]
+        Dictionary with keys: 'webgl_threshold' (points above which WebGL
+        traces are used), 'downsample_threshold' (points above which the
+        plot is downsampled), 'max_points' (target after downsampling) and
+        'bins' (grid bins per axis used to preserve density).
+    """
+    viz_cfg = config.get("viz") or {}
+    return {key: viz_cfg.get(key, default) for key, default in _VIZ_DEFAULTS.items()}
@@ -0,0 +1,303 @@
+"""
+Blocked, multi-threaded KNN imputation (numerically equivalent to cb.utils.knnimpute).
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _neighbor_candidates(
+    Qc: np.ndarray,
+    Pc: np.ndarray,
+    sq: np.ndarray,
+    rows: np.ndarray,
+    m: int,
+    exclude_self: bool,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-m nearest pool rows for a block of query rows.
+
+    Distances are screened with the Gram expansion ``|a|² + |b|² - 2ab`` and
+    the m survivors of ``argpartition`` are re-measured exactly, so their
+    order and weights match a direct Euclidean computation.
+    """
+    q = Qc[rows]
+    d2 = np.einsum("rp,rp->r", q, q, dtype=np.float64)[:, None] + sq[None, :] - 2.0 * (q @ Pc.T)
+    if exclude_self:
+        d2[np.arange(len(rows)), rows] = np.inf
+    cand = np.argpartition(d2, m - 1, axis=1)[:, :m]
+
+    diff = Pc[cand] - q[:, None, :]
+    dist = np.sqrt(np.einsum("rmp,rmp->rm", diff, diff, dtype=np.float64))
+    order = np.lexsort((cand, dist), axis=1)
+    take = np.arange(len(rows))[:, None]
+    return cand[take, order], dist[take, order]
+
+
+def _full_neighbors(
+    q: np.ndarray, Pc: np.ndarray, self_row: Optional[int]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """All pool rows (except ``self_row``) ordered by exact distance to ``q``."""
+    diff = Pc - q
+    dist = np.sqrt(np.einsum("np,np->n", diff, diff, dtype=np.float64))
+    others = np.arange(len(Pc))
+    if self_row is not None:
+        others = np.delete(others, self_row)
+    dist = dist[others]
+    order = np.lexsort((others, dist))
+    return others[order], dist[order]
+
+
+def _window_impute(
+    P: np.ndarray,
+    feats: np.ndarray,
+    idx: np.ndarray,
+    dist: np.ndarray,
+    k: int,
+    n_others: int,
+    expand: Optional[Callable[[], Tuple[np.ndarray, np.ndarray]]] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Impute the features ``feats`` of one sample from its ordered neighbours.
+
+    Mirrors cimcb_lite's window rule: start with the k nearest neighbours
+    plus any neighbours tied with the k-th, weight by inverse distance
+    (weights always taken from the nearest ones), and slide the window one
+    neighbour further while every neighbour value for a feature is NaN.
+    ``expand`` returns the full neighbour ordering when ``idx`` holds only
+    the nearest candidates and the window runs past them.
+
+    Returns the imputed values aligned with ``feats`` and a mask of the
+    features that got a value (a coincident neighbour mean may be NaN).
+    """
+    values = np.full(len(feats), np.nan)
+    todo = np.arange(len(feats))
+    full = len(idx) == n_others
+    last_start = max(n_others - k, 0)  # cimcb loops j = 1 .. n - k
+
+    for start in range(last_start + 1):
+        if len(todo) == 0:
+            break
+        # Extend the window over neighbours tied with its last member
+        end = start + k
+        while True:
+            if end >= len(idx) and not full:
+                idx, dist = expand()
+                full = True
+            if end >= len(idx) or dist[end] != dist[end - 1]:
+                break
+            end += 1
+
+        win = idx[start:end]
+        weights = dist[: end - start][: len(win)]
+        vals = P[np.ix_(win, feats[todo])]
+        nan_vals = np.isnan(vals)
+        resolved = ~nan_vals.all(axis=0)
+        if not resolved.any():
+            continue
+
+        zero = weights == 0
+        if zero.any():
+            # Infinite weights: plain mean of the coincident neighbours
+            with np.errstate(invalid="ignore"):
+                sub = vals[zero][:, resolved]
+                cnt = (~np.isnan(sub)).sum(axis=0)
+                imp = np.where(cnt > 0, np.nansum(sub, axis=0) / np.maximum(cnt, 1), np.nan)
+        else:
+            w = np.where(nan_vals[:, resolved], 0.0, 1.0 / weights[:, None])
+            imp = (np.where(nan_vals[:, resolved], 0.0, vals[:, resolved]) * w).sum(axis=0)
+            imp /= w.sum(axis=0)
+
+        values[todo[resolved]] = imp
+        todo = todo[~resolved]
+    done = np.ones(len(feats), dtype=bool)
+    done[todo] = False
+    return values, done
+
+
+def _impute_row(
+    X: np.ndarray,
+    Z: np.ndarray,
+    Qc: np.ndarray,
+    P: np.ndarray,
+    Pc: np.ndarray,
+    row: int,
+    idx: np.ndarray,
+    dist: np.ndarray,
+    k: int,
+    exclude_self: bool,
+) -> int:
+    """Impute the missing cells of one sample into ``Z``; returns cells left as NaN."""
+    feats = np.flatnonzero(np.isnan(X[row]))
+    values, done = _window_impute(
+        P, feats, idx, dist, k, P.shape[0] - int(exclude_self),
+        expand=lambda: _full_neighbors(Qc[row], Pc, row if exclude_self else None),
+    )
+    Z[row, feats[done]] = values[done]
+    return int(np.count_nonzero(~done))
+
+
+def impute_from_neighbors(
+    X: np.ndarray,
+    row: int,
+    neighbors: np.ndarray,
+    dist: np.ndarray,
+    k: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Impute the missing cells of one sample from a precomputed neighbour order.
+
+    Applies the same window rule as :func:`knn_impute` without computing
+    distances, for callers that accumulate them elsewhere (e.g. over column
+    chunks of a memory-mapped matrix). Nothing is written to ``X``.
+
+    Parameters
+    ----------
+    X : np.ndarray
+        Samples × features matrix with NaNs; neighbour values are read from it.
+    row : int
+        Sample to impute.
+    neighbors : np.ndarray
+        Every other sample, nearest first (ties ordered by position).
+    dist : np.ndarray
+        Distances aligned with ``neighbors``.
+    k : int
+        Number of nearest neighbours (at most ``len(neighbors)``).
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        (features, values): the imputed feature indices of ``row`` and their
+        values. Missing features not listed have no observed neighbour.
+    """
+    feats = np.flatnonzero(np.isnan(X[row]))
+    values, done = _window_impute(X, feats, np.asarray(neighbors), np.asarray(dist), k, len(neighbors))
+    return feats[done], values[done]
+
+
+def knn_impute(
+    X: np.ndarray,
+    k: int = 3,
+    block_size: int = 256,
+    n_jobs: Optional[int] = None,
+    n_candidates: Optional[int] = None,
+    reference: Optional[np.ndarray] = None,
+    copy: bool = True,
+) -> np.ndarray:
+    """
+    kNN missing value imputation using Euclidean distance between samples.
+
+    Produces the same values as ``cimcb_lite.utils.knnimpute`` (distances on
+    the features observed in every sample, inverse-distance weighting, tie
+    extension and window sliding), but only samples with missing values get
+    neighbours, distances are computed in row blocks of ``block_size`` with
+    BLAS, and only the top candidates per sample are kept via
+    ``argpartition``. Blocks run on a thread pool. Extra memory is one copy of
+    the complete-feature columns (none if all are complete) plus
+    ``block_size × n_samples`` distances per worker.
+
+    Neighbours at exactly the same distance are ordered by sample position;
+    cimcb_lite leaves their order to an unstable sort, so results can differ
+    only when a window slides into such a tie.
+
+    Parameters
+    ----------
+    X : np.ndarray
+        Samples × features matrix with NaNs.
+    k : int
+        Number of nearest neighbours. Values above n_samples - 1 are clamped.
+    block_size : int
+        Samples per distance block.
+    n_jobs : int, optional
+        Worker threads; defaults to the number of CPUs.
+    n_candidates : int, optional
+        Neighbours kept per sample before falling back to a full sort for
+        that sample; defaults to ``k + max(2k, 10)``.
+    reference : np.ndarray, optional
+        Reference samples × features matrix (e.g. the fitted cohort). When
+        given, neighbours are drawn only from the reference rows and
+        distances use the features complete in both X and the reference, so
+        new samples are imputed without touching the cohort.
+    copy : bool
+        If False and X has no missing values, return X itself instead of a
+        copy (imputation always writes to a new array).
+
+    Returns
+    -------
+    np.ndarray
+        X with NaNs imputed (cells whose neighbours are all missing stay
+        NaN).
+
+    Raises
+    ------
+    ValueError
+        If k is not a positive integer or every feature has missing values.
+    """
+    X = np.asarray(X)
+    if not isinstance(k, (int, np.integer)) or isinstance(k, bool):
+        raise ValueError("k is not an integer")
+    if k < 1:
+        raise ValueError("k must be greater than zero")
+
+    nan_mask = np.isnan(X)
+    rows_missing = np.flatnonzero(nan_mask.any(axis=1))
+    if len(rows_missing) == 0:
+        logger.info("KNN impute: no missing values.")
+        return X.copy() if copy else X
+    Z = X.copy()
+
+    exclude_self = reference is None
+    P = X if exclude_self else np.asarray(reference)
+    if P.ndim != 2 or P.shape[1] != X.shape[1]:
+        raise ValueError(
+            f"Reference shape {P.shape} does not match {X.shape[1]} features."
+        )
+    n_pool = P.shape[0] - int(exclude_self)
+    if k > n_pool:
+        logger.warning(f"k={k} is too high for {n_pool} neighbours; using k={n_pool}.")
+        k = n_pool
+    if k < 1:
+        raise ValueError("At least two samples are required for KNN imputation.")
+
+    complete = ~nan_mask.any(axis=0)
+    if not exclude_self:
+        complete &= ~np.isnan(P).any(axis=0)
+    if not complete.any():
+        raise ValueError(
+            "All colummns of the input data contain missing values. "
+            "Unable to impute missing values."
+        )
+    Qc = X if complete.all() else X[:, complete]
+    Pc = Qc if exclude_self else (P if complete.all() else P[:, complete])
+    sq = np.einsum("np,np->n", Pc, Pc, dtype=np.float64)
+    m = min(n_pool, n_candidates or k + max(2 * k, 10))
+
+    def _run(block: np.ndarray) -> int:
+        idx, dist = _neighbor_candidates(Qc, Pc, sq, block, m, exclude_self)
+        return sum(
+            _impute_row(X, Z, Qc, P, Pc, row, idx[i], dist[i], k, exclude_self)
+            for i, row in enumerate(block)
+        )
+
+    blocks = [
+        rows_missing[i : i + block_size] for i in range(0, len(rows_missing), block_size)
+    ]
+    workers = min(n_jobs or os.cpu_count() or 1, len(blocks))
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            left = sum(pool.map(_run, blocks))
+    else:
+        left = sum(_run(b) for b in blocks)
+
+    if left:
+        logger.warning(f"{left} missing values could not be imputed (no observed neighbours).")
+    logger.info(
+        f"KNN imputed {int(nan_mask.sum()) - left} values in {len(rows_missing)} samples "
+        f"(k={k}, {len(blocks)} blocks, {workers} workers)."
+    )
+    return Z
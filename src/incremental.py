@@ -0,0 +1,417 @@
+"""
+Incremental preprocessing for appended sample batches (running statistics).
+"""
+import json
+import logging
+from pathlib import Path
+from typing import Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from src.impute import knn_impute
+from src.scaling import SCALE_METHODS, Scaler
+
+logger = logging.getLogger(__name__)
+
+_STAT_ARRAYS = ("n_obs", "mean", "m2", "log_min", "log_max", "n_missing", "n_nonpos")
+
+
+class RunningStats:
+    """
+    Per-compound sufficient statistics, updated batch by batch.
+
+    Statistics of log10 intensities are kept for observed (positive) values
+    only, together with the count of cells that the log step replaces by a
+    constant (NaN or ≤ 0). Because the replacement ``log10(minpos * offset)``
+    depends on the global minimum positive value, which can still move, the
+    moments including replaced cells are derived analytically on request
+    instead of being accumulated. Batches are merged with the Chan/Welford
+    parallel update, so each update is O(batch size).
+
+    Parameters
+    ----------
+    n_features : int
+        Number of compounds.
+    """
+
+    def __init__(self, n_features: int):
+        self.n_features = n_features
+        self.n_samples = 0
+        self.minpos = np.inf
+        self.n_obs = np.zeros(n_features, dtype=np.int64)
+        self.mean = np.zeros(n_features)
+        self.m2 = np.zeros(n_features)
+        self.log_min = np.full(n_features, np.inf)
+        self.log_max = np.full(n_features, -np.inf)
+        self.n_missing = np.zeros(n_features, dtype=np.int64)
+        self.n_nonpos = np.zeros(n_features, dtype=np.int64)
+
+    def update(self, X: np.ndarray) -> "RunningStats":
+        """
+        Add a batch of raw intensities.
+
+        Parameters
+        ----------
+        X : np.ndarray
+            Samples × compounds raw intensities (NaN = missing).
+
+        Returns
+        -------
+        RunningStats
+            self, updated.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected a 2-D batch with {self.n_features} columns, got {X.shape}.")
+
+        missing = np.isnan(X)
+        positive = X > 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            L = np.where(positive, np.log10(np.where(positive, X, 1.0)), 0.0)
+            n_b = positive.sum(axis=0)
+            mean_b = L.sum(axis=0) / np.maximum(n_b, 1)
+            m2_b = (np.where(positive, L - mean_b, 0.0) ** 2).sum(axis=0)
+
+        n_a = self.n_obs
+        n = n_a + n_b
+        delta = mean_b - self.mean
+        safe_n = np.maximum(n, 1)
+        self.mean = self.mean + delta * n_b / safe_n
+        self.m2 = self.m2 + m2_b + delta**2 * n_a * n_b / safe_n
+        self.n_obs = n
+
+        if positive.any():
+            self.log_min = np.minimum(self.log_min, np.where(positive, L, np.inf).min(axis=0))
+            self.log_max = np.maximum(self.log_max, np.where(positive, L, -np.inf).max(axis=0))
+            self.minpos = min(self.minpos, float(X[positive].min()))
+        self.n_missing += missing.sum(axis=0)
+        self.n_nonpos += (~positive & ~missing).sum(axis=0)
+        self.n_samples += X.shape[0]
+        return self
+
+    @property
+    def n_replaced(self) -> np.ndarray:
+        """Cells per compound replaced by the log offset (missing or ≤ 0)."""
+        return self.n_missing + self.n_nonpos
+
+    @property
+    def missing_frac(self) -> np.ndarray:
+        """Fraction of missing cells per compound."""
+        return self.n_missing / max(self.n_samples, 1)
+
+    def replacement(self, log_offset: float = 0.5) -> float:
+        """log10 value assigned to missing/non-positive cells."""
+        minpos = self.minpos if np.isfinite(self.minpos) else 1e-6
+        return float(np.log10(minpos * log_offset))
+
+    def log_stats(self, log_offset: float = 0.5, ddof: int = 1) -> dict:
+        """
+        Moments of the log10 matrix as ``Preprocessor`` would build it.
+
+        Combines the observed-value moments with ``n_replaced`` copies of the
+        replacement constant (a group with zero variance).
+
+        Parameters
+        ----------
+        log_offset : float
+            Offset multiplier for min positive value.
+        ddof : int
+            Delta degrees of freedom for the standard deviation.
+
+        Returns
+        -------
+        dict
+            'mean', 'std', 'range' arrays and the 'minpos' scalar.
+        """
+        c = self.replacement(log_offset)
+        n_rep = self.n_replaced
+        n = self.n_obs + n_rep
+        safe_n = np.maximum(n, 1)
+        mean = (self.n_obs * self.mean + n_rep * c) / safe_n
+        m2 = self.m2 + (self.mean - c) ** 2 * self.n_obs * n_rep / safe_n
+        with np.errstate(invalid="ignore", divide="ignore"):
+            std = np.sqrt(m2 / (n - ddof))
+        lo = np.where(n_rep > 0, np.minimum(self.log_min, c), self.log_min)
+        hi = np.where(n_rep > 0, np.maximum(self.log_max, c), self.log_max)
+        return {"mean": mean, "std": std, "range": hi - lo, "minpos": self.minpos}
+
+
+class IncrementalPreprocessor:
+    """
+    Log10 → scale → impute pipeline for samples arriving in batches.
+
+    ``partial_fit`` folds a batch into :class:`RunningStats` in O(batch);
+    ``transform`` uses the frozen *baseline* (minpos and scaling parameters),
+    so outputs already produced stay valid until :meth:`rebaseline` is called.
+    Re-baselining only converts the running statistics into new parameters
+    (O(compounds)); after it, transforming the full cohort gives the same
+    result as ``Preprocessor.fit_transform`` on all samples seen.
+    :meth:`drift` reports how far the running statistics have moved from the
+    baseline.
+
+    Parameters
+    ----------
+    scale_method : str
+        Scaling method ('auto', 'pareto', 'vast', 'level', 'range').
+    knn_k : int
+        Number of neighbors for within-batch KNN imputation.
+    log_offset : float
+        Offset multiplier for min positive value to handle zeros.
+    ddof : int
+        Delta degrees of freedom for the standard deviation.
+    """
+
+    def __init__(
+        self, scale_method: str = "auto", knn_k: int = 3, log_offset: float = 0.5, ddof: int = 1
+    ):
+        if scale_method not in SCALE_METHODS:
+            raise ValueError(f"scale_method has to be one of {SCALE_METHODS}, got '{scale_method}'.")
+        self.scale_method = scale_method
+        self.knn_k = knn_k
+        self.log_offset = log_offset
+        self.ddof = ddof
+        self.stats_: Optional[RunningStats] = None
+        self.scaler_: Optional[Scaler] = None
+        self.minpos_: Optional[float] = None
+        self.baseline_samples_ = 0
+        self.feature_names_: Optional[list] = None
+
+    def _as_array(self, X: Union[pd.DataFrame, np.ndarray]) -> np.ndarray:
+        if isinstance(X, pd.DataFrame):
+            if self.feature_names_ is not None:
+                pos = pd.Index(X.columns.astype(str)).get_indexer(self.feature_names_)
+                if (pos < 0).any():
+                    raise ValueError(f"Batch is missing {int((pos < 0).sum())} fitted compounds.")
+                X = X.iloc[:, pos]
+            try:
+                return X.to_numpy(dtype=np.float64, na_value=np.nan)
+            except (TypeError, ValueError):
+                return X.apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64)
+        return np.asarray(X, dtype=np.float64)
+
+    def partial_fit(
+        self, X: Union[pd.DataFrame, np.ndarray], feature_names: Optional[Sequence[str]] = None
+    ) -> "IncrementalPreprocessor":
+        """
+        Fold a batch into the running statistics.
+
+        The first batch also sets the baseline; later batches leave it
+        unchanged until :meth:`rebaseline`.
+
+        Parameters
+        ----------
+        X : pd.DataFrame or np.ndarray
+            Raw samples × compounds intensities.
+        feature_names : Sequence[str], optional
+            Compound names (taken from the first DataFrame when omitted).
+
+        Returns
+        -------
+        IncrementalPreprocessor
+            self, updated.
+        """
+        if self.stats_ is None and feature_names is None and isinstance(X, pd.DataFrame):
+            feature_names = X.columns
+        if self.stats_ is None and feature_names is not None:
+            self.feature_names_ = [str(c) for c in feature_names]
+        X = self._as_array(X)
+        if self.stats_ is None:
+            self.stats_ = RunningStats(X.shape[1])
+        self.stats_.update(X)
+        logger.info(f"Running stats updated: +{X.shape[0]} samples (total {self.stats_.n_samples}).")
+        if self.scaler_ is None:
+            self.rebaseline()
+        return self
+
+    def rebaseline(self) -> "IncrementalPreprocessor":
+        """
+        Freeze the current running statistics as the transform parameters.
+
+        Returns
+        -------
+        IncrementalPreprocessor
+            self, with a new baseline.
+        """
+        if self.stats_ is None:
+            raise ValueError("No batches seen; call partial_fit() first.")
+        stats = self.stats_.log_stats(self.log_offset, self.ddof)
+        std = np.where((stats["std"] == 0) | np.isnan(stats["std"]), 1.0, stats["std"])
+        self.scaler_ = Scaler.from_params(
+            {
+                "method": self.scale_method,
+                "ddof": self.ddof,
+                "mean": stats["mean"],
+                "std": std,
+                "range": stats["range"],
+            }
+        )
+        self.minpos_ = stats["minpos"] if np.isfinite(stats["minpos"]) else 1e-6
+        self.baseline_samples_ = self.stats_.n_samples
+        logger.info(f"Re-baselined on {self.baseline_samples_} samples (minpos={self.minpos_:.4g}).")
+        return self
+
+    def transform(self, X: Union[pd.DataFrame, np.ndarray]) -> np.ndarray:
+        """
+        Preprocess a batch with the baseline parameters.
+
+        Parameters
+        ----------
+        X : pd.DataFrame or np.ndarray
+            Raw samples × compounds intensities.
+
+        Returns
+        -------
+        np.ndarray
+            Preprocessed batch (log10 + scaled + imputed).
+        """
+        if self.scaler_ is None:
+            raise ValueError("IncrementalPreprocessor is not fitted; call partial_fit() first.")
+        X = self._as_array(X)
+        X_safe = np.where((X <= 0) | np.isnan(X), self.minpos_ * self.log_offset, X)
+        Xscale = self.scaler_.transform(np.log10(X_safe), copy=False)
+        if np.isnan(Xscale).any() and Xscale.shape[0] > 1:
+            Xscale = knn_impute(Xscale, k=self.knn_k)
+        return Xscale
+
+    def partial_fit_transform(self, X: Union[pd.DataFrame, np.ndarray]) -> np.ndarray:
+        """Update the running statistics with X, then transform X."""
+        return self.partial_fit(X).transform(X)
+
+    def drift(self) -> pd.DataFrame:
+        """
+        Compare the running statistics with the baseline, per compound.
+
+        Returns
+        -------
+        pd.DataFrame
+            Columns 'mean_shift' (|Δ mean| in baseline standard deviations),
+            'std_ratio' (running / baseline std) and 'missing_frac'; indexed
+            by compound name when known. ``attrs['minpos_ratio']`` holds the
+            running / baseline minpos ratio.
+        """
+        if self.scaler_ is None:
+            raise ValueError("IncrementalPreprocessor is not fitted; call partial_fit() first.")
+        now = self.stats_.log_stats(self.log_offset, self.ddof)
+        base_std = self.scaler_.std_
+        with np.errstate(invalid="ignore", divide="ignore"):
+            report = pd.DataFrame(
+                {
+                    "mean_shift": np.abs(now["mean"] - self.scaler_.mean_) / base_std,
+                    "std_ratio": now["std"] / base_std,
+                    "missing_frac": self.stats_.missing_frac,
+                },
+                index=self.feature_names_,
+            )
+        report.attrs["minpos_ratio"] = float(now["minpos"] / self.minpos_)
+        report.attrs["new_samples"] = self.stats_.n_samples - self.baseline_samples_
+        return report
+
+    def needs_rebaseline(
+        self,
+        max_mean_shift: float = 0.5,
+        max_std_ratio: float = 1.5,
+        max_minpos_ratio: float = 1.5,
+    ) -> bool:
+        """
+        Whether drift exceeds the given thresholds for any compound.
+
+        Parameters
+        ----------
+        max_mean_shift : float
+            Allowed mean shift in baseline standard deviations.
+        max_std_ratio : float
+            Allowed std ratio (or its inverse).
+        max_minpos_ratio : float
+            Allowed ratio between the running and baseline minimum positive
+            value (or its inverse), which sets the zero replacement.
+
+        Returns
+        -------
+        bool
+            True if the baseline parameters look stale.
+        """
+        report = self.drift()
+        ratio = report["std_ratio"]
+        minpos_ratio = report.attrs["minpos_ratio"]
+        return bool(
+            (report["mean_shift"] > max_mean_shift).any()
+            or (ratio > max_std_ratio).any()
+            or (ratio < 1 / max_std_ratio).any()
+            or minpos_ratio > max_minpos_ratio
+            or minpos_ratio < 1 / max_minpos_ratio
+        )
+
+    def save(self, path: Union[str, Path]) -> Path:
+        """
+        Save running statistics and baseline to a single ``.npz`` file.
+
+        Parameters
+        ----------
+        path : str or Path
+            Target file.
+
+        Returns
+        -------
+        Path
+            Path of the written file.
+        """
+        if self.stats_ is None:
+            raise ValueError("No batches seen; call partial_fit() first.")
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        config = {
+            "scale_method": self.scale_method,
+            "knn_k": self.knn_k,
+            "log_offset": self.log_offset,
+            "ddof": self.ddof,
+            "feature_names": self.feature_names_,
+            "n_samples": self.stats_.n_samples,
+            "minpos": self.stats_.minpos,
+            "baseline_minpos": self.minpos_,
+            "baseline_samples": self.baseline_samples_,
+        }
+        arrays = {name: getattr(self.stats_, name) for name in _STAT_ARRAYS}
+        params = self.scaler_.get_params()
+        arrays.update(base_mean=params["mean"], base_std=params["std"], base_range=params["range"])
+        with open(path, "wb") as f:
+            np.savez(f, config=np.array(json.dumps(config)), **arrays)
+        return path
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "IncrementalPreprocessor":
+        """
+        Load state written by :meth:`save`.
+
+        Parameters
+        ----------
+        path : str or Path
+            Saved ``.npz`` file.
+
+        Returns
+        -------
+        IncrementalPreprocessor
+            Restored preprocessor.
+        """
+        with np.load(path, allow_pickle=False) as data:
+            config = json.loads(str(data["config"]))
+            obj = cls(config["scale_method"], config["knn_k"], config["log_offset"], config["ddof"])
+            obj.feature_names_ = config["feature_names"]
+            stats = RunningStats(len(data["mean"]))
+            for name in _STAT_ARRAYS:
+                setattr(stats, name, data[name])
+            stats.n_samples = config["n_samples"]
+            stats.minpos = config["minpos"]
+            obj.stats_ = stats
+            obj.minpos_ = config["baseline_minpos"]
+            obj.baseline_samples_ = config["baseline_samples"]
+            obj.scaler_ = Scaler.from_params(
+                {
+                    "method": config["scale_method"],
+                    "ddof": config["ddof"],
+                    "mean": data["base_mean"],
+                    "std": data["base_std"],
+                    "range": data["base_range"],
+                }
+            )
+        return obj
@@ -1,82 +1,438 @@
-"""
-Data loading and validation utilities.
-"""
-import pandas as pd
-import logging
-from typing import Tuple
-
-logger = logging.getLogger(__name__)
-
-
-def load_excel(
-    file_path: str, meta_sheet: str, matrix_sheet: str, dict_sheet: str
-) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
-    """
-    Load three sheets from Excel file.
-
-    Parameters
-    ----------
-    file_path : str
-        Path to Excel file.
-    meta_sheet : str
-        Name of metadata sheet.
-    matrix_sheet : str
-        Name of data matrix sheet.
-    dict_sheet : str
-        Name of data dictionary sheet.
-
-    Returns
-    -------
-    Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]
-        (sample_metadata, data_matrix, data_dictionary)
-    """
-    logger.info(f"Loading data from {file_path}")
-    try:
-        meta = pd.read_excel(file_path, sheet_name=meta_sheet)
-        matrix = pd.read_excel(file_path, sheet_name=matrix_sheet)
-        data_dict = pd.read_excel(file_path, sheet_name=dict_sheet)
-        logger.info(
-            f"Loaded: meta={meta.shape}, matrix={matrix.shape}, dict={data_dict.shape}"
-        )
-        return meta, matrix, data_dict
-    except Exception as e:
-        logger.error(f"Error loading Excel file: {e}")
-        raise
-
-
-def validate_align(
-    meta: pd.DataFrame, data_matrix: pd.DataFrame, sample_col: str = "sample_id"
-) -> None:
-    """
-    Validate that sample IDs align between metadata and data matrix.
-
-    Parameters
-    ----------
-    meta : pd.DataFrame
-        Sample metadata.
-    data_matrix : pd.DataFrame
-        Data matrix (samples as rows or columns).
-    sample_col : str
-        Column name for sample IDs in metadata.
-
-    Raises
-    ------
-    ValueError
-        If alignment is poor (<50% overlap).
-    """
-    if sample_col not in meta.columns:
-        logger.warning(f"Sample column '{sample_col}' not found in metadata.")
-        return
-
-    meta_samples = set(meta[sample_col].dropna().astype(str))
-    matrix_samples = set(data_matrix.columns.astype(str)) - {"compound_id"}
-
-    overlap = meta_samples & matrix_samples
-    pct = len(overlap) / max(len(meta_samples), 1) * 100
-
-    logger.info(
-        f"Sample alignment: {len(overlap)}/{len(meta_samples)} ({pct:.1f}%) matched."
-    )
-
-    if pct < 50:
-        logger.warning(f"Low sample alignment: {pct:.1f}%")
+"""
+Data loading and validation utilities.
+"""
+import glob
+import os
+import time
+import numpy as np
+import pandas as pd
+import logging
+import openpyxl
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple, Union
+
+from src.cache import DiskCache, file_fingerprint, parquet_compatible, write_parquet
+from src.registry import SampleRegistry
+
+logger = logging.getLogger(__name__)
+
+
+def load_excel(
+    file_path: str,
+    meta_sheet: str,
+    matrix_sheet: str,
+    dict_sheet: str,
+    streaming: bool = False,
+    dtype: type = np.float64,
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Load three sheets from Excel file.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to Excel file.
+    meta_sheet : str
+        Name of metadata sheet.
+    matrix_sheet : str
+        Name of data matrix sheet.
+    dict_sheet : str
+        Name of data dictionary sheet.
+    streaming : bool
+        Use :func:`load_excel_streaming` (single read-only open, matrix
+        streamed into a preallocated array) instead of ``pd.read_excel``.
+    dtype : type
+        Intensity dtype for the streamed matrix (np.float64 or np.float32).
+
+    Returns
+    -------
+    Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]
+        (sample_metadata, data_matrix, data_dictionary)
+    """
+    if streaming:
+        return load_excel_streaming(
+            file_path, meta_sheet, matrix_sheet, dict_sheet, dtype=dtype
+        )
+
+    logger.info(f"Loading data from {file_path}")
+    try:
+        meta = pd.read_excel(file_path, sheet_name=meta_sheet)
+        matrix = pd.read_excel(file_path, sheet_name=matrix_sheet)
+        data_dict = pd.read_excel(file_path, sheet_name=dict_sheet)
+        logger.info(
+            f"Loaded: meta={meta.shape}, matrix={matrix.shape}, dict={data_dict.shape}"
+        )
+        return meta, matrix, data_dict
+    except Exception as e:
+        logger.error(f"Error loading Excel file: {e}")
+        raise
+
+
+def _sheet_to_frame(ws) -> pd.DataFrame:
+    """Read a (small) read-only worksheet into a DataFrame, header in row 1."""
+    rows = ws.iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        return pd.DataFrame()
+
+    records = [r for r in rows if any(v is not None for v in r)]
+    columns = [
+        f"Unnamed: {i}" if h is None else h for i, h in enumerate(header)
+    ]
+    df = pd.DataFrame.from_records(records, columns=columns)
+    # Drop trailing header-less columns that hold no data
+    empty = [c for c, h in zip(columns, header) if h is None and df[c].isna().all()]
+    df = df.drop(columns=empty).infer_objects()
+    # Match read_excel: missing cells in text columns are NaN, not None
+    obj_cols = df.columns[df.dtypes == object]
+    df[obj_cols] = df[obj_cols].where(df[obj_cols].notna(), np.nan)
+    return df
+
+
+def _stream_matrix(ws, dtype: type) -> pd.DataFrame:
+    """Stream a compounds × samples worksheet into a preallocated array."""
+    rows = ws.iter_rows(values_only=True)
+    header = next(rows)
+    # Trailing empty header cells are formatting leftovers, not samples
+    n_cols = len(header)
+    while n_cols > 1 and header[n_cols - 1] is None:
+        n_cols -= 1
+    id_col, samples = header[0], list(header[1:n_cols])
+
+    # The <dimension> tag is only a hint in read-only mode; grow if it is short
+    capacity = max((ws.max_row or 1) - 1, 1)
+    values = np.empty((capacity, len(samples)), dtype=dtype)
+    compound_ids = []
+
+    n = 0
+    for row in rows:
+        row = row[:n_cols]
+        if all(v is None for v in row):
+            continue
+        if n == capacity:
+            capacity *= 2
+            grown = np.empty((capacity, len(samples)), dtype=dtype)
+            grown[:n] = values[:n]
+            values = grown
+        cells = row[1:] + (None,) * (n_cols - len(row))
+        try:
+            values[n] = cells  # None → NaN
+        except (TypeError, ValueError):
+            values[n] = pd.to_numeric(pd.Series(cells, dtype=object), errors="coerce")
+        compound_ids.append(row[0])
+        n += 1
+
+    if n < capacity:
+        # Release the slack of a doubled buffer; a small overshoot stays a view
+        values = values[:n].copy() if n < capacity // 2 else values[:n]
+
+    matrix = pd.DataFrame(values, columns=samples, copy=False)
+    matrix.insert(0, id_col if id_col is not None else "compound_id", compound_ids)
+    return matrix
+
+
+def load_excel_streaming(
+    file_path: Union[str, Path],
+    meta_sheet: str,
+    matrix_sheet: str,
+    dict_sheet: str,
+    dtype: type = np.float64,
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Load three sheets opening the workbook once in read-only mode.
+
+    ``data_matrix`` rows are streamed straight into a preallocated NumPy
+    buffer (compounds × samples) while the compound index is collected, so
+    peak memory stays close to the size of the final intensity array instead
+    of an object-heavy intermediate frame. Non-numeric cells become NaN.
+
+    Parameters
+    ----------
+    file_path : str or Path
+        Path to Excel file.
+    meta_sheet : str
+        Name of metadata sheet.
+    matrix_sheet : str
+        Name of data matrix sheet.
+    dict_sheet : str
+        Name of data dictionary sheet.
+    dtype : type
+        Intensity dtype (np.float64 or np.float32).
+
+    Returns
+    -------
+    Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]
+        (sample_metadata, data_matrix, data_dictionary)
+    """
+    logger.info(f"Streaming data from {file_path}")
+    try:
+        wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            meta = _sheet_to_frame(wb[meta_sheet])
+            matrix = _stream_matrix(wb[matrix_sheet], dtype)
+            data_dict = _sheet_to_frame(wb[dict_sheet])
+        finally:
+            wb.close()
+        logger.info(
+            f"Loaded: meta={meta.shape}, matrix={matrix.shape}, dict={data_dict.shape}"
+        )
+        return meta, matrix, data_dict
+    except Exception as e:
+        logger.error(f"Error loading Excel file: {e}")
+        raise
+
+
+_CACHED_SHEETS = ("meta", "matrix", "dict")
+
+
+def load_excel_cached(
+    file_path: Union[str, Path],
+    meta_sheet: str,
+    matrix_sheet: str,
+    dict_sheet: str,
+    cache_dir: Union[str, Path] = ".cache/workbooks",
+    max_bytes: Optional[int] = None,
+    streaming: bool = False,
+    dtype: type = np.float64,
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Load the three sheets through a Parquet cache keyed by workbook content.
+
+    The first load parses the workbook with :func:`load_excel` and stores each
+    sheet as a Parquet file; later loads of the same file (same content hash
+    and mtime, parser mode and dtype) read the typed columns directly and
+    skip Excel parsing.
+    Column labels, and object columns mixing numbers with text, are stored
+    as strings; a cache miss returns the frames normalized the same way, so
+    cold and warm loads are identical.
+
+    Parameters
+    ----------
+    file_path : str or Path
+        Path to Excel file.
+    meta_sheet : str
+        Name of metadata sheet.
+    matrix_sheet : str
+        Name of data matrix sheet.
+    dict_sheet : str
+        Name of data dictionary sheet.
+    cache_dir : str or Path
+        Cache directory.
+    max_bytes : int, optional
+        Size bound for the cache directory (LRU eviction).
+    streaming : bool
+        Parse cache misses with the streaming reader (see :func:`load_excel`).
+        Part of the cache key, so each reader keeps its own entry.
+    dtype : type
+        Intensity dtype for the streamed matrix (see :func:`load_excel`).
+        Part of the cache key.
+
+    Returns
+    -------
+    Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]
+        (sample_metadata, data_matrix, data_dictionary)
+    """
+    cache = DiskCache(cache_dir, max_bytes=max_bytes)
+    reader = f"streaming-{np.dtype(dtype).name}" if streaming else "pandas"
+    key = f"{file_fingerprint(file_path)}-{meta_sheet}-{matrix_sheet}-{dict_sheet}-{reader}"
+
+    entry = cache.get(key)
+    if entry is not None:
+        try:
+            frames = tuple(
+                pd.read_parquet(entry / f"{name}.parquet") for name in _CACHED_SHEETS
+            )
+            logger.info(f"Loaded {file_path} from cache {entry}")
+            return frames
+        except Exception as e:
+            logger.warning(f"Corrupt cache entry {key}, reloading: {e}")
+            cache.invalidate(key)
+
+    frames = tuple(
+        parquet_compatible(df)
+        for df in load_excel(
+            file_path, meta_sheet, matrix_sheet, dict_sheet,
+            streaming=streaming, dtype=dtype,
+        )
+    )
+
+    def _write(target: Path) -> None:
+        for name, df in zip(_CACHED_SHEETS, frames):
+            write_parquet(df, target / f"{name}.parquet")
+
+    try:
+        cache.put(key, _write, metadata={"source": str(file_path)})
+    except Exception as e:
+        logger.warning(f"Could not cache {file_path}: {e}")
+    return frames
+
+
+def _resolve_workbooks(source: Union[str, Path, Sequence]) -> List[Path]:
+    """Expand a directory, glob pattern or explicit list into workbook paths."""
+    if isinstance(source, (list, tuple)):
+        return [Path(p) for p in source]
+    source = Path(source)
+    if source.is_dir():
+        return sorted(p for p in source.glob("*.xlsx") if not p.name.startswith("~$"))
+    return sorted(Path(p) for p in glob.glob(str(source)))
+
+
+def _load_batch(
+    file_path: Path, meta_sheet: str, matrix_sheet: str, dict_sheet: str, streaming: bool
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, float]:
+    """Worker: load one workbook and time it (module level so it pickles)."""
+    start = time.perf_counter()
+    frames = load_excel(file_path, meta_sheet, matrix_sheet, dict_sheet, streaming=streaming)
+    return (*frames, time.perf_counter() - start)
+
+
+def load_excel_batches(
+    source: Union[str, Path, Sequence],
+    meta_sheet: str,
+    matrix_sheet: str,
+    dict_sheet: str,
+    max_workers: Optional[int] = None,
+    use_processes: bool = True,
+    streaming: bool = True,
+    id_col: str = "compound_id",
+    batch_col: str = "batch",
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Load one workbook per acquisition batch concurrently and merge them.
+
+    Workbooks are parsed in a process pool (openpyxl parsing is CPU bound
+    and holds the GIL), compound IDs are unioned across batches, samples are
+    concatenated, and metadata rows are tagged with their batch (the file
+    stem). Compounds absent from a batch are NaN for that batch's samples.
+
+    Parameters
+    ----------
+    source : str, Path or Sequence
+        Directory of ``.xlsx`` files, glob pattern, or explicit list of paths.
+    meta_sheet : str
+        Name of metadata sheet.
+    matrix_sheet : str
+        Name of data matrix sheet.
+    dict_sheet : str
+        Name of data dictionary sheet.
+    max_workers : int, optional
+        Pool size; defaults to the number of CPUs (capped by file count).
+    use_processes : bool
+        Use a process pool (True) or a thread pool (False).
+    streaming : bool
+        Parse each workbook with the streaming reader.
+    id_col : str
+        Compound ID column in the matrix and dictionary sheets.
+    batch_col : str
+        Name of the batch column added to the metadata.
+
+    Returns
+    -------
+    Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]
+        (sample_metadata, data_matrix, data_dictionary, timings)
+        - timings: one row per file with 'file', 'seconds', 'n_samples',
+          'n_compounds'.
+
+    Raises
+    ------
+    ValueError
+        If no workbook matches ``source``, a compound ID is repeated within a
+        workbook, or a sample ID occurs in more than one batch.
+    """
+    files = _resolve_workbooks(source)
+    if not files:
+        raise ValueError(f"No workbooks found for {source}")
+
+    workers = min(max_workers or os.cpu_count() or 1, len(files))
+    pool_cls = ProcessPoolExecutor if use_processes and workers > 1 else ThreadPoolExecutor
+    logger.info(f"Loading {len(files)} batches with {workers} {pool_cls.__name__} workers...")
+
+    start = time.perf_counter()
+    with pool_cls(max_workers=workers) as pool:
+        loader = partial(
+            _load_batch,
+            meta_sheet=meta_sheet,
+            matrix_sheet=matrix_sheet,
+            dict_sheet=dict_sheet,
+            streaming=streaming,
+        )
+        results = list(pool.map(loader, files))
+
+    metas, matrices, dicts, timings = [], [], [], []
+    for path, (meta, matrix, data_dict, seconds) in zip(files, results):
+        ids = matrix[id_col]
+        if ids.duplicated().any():
+            dupes = ids[ids.duplicated()].unique().tolist()
+            raise ValueError(f"Duplicate {id_col} values in {path}: {dupes[:5]}")
+        metas.append(meta.assign(**{batch_col: path.stem}))
+        matrices.append(matrix.set_index(id_col))
+        dicts.append(data_dict)
+        timings.append(
+            {
+                "file": str(path),
+                "seconds": seconds,
+                "n_samples": matrix.shape[1] - 1,
+                "n_compounds": matrix.shape[0],
+            }
+        )
+
+    all_samples = pd.Index(np.concatenate([m.columns.astype(str) for m in matrices]))
+    if all_samples.has_duplicates:
+        dupes = all_samples[all_samples.duplicated()].unique().tolist()
+        raise ValueError(f"Sample IDs present in more than one batch: {dupes[:5]}")
+
+    matrix = pd.concat(matrices, axis=1, join="outer", sort=False)
+    matrix.index.name = id_col
+    matrix = matrix.reset_index()
+    meta = pd.concat(metas, ignore_index=True)
+    data_dict = pd.concat(dicts, ignore_index=True)
+    if id_col in data_dict.columns:
+        data_dict = data_dict.drop_duplicates(subset=id_col).reset_index(drop=True)
+    timings = pd.DataFrame(timings)
+
+    logger.info(
+        f"Merged {len(files)} batches in {time.perf_counter() - start:.2f}s "
+        f"(sum of per-file parse times {timings['seconds'].sum():.2f}s): "
+        f"meta={meta.shape}, matrix={matrix.shape}, dict={data_dict.shape}"
+    )
+    return meta, matrix, data_dict, timings
+
+
+def validate_align(
+    meta: pd.DataFrame, data_matrix: pd.DataFrame, sample_col: str = "sample_id"
+) -> Optional[SampleRegistry]:
+    """
+    Validate that sample IDs align between metadata and data matrix.
+
+    Parameters
+    ----------
+    meta : pd.DataFrame
+        Sample metadata.
+    data_matrix : pd.DataFrame
+        Data matrix (samples as rows or columns).
+    sample_col : str
+        Column name for sample IDs in metadata.
+
+    Returns
+    -------
+    SampleRegistry or None
+        Alignment (take-indices, missing/extra samples) reusable by later
+        stages; None if ``sample_col`` is absent.
+    """
+    if sample_col not in meta.columns:
+        logger.warning(f"Sample column '{sample_col}' not found in metadata.")
+        return None
+
+    registry = SampleRegistry.from_frames(meta, data_matrix, sample_col=sample_col)
+    pct = registry.overlap_pct
+
+    logger.info(
+        f"Sample alignment: {registry.n_meta - len(registry.missing)}/{registry.n_meta} "
+        f"({pct:.1f}%) matched; {len(registry.extra)} matrix samples without metadata."
+    )
+
+    if pct < 50:
+        logger.warning(f"Low sample alignment: {pct:.1f}%")
+    return registry
@@ -0,0 +1,216 @@
+"""
+Chunked ingestion of long-format (sample, compound, intensity) exports.
+"""
+import logging
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+logger = logging.getLogger(__name__)
+
+
+def _infer_sep(path: Path) -> str:
+    return "\t" if path.suffix.lower() in {".tsv", ".tab", ".txt"} else ","
+
+
+def _append_new(index: pd.Index, values: pd.Series) -> pd.Index:
+    """Append first-seen labels to an index, preserving order of appearance."""
+    uniq = pd.Index(pd.unique(values.astype(str)))
+    new = uniq[~uniq.isin(index)]
+    return index.append(new) if len(new) else index
+
+
+def _keep_last(rows: np.ndarray, cols: np.ndarray, n_rows: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Positions of the last measurement of each (row, col) cell, sorted column-major.
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        (positions into rows/cols, number of duplicates dropped)
+    """
+    key = cols.astype(np.int64) * n_rows + rows
+    # unique on the reversed keys finds each cell's last occurrence first
+    _, first_rev = np.unique(key[::-1], return_index=True)
+    keep = len(key) - 1 - first_rev
+    return keep, len(key) - len(keep)
+
+
+def read_long_format(
+    file_path: Union[str, Path],
+    sample_col: str = "sample_id",
+    compound_col: str = "compound_id",
+    value_col: str = "intensity",
+    sep: Optional[str] = None,
+    chunksize: int = 1_000_000,
+    dtype: type = np.float64,
+    min_density: float = 0.25,
+) -> Tuple[Union[np.ndarray, sparse.csc_matrix], pd.Index, pd.Index]:
+    """
+    Accumulate a long-format CSV/TSV into a compounds × samples matrix.
+
+    The file is read twice in chunks: the first pass collects the sample and
+    compound indices (in order of first appearance) and the row count, the
+    second scatters intensities straight into a preallocated array. When the
+    observed fraction of cells is below ``min_density`` a sparse CSC matrix
+    (one column per sample) is returned instead. Memory is bounded by the
+    output plus one chunk. Duplicate (sample, compound) measurements keep the
+    last value in both representations.
+
+    Parameters
+    ----------
+    file_path : str or Path
+        Long-format export with one row per (sample, compound) measurement.
+    sample_col : str
+        Column holding sample IDs.
+    compound_col : str
+        Column holding compound IDs.
+    value_col : str
+        Column holding intensities (non-numeric values become NaN).
+    sep : str, optional
+        Field separator; inferred from the extension when omitted
+        (tab for .tsv/.tab/.txt, comma otherwise).
+    chunksize : int
+        Rows per chunk.
+    dtype : type
+        Intensity dtype (np.float64 or np.float32).
+    min_density : float
+        Observed-cell fraction below which a sparse result is returned.
+
+    Returns
+    -------
+    Tuple[np.ndarray or sparse.csc_matrix, pd.Index, pd.Index]
+        (values, compound_index, sample_index)
+        - values: dense array with NaN for unobserved cells, or a CSC matrix
+          whose stored entries are the observed cells (measured zeros are
+          kept as explicit entries); unobserved cells mean missing (NaN).
+    """
+    path = Path(file_path)
+    sep = sep or _infer_sep(path)
+    read_kw = dict(sep=sep, chunksize=chunksize)
+
+    # --- Pass 1: indices and row count ---
+    samples, compounds = pd.Index([], dtype=object), pd.Index([], dtype=object)
+    n_rows = 0
+    for chunk in pd.read_csv(path, usecols=[sample_col, compound_col], dtype=str, **read_kw):
+        samples = _append_new(samples, chunk[sample_col])
+        compounds = _append_new(compounds, chunk[compound_col])
+        n_rows += len(chunk)
+
+    shape = (len(compounds), len(samples))
+    density = n_rows / max(shape[0] * shape[1], 1)
+    as_sparse = density < min_density
+    logger.info(
+        f"Long-format scan of {path.name}: {n_rows} rows, {shape[0]} compounds × "
+        f"{shape[1]} samples (density {density:.1%}, "
+        f"{'sparse CSC' if as_sparse else 'dense'} output)."
+    )
+
+    # --- Pass 2: scatter values ---
+    if as_sparse:
+        rows = np.empty(n_rows, dtype=np.int64)
+        cols = np.empty(n_rows, dtype=np.int64)
+        data = np.empty(n_rows, dtype=dtype)
+    else:
+        dense = np.full(shape, np.nan, dtype=dtype)
+
+    pos = 0
+    usecols = [sample_col, compound_col, value_col]
+    for chunk in pd.read_csv(path, usecols=usecols, dtype={sample_col: str, compound_col: str}, **read_kw):
+        r = compounds.get_indexer(chunk[compound_col].astype(str))
+        c = samples.get_indexer(chunk[sample_col].astype(str))
+        v = pd.to_numeric(chunk[value_col], errors="coerce").to_numpy(dtype=dtype)
+        if as_sparse:
+            rows[pos : pos + len(chunk)] = r
+            cols[pos : pos + len(chunk)] = c
+            data[pos : pos + len(chunk)] = v
+        else:
+            keep, _ = _keep_last(r, c, shape[0])
+            dense[r[keep], c[keep]] = v[keep]
+        pos += len(chunk)
+
+    if not as_sparse:
+        return dense, compounds, samples
+
+    keep, n_dup = _keep_last(rows, cols, shape[0])
+    if n_dup:
+        logger.warning(f"{n_dup} duplicate (sample, compound) rows in {path.name}; kept the last value.")
+    indptr = np.zeros(shape[1] + 1, dtype=np.int64)
+    np.cumsum(np.bincount(cols[keep], minlength=shape[1]), out=indptr[1:])
+    values = sparse.csc_matrix((data[keep], rows[keep], indptr), shape=shape)
+    return values, compounds, samples
+
+
+def long_to_data_matrix(
+    file_path: Union[str, Path],
+    sample_col: str = "sample_id",
+    compound_col: str = "compound_id",
+    value_col: str = "intensity",
+    sep: Optional[str] = None,
+    chunksize: int = 1_000_000,
+    dtype: type = np.float64,
+    id_col: str = "compound_id",
+    min_density: float = 0.25,
+) -> pd.DataFrame:
+    """
+    Build the wide ``data_matrix`` frame from a long-format export.
+
+    The result has the same layout as the ``data_matrix`` sheet returned by
+    :func:`src.io_utils.load_excel` (``id_col`` plus one column per sample)
+    and can be passed directly to ``build_feature_matrix``. Low-coverage
+    exports stay sparse: each sample column is a ``Sparse[float, nan]``
+    array built from one CSC column at a time, and ``build_feature_matrix``
+    densifies them column by column into its samples × compounds block.
+
+    Parameters
+    ----------
+    file_path : str or Path
+        Long-format export.
+    sample_col : str
+        Column holding sample IDs.
+    compound_col : str
+        Column holding compound IDs.
+    value_col : str
+        Column holding intensities.
+    sep : str, optional
+        Field separator (inferred from the extension when omitted).
+    chunksize : int
+        Rows per chunk.
+    dtype : type
+        Intensity dtype.
+    id_col : str
+        Name of the compound ID column in the output.
+    min_density : float
+        Observed-cell fraction below which sample columns are kept sparse.
+
+    Returns
+    -------
+    pd.DataFrame
+        Compounds × samples matrix; unobserved cells are NaN in both the
+        dense and the sparse layout.
+    """
+    values, compounds, samples = read_long_format(
+        file_path,
+        sample_col=sample_col,
+        compound_col=compound_col,
+        value_col=value_col,
+        sep=sep,
+        chunksize=chunksize,
+        dtype=dtype,
+        min_density=min_density,
+    )
+    if sparse.issparse(values):
+        columns = {}
+        for j, sample in enumerate(samples):
+            col = np.full(len(compounds), np.nan, dtype=dtype)
+            start, end = values.indptr[j], values.indptr[j + 1]
+            col[values.indices[start:end]] = values.data[start:end]
+            columns[sample] = pd.arrays.SparseArray(col, fill_value=np.nan)
+        matrix = pd.DataFrame(columns)
+    else:
+        matrix = pd.DataFrame(values, columns=samples, copy=False)
+    matrix.insert(0, id_col, compounds)
+    return matrix
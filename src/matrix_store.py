@@ -0,0 +1,295 @@
+"""
+Memory-mapped store for raw and preprocessed intensity matrices.
+"""
+import json
+import logging
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+def _as_slice(positions: np.ndarray) -> Optional[slice]:
+    """Return an equivalent slice if positions are a contiguous ascending run."""
+    if len(positions) == 0:
+        return slice(0, 0)
+    start = int(positions[0])
+    if np.array_equal(positions, np.arange(start, start + len(positions))):
+        return slice(start, start + len(positions))
+    return None
+
+
+class MatrixStore:
+    """
+    Directory of samples × compounds matrices saved as ``.npy`` files.
+
+    Each matrix ``<name>`` is stored as ``<name>.npy`` plus a
+    ``<name>.index.json`` sidecar holding the sample and compound labels.
+    Readers memory-map the arrays read-only, so several readers share the
+    operating system's page cache instead of holding private copies. It is
+    the input and output of :func:`src.out_of_core.preprocess_store`; the
+    app pages read ``Xknn`` from the feature cache
+    (:func:`src.preprocess.preprocess_cached`) and the sweep shares its raw
+    matrix through :func:`src.parallel.map_shared`.
+
+    Parameters
+    ----------
+    root : str or Path
+        Store directory (created if missing).
+    """
+
+    def __init__(self, root: Union[str, Path]):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _paths(self, name: str) -> Tuple[Path, Path]:
+        return self.root / f"{name}.npy", self.root / f"{name}.index.json"
+
+    def __contains__(self, name: str) -> bool:
+        array_path, index_path = self._paths(name)
+        return array_path.exists() and index_path.exists()
+
+    def names(self) -> List[str]:
+        """
+        List stored matrix names.
+
+        Returns
+        -------
+        List[str]
+            Names of complete (array + index) entries.
+        """
+        return sorted(
+            p.name[: -len(".index.json")]
+            for p in self.root.glob("*.index.json")
+            if p.name[: -len(".index.json")] in self
+        )
+
+    def write(
+        self,
+        name: str,
+        X: np.ndarray,
+        sample_ids: Sequence,
+        compound_ids: Sequence,
+        chunk_rows: int = 4096,
+    ) -> Path:
+        """
+        Write a matrix and its index sidecar.
+
+        Parameters
+        ----------
+        name : str
+            Matrix name (e.g. 'raw', 'preprocessed').
+        X : np.ndarray
+            Samples × compounds array (may itself be a memmap).
+        sample_ids : Sequence
+            Row labels, length X.shape[0].
+        compound_ids : Sequence
+            Column labels, length X.shape[1].
+        chunk_rows : int
+            Rows copied per step, bounding the extra memory used while writing.
+
+        Returns
+        -------
+        Path
+            Path of the written ``.npy`` file.
+        """
+        X = np.asarray(X)
+        if X.ndim != 2:
+            raise ValueError(f"Expected a 2-D matrix, got shape {X.shape}.")
+        with self.writer(name, X.shape, X.dtype, sample_ids, compound_ids) as out:
+            for start in range(0, X.shape[0], chunk_rows):
+                out[start : start + chunk_rows] = X[start : start + chunk_rows]
+        return self._paths(name)[0]
+
+    @contextmanager
+    def writer(
+        self,
+        name: str,
+        shape: Tuple[int, int],
+        dtype: Union[type, np.dtype],
+        sample_ids: Sequence,
+        compound_ids: Sequence,
+    ) -> Iterator[np.memmap]:
+        """
+        Open a writable memory map for a new matrix, filled block by block.
+
+        The array is written to a temporary file and only replaces ``name``
+        (together with its index sidecar) when the ``with`` block exits
+        without an error, so readers never see a half-written matrix.
+
+        Parameters
+        ----------
+        name : str
+            Matrix name.
+        shape : Tuple[int, int]
+            Samples × compounds shape.
+        dtype : type or np.dtype
+            Array dtype.
+        sample_ids : Sequence
+            Row labels, length shape[0].
+        compound_ids : Sequence
+            Column labels, length shape[1].
+
+        Yields
+        ------
+        np.memmap
+            Writable mapping of the temporary file.
+        """
+        shape = tuple(int(v) for v in shape)
+        if len(shape) != 2:
+            raise ValueError(f"Expected a 2-D matrix, got shape {shape}.")
+        if len(sample_ids) != shape[0] or len(compound_ids) != shape[1]:
+            raise ValueError(
+                f"Index lengths ({len(sample_ids)}, {len(compound_ids)}) "
+                f"do not match matrix shape {shape}."
+            )
+
+        array_path, index_path = self._paths(name)
+        tmp_array = array_path.with_suffix(".npy.tmp")
+        out = np.lib.format.open_memmap(tmp_array, mode="w+", dtype=dtype, shape=shape)
+        try:
+            yield out
+            out.flush()
+        except BaseException:
+            del out
+            tmp_array.unlink(missing_ok=True)
+            raise
+        del out
+
+        tmp_index = index_path.with_suffix(".json.tmp")
+        with open(tmp_index, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "samples": [str(s) for s in sample_ids],
+                    "compounds": [str(c) for c in compound_ids],
+                },
+                f,
+            )
+        os.replace(tmp_array, array_path)
+        os.replace(tmp_index, index_path)
+
+        logger.info(f"Stored matrix '{name}' {shape} ({np.dtype(dtype)}) at {array_path}")
+
+    def index(self, name: str) -> Tuple[pd.Index, pd.Index]:
+        """
+        Load the sample and compound labels of a stored matrix.
+
+        Parameters
+        ----------
+        name : str
+            Matrix name.
+
+        Returns
+        -------
+        Tuple[pd.Index, pd.Index]
+            (sample_index, compound_index)
+        """
+        _, index_path = self._paths(name)
+        with open(index_path, "r", encoding="utf-8") as f:
+            idx = json.load(f)
+        return pd.Index(idx["samples"]), pd.Index(idx["compounds"])
+
+    def read(
+        self,
+        name: str,
+        samples: Optional[Sequence] = None,
+        compounds: Optional[Sequence] = None,
+    ) -> Tuple[np.ndarray, pd.Index, pd.Index]:
+        """
+        Memory-map a stored matrix read-only, optionally subset by labels.
+
+        Subsets that select a contiguous run of rows/columns are returned as
+        zero-copy views; arbitrary label subsets are gathered, which copies
+        only the selected block.
+
+        Parameters
+        ----------
+        name : str
+            Matrix name.
+        samples : Sequence, optional
+            Sample labels to keep (in the given order).
+        compounds : Sequence, optional
+            Compound labels to keep (in the given order).
+
+        Returns
+        -------
+        Tuple[np.ndarray, pd.Index, pd.Index]
+            (X, sample_index, compound_index) for the selection.
+
+        Raises
+        ------
+        KeyError
+            If the matrix or a requested label does not exist.
+        """
+        if name not in self:
+            raise KeyError(f"Matrix '{name}' not found in {self.root}")
+
+        array_path, _ = self._paths(name)
+        X = np.load(array_path, mmap_mode="r")
+        sample_index, compound_index = self.index(name)
+
+        for axis, labels in ((0, samples), (1, compounds)):
+            if labels is None:
+                continue
+            full = sample_index if axis == 0 else compound_index
+            positions = full.get_indexer(pd.Index([str(v) for v in labels]))
+            if (positions < 0).any():
+                missing = [str(v) for v, p in zip(labels, positions) if p < 0]
+                raise KeyError(f"Labels not found in '{name}': {missing[:5]}")
+
+            sel = _as_slice(positions)
+            take = sel if sel is not None else positions
+            X = X[take, :] if axis == 0 else X[:, take]
+            if axis == 0:
+                sample_index = full[take]
+            else:
+                compound_index = full[take]
+
+        return X, sample_index, compound_index
+
+    def delete(self, name: str) -> None:
+        """
+        Remove a stored matrix and its sidecar.
+
+        Parameters
+        ----------
+        name : str
+            Matrix name.
+        """
+        for path in self._paths(name):
+            if path.exists():
+                path.unlink()
+
+
+def store_feature_matrices(
+    store: MatrixStore,
+    hoja2: pd.DataFrame,
+    Xknn: np.ndarray,
+    peaklist: List[str],
+) -> None:
+    """
+    Persist the raw and preprocessed outputs of ``build_feature_matrix``.
+
+    Writes two matrices sharing the same indices: 'raw' (the numeric
+    ``hoja2[peaklist]`` block) and 'preprocessed' (``Xknn``).
+
+    Parameters
+    ----------
+    store : MatrixStore
+        Target store.
+    hoja2 : pd.DataFrame
+        Feature table with 'SampleID' and compound columns.
+    Xknn : np.ndarray
+        Preprocessed matrix aligned with hoja2 rows and peaklist.
+    peaklist : List[str]
+        Compound columns used to build Xknn.
+    """
+    sample_ids = hoja2["SampleID"].astype(str).tolist()
+    raw = hoja2[peaklist].to_numpy(dtype=np.float64, na_value=np.nan)
+    store.write("raw", raw, sample_ids, peaklist)
+    store.write("preprocessed", Xknn, sample_ids, peaklist)
@@ -0,0 +1,300 @@
+"""
+Out-of-core (column-chunked, memory-mapped) log10 → scale → KNN preprocessing.
+"""
+import logging
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.spatial.distance import cdist
+
+from src.impute import impute_from_neighbors
+from src.matrix_store import MatrixStore
+from src.preprocess import Preprocessor
+from src.scaling import Scaler
+
+logger = logging.getLogger(__name__)
+
+# float64 working copies per chunk cell (log copy, nanmean/nanstd temporaries, masks)
+_BYTES_PER_CELL = 4 * 8
+
+
+def chunk_columns(n_rows: int, n_cols: int, memory_budget: int) -> int:
+    """
+    Number of columns per chunk that keeps the working set within budget.
+
+    Parameters
+    ----------
+    n_rows : int
+        Number of samples.
+    n_cols : int
+        Number of compounds.
+    memory_budget : int
+        Bytes available for per-chunk temporaries.
+
+    Returns
+    -------
+    int
+        Columns per chunk (at least 1, at most n_cols).
+    """
+    per_col = max(n_rows, 1) * _BYTES_PER_CELL
+    return int(min(max(memory_budget // per_col, 1), max(n_cols, 1)))
+
+
+def _column_chunks(n_cols: int, step: int) -> Iterator[slice]:
+    for start in range(0, n_cols, step):
+        yield slice(start, min(start + step, n_cols))
+
+
+def knn_impute_out_of_core(
+    out: np.ndarray,
+    k: int = 3,
+    memory_budget: int = 512 * 2**20,
+    complete: Optional[np.ndarray] = None,
+) -> int:
+    """
+    In-place KNN imputation of a (memory-mapped) matrix, reading column chunks.
+
+    Same semantics as :func:`src.impute.knn_impute`: distances on the
+    features observed in every sample, inverse-distance weights, tie
+    extension and window sliding. Squared distances from the samples with
+    missing values to every sample are accumulated over column chunks, so
+    only ``n_missing_rows × n_samples`` distances are held in memory (they
+    count against ``memory_budget`` when sizing the chunks); neighbour values
+    are then gathered for the missing cells only.
+    Imputed values are written after all rows are processed, so every row
+    is imputed from the original (not already imputed) values.
+
+    Parameters
+    ----------
+    out : np.ndarray
+        Writable samples × features matrix with NaNs (e.g. a memmap).
+    k : int
+        Number of nearest neighbours. Values above n_samples - 1 are clamped.
+    memory_budget : int
+        Bytes available for per-chunk temporaries.
+    complete : np.ndarray, optional
+        Boolean mask of the columns without NaNs, if already known.
+
+    Returns
+    -------
+    int
+        Number of imputed cells.
+
+    Raises
+    ------
+    ValueError
+        If k is not a positive integer or every feature has missing values.
+    """
+    if not isinstance(k, (int, np.integer)) or isinstance(k, bool):
+        raise ValueError("k is not an integer")
+    if k < 1:
+        raise ValueError("k must be greater than zero")
+
+    n, p = out.shape
+    step = chunk_columns(n, p, memory_budget)
+    row_missing = np.zeros(n, dtype=bool)
+    col_missing = np.zeros(p, dtype=bool)
+    for sl in _column_chunks(p, step):
+        nan_mask = np.isnan(out[:, sl])
+        row_missing |= nan_mask.any(axis=1)
+        col_missing[sl] = nan_mask.any(axis=0)
+    if complete is None:
+        complete = ~col_missing
+
+    rows_missing = np.flatnonzero(row_missing)
+    if len(rows_missing) == 0:
+        logger.info("KNN impute: no missing values.")
+        return 0
+    if k > n - 1:
+        logger.warning(f"k={k} is too high for {n - 1} neighbours; using k={n - 1}.")
+        k = n - 1
+    if k < 1:
+        raise ValueError("At least two samples are required for KNN imputation.")
+    if not complete.any():
+        raise ValueError(
+            "All colummns of the input data contain missing values. "
+            "Unable to impute missing values."
+        )
+
+    # Squared distances (missing rows × all rows) over the complete columns;
+    # the accumulator and cdist's per-chunk result come out of the budget
+    dist_bytes = 2 * len(rows_missing) * n * 8
+    if dist_bytes >= memory_budget:
+        logger.warning(
+            f"Distance block of {len(rows_missing)} × {n} samples ({dist_bytes / 2**20:.0f} MB) "
+            f"exceeds the budget of {memory_budget / 2**20:.0f} MB; reading one column at a time."
+        )
+    step = chunk_columns(n, p, max(memory_budget - dist_bytes, 0))
+    d2 = np.zeros((len(rows_missing), n))
+    cols = np.flatnonzero(complete)
+    for start in range(0, len(cols), step):
+        block = np.asarray(out[:, cols[start : start + step]], dtype=np.float64)
+        d2 += cdist(block[rows_missing], block, "sqeuclidean")
+    dist = np.sqrt(d2, out=d2)
+
+    pending: List[Tuple[int, np.ndarray, np.ndarray]] = []
+    left = 0
+    others = np.arange(n)
+    for i, row in enumerate(rows_missing):
+        pool = np.delete(others, row)
+        order = np.lexsort((pool, dist[i, pool]))
+        feats, values = impute_from_neighbors(out, row, pool[order], dist[i, pool[order]], k)
+        left += int(np.count_nonzero(np.isnan(out[row]))) - len(feats)
+        pending.append((row, feats, values))
+    for row, feats, values in pending:
+        out[row, feats] = values
+
+    imputed = sum(int(np.count_nonzero(~np.isnan(values))) for _, _, values in pending)
+    if left:
+        logger.warning(f"{left} missing values could not be imputed (no observed neighbours).")
+    logger.info(f"KNN imputed {imputed} values in {len(rows_missing)} samples (k={k}, out-of-core).")
+    return imputed
+
+
+def preprocess_out_of_core(
+    X: np.ndarray,
+    out: np.ndarray,
+    scale_method: str = "auto",
+    knn_k: int = 3,
+    log_offset: float = 0.5,
+    memory_budget: int = 512 * 2**20,
+    feature_names: Optional[Sequence[str]] = None,
+) -> Preprocessor:
+    """
+    Log10 + scale + KNN-impute a matrix that does not fit in memory.
+
+    ``X`` (typically a read-only memmap of the raw matrix) is read in
+    column chunks sized from ``memory_budget`` and the result is written
+    chunk by chunk into ``out`` (a writable memmap of the same shape):
+
+    1. First pass: global minimum positive intensity (``minpos``), the only
+       statistic that spans every compound.
+    2. Second pass: per chunk, replace zeros/NaNs, log10, fit the scaling
+       statistics of its columns (they are per-compound, so a column chunk
+       holds everything they need), scale and write to ``out``.
+    3. KNN imputation only if NaNs remain (see
+       :func:`knn_impute_out_of_core`).
+
+    Results match ``Preprocessor.fit_transform`` up to floating-point
+    summation order. Peak memory is about ``memory_budget`` plus the
+    operating system's page cache (at least one column of temporaries).
+
+    Parameters
+    ----------
+    X : np.ndarray
+        Raw samples × compounds intensities (e.g. ``np.load(..., mmap_mode='r')``).
+    out : np.ndarray
+        Writable float64 output of the same shape.
+    scale_method : str
+        Scaling method ('auto', 'pareto', 'vast', 'level', 'range').
+    knn_k : int
+        Number of neighbors for KNN imputation.
+    log_offset : float
+        Offset multiplier for min positive value to handle zeros.
+    memory_budget : int
+        Bytes available for per-chunk temporaries.
+    feature_names : Sequence[str], optional
+        Compound names stored on the returned preprocessor.
+
+    Returns
+    -------
+    Preprocessor
+        Fitted preprocessor; its ``reference_`` is ``out`` (not copied, and
+        including any imputed cells).
+    """
+    if X.ndim != 2 or out.shape != X.shape:
+        raise ValueError(f"Output shape {out.shape} does not match input {X.shape}.")
+    pre = Preprocessor(scale_method, knn_k=knn_k, log_offset=log_offset)
+    n, p = X.shape
+    step = chunk_columns(n, p, memory_budget)
+    n_chunks = -(-p // step) if p else 0
+    logger.info(
+        f"Out-of-core preprocessing {n} × {p} in {n_chunks} chunks of {step} columns "
+        f"(budget {memory_budget / 2**20:.0f} MB)."
+    )
+
+    # --- Pass 1: global minimum positive intensity ---
+    minpos = np.inf
+    for sl in _column_chunks(p, step):
+        block = np.asarray(X[:, sl])
+        minpos = min(minpos, float(np.min(block, where=block > 0, initial=np.inf)))
+    pre.minpos_ = minpos if np.isfinite(minpos) else 1e-6
+
+    # --- Pass 2: log10 + per-column scaling statistics + scale, chunk by chunk ---
+    params = {"mean": np.empty(p), "std": np.empty(p), "range": None}
+    if scale_method == "range":
+        params["range"] = np.empty(p)
+    complete = np.empty(p, dtype=bool)
+    for sl in _column_chunks(p, step):
+        Xlog = pre._log(np.asarray(X[:, sl], dtype=np.float64))
+        scaler = Scaler(scale_method, block_size=step).fit(Xlog)
+        Xscale = scaler.transform(Xlog, copy=False)
+        complete[sl] = ~np.isnan(Xscale).any(axis=0)
+        out[:, sl] = Xscale
+        params["mean"][sl] = scaler.mean_
+        params["std"][sl] = scaler.std_
+        if scaler.range_ is not None:
+            params["range"][sl] = scaler.range_
+
+    pre.scaler_ = Scaler.from_params({"method": scale_method, "ddof": 1, **params})
+    pre.reference_ = out
+    pre.feature_names_ = None if feature_names is None else [str(c) for c in feature_names]
+
+    # --- Pass 3: KNN imputation (only when scaling left NaNs) ---
+    if not complete.all():
+        knn_impute_out_of_core(out, k=knn_k, memory_budget=memory_budget, complete=complete)
+    if isinstance(out, np.memmap):
+        out.flush()
+    return pre
+
+
+def preprocess_store(
+    store: MatrixStore,
+    source: str = "raw",
+    target: str = "preprocessed",
+    scale_method: str = "auto",
+    knn_k: int = 3,
+    log_offset: float = 0.5,
+    memory_budget: int = 512 * 2**20,
+) -> Preprocessor:
+    """
+    Preprocess a stored matrix into another stored matrix, out of core.
+
+    Parameters
+    ----------
+    store : MatrixStore
+        Store holding ``source`` (e.g. written by
+        :func:`src.matrix_store.store_feature_matrices` or chunk by chunk
+        with :meth:`MatrixStore.writer`).
+    source : str
+        Raw matrix name.
+    target : str
+        Output matrix name (same sample and compound index as ``source``).
+    scale_method : str
+        Scaling method ('auto', 'pareto', 'vast', 'level', 'range').
+    knn_k : int
+        Number of neighbors for KNN imputation.
+    log_offset : float
+        Offset multiplier for min positive value to handle zeros.
+    memory_budget : int
+        Bytes available for per-chunk temporaries.
+
+    Returns
+    -------
+    Preprocessor
+        Fitted preprocessor whose ``reference_`` is the stored target,
+        mapped read-only.
+    """
+    X, samples, compounds = store.read(source)
+    with store.writer(target, X.shape, np.float64, samples, compounds) as out:
+        pre = preprocess_out_of_core(
+            X,
+            out,
+            scale_method=scale_method,
+            knn_k=knn_k,
+            log_offset=log_offset,
+            memory_budget=memory_budget,
+            feature_names=compounds,
+        )
+    pre.reference_, _, _ = store.read(target)
+    return pre
@@ -0,0 +1,148 @@
+"""
+Process-pool helpers that share a read-only numpy array through shared memory.
+"""
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Per-process state set by _init_worker (or directly for serial runs)
+_WORKER: Dict[str, Any] = {}
+
+
+class SharedArray:
+    """
+    Copy of a numpy array in a ``multiprocessing.shared_memory`` block.
+
+    Workers attach to the block by name (see :meth:`spec` and
+    :func:`attach_shared`) instead of receiving a pickled copy per task.
+    Use as a context manager so the block is unlinked when done.
+
+    Parameters
+    ----------
+    array : np.ndarray
+        Array to share (copied once into the block).
+    """
+
+    def __init__(self, array: np.ndarray):
+        array = np.asarray(array)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        self.array = np.ndarray(array.shape, dtype=array.dtype, buffer=self.shm.buf)
+        self.array[...] = array
+
+    @property
+    def spec(self) -> Tuple[str, Tuple[int, ...], str]:
+        """(block name, shape, dtype string) needed to attach from another process."""
+        return self.shm.name, self.array.shape, self.array.dtype.str
+
+    def close(self) -> None:
+        """Release the view and unlink the block."""
+        self.array = None
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self) -> "SharedArray":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def attach_shared(
+    spec: Tuple[str, Tuple[int, ...], str]
+) -> Tuple[np.ndarray, shared_memory.SharedMemory]:
+    """
+    Attach to a :class:`SharedArray` from a worker process.
+
+    Parameters
+    ----------
+    spec : Tuple[str, Tuple[int, ...], str]
+        ``SharedArray.spec`` of the block.
+
+    Returns
+    -------
+    Tuple[np.ndarray, shared_memory.SharedMemory]
+        (read-only array view, block handle to keep alive while the view is used)
+    """
+    name, shape, dtype = spec
+    # Workers share the parent's resource tracker, so attaching does not
+    # transfer ownership: the block is unlinked by SharedArray.close().
+    shm = shared_memory.SharedMemory(name=name)
+    array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+    array.flags.writeable = False
+    return array, shm
+
+
+def _init_worker(spec: Tuple[str, Tuple[int, ...], str], context: Dict[str, Any]) -> None:
+    array, shm = attach_shared(spec)
+    _WORKER.update(array=array, shm=shm, context=context)
+
+
+def worker_array() -> np.ndarray:
+    """Shared array of the current :func:`map_shared` call (inside a task)."""
+    return _WORKER["array"]
+
+
+def worker_context() -> Dict[str, Any]:
+    """Context dict of the current :func:`map_shared` call (inside a task)."""
+    return _WORKER["context"]
+
+
+def map_shared(
+    fn: Callable[[Any], Any],
+    tasks: Sequence[Any],
+    array: np.ndarray,
+    context: Optional[Dict[str, Any]] = None,
+    n_jobs: Optional[int] = None,
+) -> List[Any]:
+    """
+    Run ``fn(task)`` for every task in a process pool sharing one array.
+
+    The array is placed once in shared memory and ``context`` is sent once
+    per worker (pool initializer); tasks only carry their own small payload.
+    Inside ``fn`` use :func:`worker_array` and :func:`worker_context`.
+
+    Parameters
+    ----------
+    fn : Callable
+        Module-level (picklable) function taking one task.
+    tasks : Sequence
+        Task payloads.
+    array : np.ndarray
+        Read-only input shared by all tasks.
+    context : Dict[str, Any], optional
+        Small extra inputs shared by all tasks (e.g. labels).
+    n_jobs : int, optional
+        Worker processes; defaults to the number of CPUs. 1 runs serially
+        in this process without shared memory.
+
+    Returns
+    -------
+    List[Any]
+        Results in task order.
+    """
+    context = context or {}
+    workers = min(n_jobs or os.cpu_count() or 1, len(tasks))
+    if workers <= 1:
+        view = np.asarray(array).view()
+        view.flags.writeable = False
+        _WORKER.update(array=view, shm=None, context=context)
+        try:
+            return [fn(task) for task in tasks]
+        finally:
+            _WORKER.clear()
+
+    with SharedArray(array) as shared:
+        logger.info(
+            f"Running {len(tasks)} tasks on {workers} processes "
+            f"(shared {shared.array.nbytes / 1e6:.1f} MB input)"
+        )
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(shared.spec, context)
+        ) as pool:
+            return list(pool.map(fn, tasks))
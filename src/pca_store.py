@@ -0,0 +1,143 @@
+"""
+On-disk store of fitted PCA models keyed by data fingerprint, sample subset and PCA settings.
+"""
+import json
+import logging
+from pathlib import Path
+from typing import Optional, Sequence, Union
+
+import numpy as np
+
+from src.cache import DiskCache
+from src.pca_utils import IncrementalPCAModel, PCAModel
+from src.preprocess import feature_cache_key
+
+logger = logging.getLogger(__name__)
+
+# Bump when the stored model state changes (2: per-feature variances)
+PCA_STORE_VERSION = 2
+
+
+class PCAResultStore:
+    """
+    Fitted PCA models shared across sessions, pages and processes.
+
+    Models are keyed by the fingerprint of the preprocessed matrix (e.g. the
+    :func:`src.preprocess.feature_cache_key` of the raw input and its
+    preprocessing parameters), the rows of the subset they were fitted on
+    and the PCA settings. Subsets are sliced from the already preprocessed
+    cohort matrix instead of being preprocessed again, so a repeated view is
+    a lookup plus a small ``.npz`` load.
+
+    Parameters
+    ----------
+    cache_dir : str or Path
+        Store directory (a :class:`src.cache.DiskCache`).
+    max_bytes : int, optional
+        Size bound of the store (LRU eviction).
+    """
+
+    def __init__(self, cache_dir: Union[str, Path] = ".cache/pca", max_bytes: Optional[int] = None):
+        self.cache = DiskCache(cache_dir, max_bytes=max_bytes)
+
+    @staticmethod
+    def key(
+        data_key: str,
+        rows: Optional[Sequence[int]] = None,
+        n_components: int = 2,
+        incremental: bool = False,
+        batch_size: Optional[int] = None,
+    ) -> str:
+        """
+        Store key of one PCA result.
+
+        Parameters
+        ----------
+        data_key : str
+            Fingerprint of the preprocessed cohort matrix.
+        rows : Sequence[int], optional
+            Row positions of the subset (None for all samples).
+        n_components : int
+            Fitted components.
+        incremental : bool
+            Whether the model is fitted by sample batches.
+        batch_size : int, optional
+            Batch size of incremental fits.
+
+        Returns
+        -------
+        str
+            Hex key.
+        """
+        subset = "all" if rows is None else np.asarray(rows, dtype=np.int64)
+        return feature_cache_key(
+            f"pca-v{PCA_STORE_VERSION}", data_key, subset, int(n_components), bool(incremental), batch_size if incremental else None
+        )
+
+    def get_or_fit(
+        self,
+        Xknn: np.ndarray,
+        data_key: str,
+        rows: Optional[Sequence[int]] = None,
+        n_components: int = 2,
+        incremental: bool = False,
+        batch_size: Optional[int] = None,
+    ) -> PCAModel:
+        """
+        Load a stored PCA result or fit and store it.
+
+        Parameters
+        ----------
+        Xknn : np.ndarray
+            Preprocessed cohort matrix (samples × features) that ``data_key``
+            fingerprints; only read on a miss.
+        data_key : str
+            Fingerprint of ``Xknn``.
+        rows : Sequence[int], optional
+            Subset row positions; the model is fitted on ``Xknn[rows]``.
+        n_components : int
+            Components to fit.
+        incremental : bool
+            Fit an :class:`src.pca_utils.IncrementalPCAModel`.
+        batch_size : int, optional
+            Samples per batch when incremental.
+
+        Returns
+        -------
+        PCAModel
+            Fitted model with scores for the selected rows (stored models
+            come back as a plain PCAModel).
+        """
+        key = self.key(data_key, rows, n_components, incremental, batch_size)
+        entry = self.cache.get(key)
+        if entry is not None:
+            try:
+                with np.load(entry / "pca.npz", allow_pickle=False) as data:
+                    arrays = {name: data[name] for name in data.files}
+                config = json.loads((entry / "pca.json").read_text(encoding="utf-8"))
+                return PCAModel.from_state(config, arrays)
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Corrupt PCA store entry {key}, refitting: {e}")
+                self.cache.invalidate(key)
+
+        X = Xknn if rows is None else np.asarray(Xknn)[np.asarray(rows, dtype=np.int64)]
+        if incremental:
+            model = IncrementalPCAModel(min(n_components, X.shape[0]), batch_size=batch_size).fit(X)
+        else:
+            model = PCAModel(n_components=n_components).fit(X)
+
+        config, arrays = model.get_state()
+
+        def _write(target: Path) -> None:
+            np.savez(target / "pca.npz", **arrays)
+            (target / "pca.json").write_text(json.dumps(config), encoding="utf-8")
+
+        try:
+            self.cache.put(
+                key,
+                _write,
+                metadata={"shape": list(X.shape), "n_components": config["n_components"], "solver": model.solver_},
+            )
+        except OSError as e:
+            logger.warning(f"Could not store PCA result: {e}")
+        return model
@@ -1,43 +1,690 @@
-"""
-PCA utilities using cimcb_lite.
-"""
-import numpy as np
-import pandas as pd
-import logging
-import cimcb_lite as cb
-
-logger = logging.getLogger(__name__)
-
-
-def run_pca_cimcb(
-    Xknn: np.ndarray,
-    group_label: pd.Series,
-    pcx: int = 1,
-    pcy: int = 2,
-) -> None:
-    """
-    Run PCA using cimcb_lite and plot scores/loadings.
-
-    Parameters
-    ----------
-    Xknn : np.ndarray
-        Preprocessed feature matrix (samples × features).
-    group_label : pd.Series
-        Sample group labels for coloring (e.g., 'Class').
-    pcx : int
-        Principal component for x-axis.
-    pcy : int
-        Principal component for y-axis.
-
-    Returns
-    -------
-    None
-        Displays PCA plot via cb.plot.pca.
-    """
-    logger.info(f"Running PCA with pcx={pcx}, pcy={pcy}...")
-    try:
-        cb.plot.pca(Xknn, pcx=pcx, pcy=pcy, group_label=group_label)
-        logger.info("PCA plot generated successfully.")
-    except Exception as e:
-        logger.error(f"PCA plotting failed: {e}")
-        raise
+"""
+PCA utilities: reusable PCA model (full/randomized/truncated SVD) and cimcb_lite wrapper.
+"""
+import time
+import numpy as np
+import pandas as pd
+import logging
+from typing import Any, Dict, Iterator, Optional, Sequence, Tuple
+import cimcb_lite as cb
+from scipy.linalg import subspace_angles
+from sklearn.decomposition import PCA, IncrementalPCA
+from sklearn.metrics import silhouette_score
+from src.preprocess import normalize_compound_name
+
+logger = logging.getLogger(__name__)
+
+PCA_SOLVERS = ("auto", "full", "randomized", "arpack")
+
+# Below this many samples/features a full LAPACK SVD is already fast
+_FULL_SVD_MAX_DIM = 1000
+
+
+def choose_pca_solver(n_samples: int, n_features: int, n_components: int) -> str:
+    """
+    Pick the SVD solver for a PCA of the given size.
+
+    - 'full': exact LAPACK SVD when the smaller dimension is at most 1000
+      (cost grows with min(n, p)² · max(n, p)) or almost every component
+      is requested;
+    - 'randomized': randomized SVD (Halko et al.) when only a few components
+      (≤ 10% of min(n, p)) are needed from a large matrix;
+    - 'arpack': truncated SVD (ARPACK) for larger component counts.
+
+    Parameters
+    ----------
+    n_samples : int
+        Number of samples (rows).
+    n_features : int
+        Number of features (columns).
+    n_components : int
+        Number of components to compute.
+
+    Returns
+    -------
+    str
+        One of 'full', 'randomized', 'arpack'.
+    """
+    min_dim = min(n_samples, n_features)
+    if min_dim <= _FULL_SVD_MAX_DIM or n_components >= min_dim - 1:
+        return "full"
+    if n_components <= 0.1 * min_dim:
+        return "randomized"
+    return "arpack"
+
+
+class PCAModel:
+    """
+    Fitted PCA reusable across plots, component pairs and new samples.
+
+    ``fit`` computes ``n_components`` components once (scores, loadings,
+    explained variance); any PC pair is then read from ``scores_`` without
+    refitting. The SVD solver is chosen from the matrix shape (see
+    :func:`choose_pca_solver`) unless given, and ``dtype=np.float32`` halves
+    memory and roughly doubles BLAS throughput for large matrices. Scores
+    follow scikit-learn's PCA sign convention (with the 'full' solver they
+    equal ``PCA(n_components=k, svd_solver='full')``).
+
+    Parameters
+    ----------
+    n_components : int
+        Number of components (clamped to min(n_samples, n_features)).
+    solver : str
+        'auto', 'full', 'randomized' or 'arpack'.
+    dtype : type
+        Working dtype (np.float64 or np.float32).
+    random_state : int, optional
+        Seed of the randomized solver.
+
+    Attributes
+    ----------
+    solver_ : str
+        Solver actually used.
+    mean_ : np.ndarray
+        Per-feature mean used for centering.
+    components_ : np.ndarray
+        Components × features matrix (rows are unit vectors).
+    explained_variance_ : np.ndarray
+        Variance of each component's scores.
+    explained_variance_ratio_ : np.ndarray
+        Share of the total variance explained by each component.
+    scores_ : np.ndarray
+        Samples × components scores of the fitted data.
+    feature_var_ : np.ndarray
+        Per-feature variance of the fitted data (for squared cosines, see
+        :func:`top_loadings`).
+    fit_seconds_ : float
+        Wall time of the fit.
+    """
+
+    def __init__(
+        self,
+        n_components: int = 2,
+        solver: str = "auto",
+        dtype: type = np.float64,
+        random_state: Optional[int] = 42,
+    ):
+        if solver not in PCA_SOLVERS:
+            raise ValueError(f"solver has to be one of {PCA_SOLVERS}, got '{solver}'.")
+        if np.dtype(dtype) not in (np.float32, np.float64):
+            raise ValueError(f"dtype has to be float32 or float64, got {np.dtype(dtype)}.")
+        self.n_components = n_components
+        self.solver = solver
+        self.dtype = np.dtype(dtype)
+        self.random_state = random_state
+        self.solver_: Optional[str] = None
+        self.mean_: Optional[np.ndarray] = None
+        self.components_: Optional[np.ndarray] = None
+        self.explained_variance_: Optional[np.ndarray] = None
+        self.explained_variance_ratio_: Optional[np.ndarray] = None
+        self.scores_: Optional[np.ndarray] = None
+        self.feature_var_: Optional[np.ndarray] = None
+        self.fit_seconds_: Optional[float] = None
+
+    @property
+    def is_fitted(self) -> bool:
+        """Whether fit() has been called."""
+        return self.components_ is not None
+
+    @property
+    def loadings_(self) -> np.ndarray:
+        """Features × components loadings (transpose of ``components_``)."""
+        return self.components_.T
+
+    def fit(self, X: np.ndarray) -> "PCAModel":
+        """
+        Fit the decomposition on a preprocessed matrix.
+
+        Parameters
+        ----------
+        X : np.ndarray
+            Samples × features matrix without NaNs (e.g. Xknn).
+
+        Returns
+        -------
+        PCAModel
+            The fitted model.
+        """
+        start = time.perf_counter()
+        Xa = np.asarray(X, dtype=self.dtype)
+        if Xa.ndim != 2:
+            raise ValueError(f"Expected a 2-D matrix, got shape {Xa.shape}.")
+        n, p = Xa.shape
+        k = max(1, min(int(self.n_components), n, p))
+        solver = self.solver if self.solver != "auto" else choose_pca_solver(n, p, k)
+        if solver == "arpack" and k >= min(n, p):
+            solver = "full"  # ARPACK needs k < min(n, p)
+
+        feature_var = Xa.var(axis=0, ddof=1) if n > 1 else np.zeros(p, dtype=self.dtype)
+        # Center a private copy in place when the dtype conversion already made one
+        owned = not np.shares_memory(Xa, np.asarray(X)) and Xa.flags.writeable
+        pca = PCA(n_components=k, svd_solver=solver, copy=not owned, random_state=self.random_state)
+        self.scores_ = pca.fit_transform(Xa)
+        self.solver_ = solver
+        self.mean_ = pca.mean_
+        self.components_ = pca.components_
+        self.explained_variance_ = pca.explained_variance_
+        self.explained_variance_ratio_ = pca.explained_variance_ratio_
+        self.feature_var_ = feature_var
+        self.fit_seconds_ = time.perf_counter() - start
+        logger.info(
+            f"PCA fit {n} × {p} ({self.dtype.name}, k={k}, solver='{solver}') "
+            f"in {self.fit_seconds_:.2f}s; explained {self.explained_variance_ratio_.sum():.1%}"
+        )
+        return self
+
+    def transform(self, X: np.ndarray) -> np.ndarray:
+        """
+        Project samples onto the fitted components.
+
+        Parameters
+        ----------
+        X : np.ndarray
+            Samples × features matrix preprocessed like the fitted data.
+
+        Returns
+        -------
+        np.ndarray
+            Samples × components scores.
+        """
+        if not self.is_fitted:
+            raise ValueError("PCAModel is not fitted; call fit() first.")
+        Xa = np.asarray(X, dtype=self.dtype)
+        if Xa.ndim == 1:
+            Xa = Xa[None, :]
+        if Xa.shape[1] != self.components_.shape[1]:
+            raise ValueError(
+                f"X has {Xa.shape[1]} features, PCA was fitted on {self.components_.shape[1]}."
+            )
+        return (Xa - self.mean_) @ self.components_.T
+
+    def fit_transform(self, X: np.ndarray) -> np.ndarray:
+        """
+        Fit on X and return its scores.
+
+        Parameters
+        ----------
+        X : np.ndarray
+            Samples × features matrix without NaNs.
+
+        Returns
+        -------
+        np.ndarray
+            Samples × components scores.
+        """
+        return self.fit(X).scores_
+
+    def get_state(self) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+        """
+        Export the fitted state as a JSON-able config and named arrays.
+
+        Returns
+        -------
+        Tuple[Dict[str, Any], Dict[str, np.ndarray]]
+            (config, arrays) accepted by :meth:`from_state`.
+        """
+        if not self.is_fitted:
+            raise ValueError("PCAModel is not fitted; call fit() first.")
+        config = {
+            "n_components": int(self.components_.shape[0]),
+            "solver": self.solver_,
+            "dtype": self.dtype.name,
+            "fit_seconds": self.fit_seconds_,
+        }
+        arrays = {
+            "mean": self.mean_,
+            "components": self.components_,
+            "explained_variance": self.explained_variance_,
+            "explained_variance_ratio": self.explained_variance_ratio_,
+        }
+        if self.scores_ is not None:
+            arrays["scores"] = self.scores_
+        if self.feature_var_ is not None:
+            arrays["feature_var"] = self.feature_var_
+        return config, arrays
+
+    @classmethod
+    def from_state(cls, config: Dict[str, Any], arrays: Dict[str, np.ndarray]) -> "PCAModel":
+        """
+        Rebuild a fitted (frozen) model from :meth:`get_state` output.
+
+        Parameters
+        ----------
+        config : Dict[str, Any]
+            Exported config.
+        arrays : Dict[str, np.ndarray]
+            Exported arrays.
+
+        Returns
+        -------
+        PCAModel
+            Fitted model (incremental models come back as a plain PCAModel).
+        """
+        model = PCAModel(n_components=config["n_components"], dtype=np.dtype(config["dtype"]))
+        model.solver_ = config["solver"]
+        model.fit_seconds_ = config.get("fit_seconds")
+        model.mean_ = arrays["mean"]
+        model.components_ = arrays["components"]
+        model.explained_variance_ = arrays["explained_variance"]
+        model.explained_variance_ratio_ = arrays["explained_variance_ratio"]
+        model.scores_ = arrays.get("scores")
+        model.feature_var_ = arrays.get("feature_var")
+        return model
+
+    def pair(self, pcx: int = 1, pcy: int = 2) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Scores of one component pair (1-based), without refitting.
+
+        Parameters
+        ----------
+        pcx : int
+            Component on the x-axis.
+        pcy : int
+            Component on the y-axis.
+
+        Returns
+        -------
+        Tuple[np.ndarray, np.ndarray]
+            (scores (n_samples × 2), explained variance ratios (2,))
+        """
+        if not self.is_fitted:
+            raise ValueError("PCAModel is not fitted; call fit() first.")
+        k = self.components_.shape[0]
+        for pc in (pcx, pcy):
+            if not 1 <= pc <= k:
+                raise ValueError(f"Component {pc} out of range; the model has {k} components.")
+        cols = [pcx - 1, pcy - 1]
+        return self.scores_[:, cols], self.explained_variance_ratio_[cols]
+
+
+class IncrementalPCAModel(PCAModel):
+    """
+    PCA updated one sample batch at a time (same interface as :class:`PCAModel`).
+
+    Wraps scikit-learn's ``IncrementalPCA`` (Ross et al. 2008): each
+    ``partial_fit`` merges a batch into the current decomposition in
+    O((batch + k)² · features), so memory is bounded by the batch size and
+    the cohort can be read from a memory map or arrive over time. ``fit``
+    streams an array (or memmap) in row batches and then computes
+    ``scores_`` in a second pass; after ``partial_fit`` call
+    :meth:`refresh_scores` to rescore the samples of interest. Use
+    :func:`compare_pca` to check the result against a full refit.
+
+    Parameters
+    ----------
+    n_components : int
+        Number of components.
+    batch_size : int, optional
+        Rows per batch in ``fit``; defaults to max(5 · n_components, 256).
+    dtype : type
+        Working dtype (np.float64 or np.float32).
+
+    Attributes
+    ----------
+    n_samples_seen_ : int
+        Samples folded into the decomposition.
+    """
+
+    def __init__(self, n_components: int = 2, batch_size: Optional[int] = None, dtype: type = np.float64):
+        super().__init__(n_components=n_components, solver="auto", dtype=dtype, random_state=None)
+        self.batch_size = batch_size
+        self.n_samples_seen_ = 0
+        self._ipca: Optional[IncrementalPCA] = None
+        self._pending: Optional[np.ndarray] = None
+
+    def _batches(self, n: int) -> Iterator[slice]:
+        step = max(int(self.batch_size or max(5 * self.n_components, 256)), self.n_components)
+        starts = list(range(0, n, step))
+        # IncrementalPCA needs at least n_components rows per batch: merge a short tail
+        if len(starts) > 1 and n - starts[-1] < self.n_components:
+            starts.pop()
+        for i, start in enumerate(starts):
+            yield slice(start, starts[i + 1] if i + 1 < len(starts) else n)
+
+    def partial_fit(self, X: np.ndarray) -> "IncrementalPCAModel":
+        """
+        Fold one batch of samples into the decomposition.
+
+        Batches with fewer than ``n_components`` rows are buffered until
+        enough rows have arrived. ``scores_`` is cleared, since earlier
+        scores change with the components.
+
+        Parameters
+        ----------
+        X : np.ndarray
+            Samples × features batch (preprocessed like the rest of the cohort).
+
+        Returns
+        -------
+        IncrementalPCAModel
+            The updated model.
+        """
+        Xa = np.asarray(X, dtype=self.dtype)
+        if Xa.ndim == 1:
+            Xa = Xa[None, :]
+        if self._pending is not None:
+            Xa = np.vstack([self._pending, Xa])
+            self._pending = None
+        if Xa.shape[0] < self.n_components:
+            self._pending = Xa
+            logger.info(f"Buffered {Xa.shape[0]} samples (< {self.n_components} components).")
+            return self
+
+        start = time.perf_counter()
+        if self._ipca is None:
+            self._ipca = IncrementalPCA(n_components=self.n_components)
+        self._ipca.partial_fit(Xa)
+        self.n_samples_seen_ = int(self._ipca.n_samples_seen_)
+        self.solver_ = "incremental"
+        self.mean_ = self._ipca.mean_
+        self.components_ = self._ipca.components_
+        self.explained_variance_ = self._ipca.explained_variance_
+        self.explained_variance_ratio_ = self._ipca.explained_variance_ratio_
+        n_seen = self.n_samples_seen_
+        self.feature_var_ = self._ipca.var_ * (n_seen / (n_seen - 1)) if n_seen > 1 else self._ipca.var_
+        self.scores_ = None
+        self.fit_seconds_ = (self.fit_seconds_ or 0.0) + time.perf_counter() - start
+        return self
+
+    def fit(self, X: np.ndarray) -> "IncrementalPCAModel":
+        """
+        Fit from scratch by streaming X in row batches, then score it.
+
+        Parameters
+        ----------
+        X : np.ndarray
+            Samples × features matrix; memory maps are read batch by batch.
+
+        Returns
+        -------
+        IncrementalPCAModel
+            The fitted model.
+        """
+        self._ipca, self._pending, self.fit_seconds_ = None, None, None
+        n, p = X.shape
+        if n < self.n_components:
+            raise ValueError(f"n_components={self.n_components} needs at least as many samples, got {n}.")
+        n_batches = 0
+        for sl in self._batches(n):
+            self.partial_fit(X[sl])
+            n_batches += 1
+        self.refresh_scores(X)
+        logger.info(
+            f"Incremental PCA fit {n} × {p} ({self.dtype.name}, k={self.n_components}, "
+            f"{n_batches} batches) in {self.fit_seconds_:.2f}s; "
+            f"explained {self.explained_variance_ratio_.sum():.1%}"
+        )
+        return self
+
+    def refresh_scores(self, X: np.ndarray) -> np.ndarray:
+        """
+        Score samples with the current components, batch by batch, into ``scores_``.
+
+        Parameters
+        ----------
+        X : np.ndarray
+            Samples × features matrix (array or memory map).
+
+        Returns
+        -------
+        np.ndarray
+            Samples × components scores.
+        """
+        if not self.is_fitted:
+            raise ValueError("IncrementalPCAModel is not fitted; call fit() or partial_fit() first.")
+        scores = np.empty((X.shape[0], self.components_.shape[0]), dtype=self.dtype)
+        for sl in self._batches(X.shape[0]):
+            scores[sl] = self.transform(X[sl])
+        self.scores_ = scores
+        return scores
+
+    def pair(self, pcx: int = 1, pcy: int = 2) -> Tuple[np.ndarray, np.ndarray]:
+        if self.is_fitted and self.scores_ is None:
+            raise ValueError("Scores are stale after partial_fit(); call refresh_scores(X) first.")
+        return super().pair(pcx, pcy)
+
+    pair.__doc__ = PCAModel.pair.__doc__
+
+
+def compare_pca(
+    model: PCAModel,
+    reference: PCAModel,
+    X: Optional[np.ndarray] = None,
+) -> pd.DataFrame:
+    """
+    Component-by-component agreement between two fitted PCA models.
+
+    Typically ``model`` is an :class:`IncrementalPCAModel` and ``reference``
+    a full refit on the same samples. Component signs are arbitrary, so
+    agreement is measured with absolute cosines and score correlations.
+
+    Parameters
+    ----------
+    model : PCAModel
+        Model under test.
+    reference : PCAModel
+        Reference model (e.g. a full refit).
+    X : np.ndarray, optional
+        Samples to score with both models for the 'score_corr' column.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per shared component: 'component', 'var_ratio',
+        'var_ratio_ref', 'abs_cosine' (|component · reference component|)
+        and, if X is given, 'score_corr' (|Pearson r| of the scores).
+        ``attrs['max_subspace_angle_deg']`` is the largest principal angle
+        between the two spanned subspaces.
+    """
+    k = min(model.components_.shape[0], reference.components_.shape[0])
+    A = np.asarray(model.components_[:k], dtype=np.float64)
+    B = np.asarray(reference.components_[:k], dtype=np.float64)
+    table = pd.DataFrame(
+        {
+            "component": [f"PC{i + 1}" for i in range(k)],
+            "var_ratio": model.explained_variance_ratio_[:k],
+            "var_ratio_ref": reference.explained_variance_ratio_[:k],
+            "abs_cosine": np.abs(np.einsum("kp,kp->k", A, B)),
+        }
+    )
+    if X is not None:
+        sa = model.transform(X)[:, :k]
+        sb = reference.transform(X)[:, :k]
+        table["score_corr"] = [abs(np.corrcoef(sa[:, i], sb[:, i])[0, 1]) for i in range(k)]
+    table.attrs["max_subspace_angle_deg"] = float(np.degrees(subspace_angles(A.T, B.T).max()))
+    return table
+
+
+def compound_annotations(
+    data_dict: pd.DataFrame,
+    columns: Sequence[str] = ("BIOCHEMICAL", "SUPER_PATHWAY", "SUB_PATHWAY"),
+) -> pd.DataFrame:
+    """
+    Compound dictionary indexed by normalized compound name, for label joins.
+
+    Parameters
+    ----------
+    data_dict : pd.DataFrame
+        Compound dictionary with 'compound_id' (or 'Name').
+    columns : Sequence[str]
+        Annotation columns to keep (missing ones are skipped).
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per compound (first occurrence), indexed by
+        :func:`src.preprocess.normalize_compound_name` of its ID.
+    """
+    name_col = "compound_id" if "compound_id" in data_dict.columns else "Name"
+    if name_col not in data_dict.columns:
+        raise ValueError("Missing 'compound_id'/'Name' column in data_dict.")
+    keep = [c for c in columns if c in data_dict.columns]
+    table = data_dict.dropna(subset=[name_col])
+    index = pd.Index(table[name_col].map(normalize_compound_name), name="compound_key")
+    annotations = pd.DataFrame(table[keep].to_numpy(), index=index, columns=keep)
+    return annotations[~annotations.index.duplicated()]
+
+
+def top_loadings(
+    model: PCAModel,
+    feature_names: Sequence[str],
+    k: int = 10,
+    components: Optional[Sequence[int]] = None,
+    annotations: Optional[pd.DataFrame] = None,
+) -> pd.DataFrame:
+    """
+    Top-k compounds by absolute loading for each component, with contributions.
+
+    Only the k largest |loadings| per component are selected
+    (``np.argpartition``, O(features) instead of a full sort) and then
+    ordered, so any component pair can be recomputed interactively from
+    the stored model.
+
+    - 'contribution': share (%) of the component's variance carried by the
+      compound, ``100 · loading²`` (loadings are unit vectors).
+    - 'cos2': squared cosine (squared correlation) between the compound and
+      the component scores, ``loading² · explained_variance / feature_var``;
+      NaN when the model has no ``feature_var_``.
+
+    Parameters
+    ----------
+    model : PCAModel
+        Fitted model.
+    feature_names : Sequence[str]
+        Compound name of each model feature (column order of the fitted matrix).
+    k : int
+        Compounds per component.
+    components : Sequence[int], optional
+        1-based components; defaults to all.
+    annotations : pd.DataFrame, optional
+        Labels from :func:`compound_annotations`, joined on the normalized name.
+
+    Returns
+    -------
+    pd.DataFrame
+        Rows by component (in the order of ``components``) then rank: 'component', 'rank', 'feature',
+        annotation columns, 'loading', 'abs_loading', 'contribution', 'cos2'.
+    """
+    if not model.is_fitted:
+        raise ValueError("PCAModel is not fitted; call fit() first.")
+    n_comp, p = model.components_.shape
+    if len(feature_names) != p:
+        raise ValueError(f"Got {len(feature_names)} feature names for {p} model features.")
+    comps = np.arange(n_comp) if components is None else np.asarray(components, dtype=int) - 1
+    if comps.size and (comps.min() < 0 or comps.max() >= n_comp):
+        raise ValueError(f"Components out of range; the model has {n_comp} components.")
+    k = max(1, min(int(k), p))
+
+    V = model.components_[comps]
+    absV = np.abs(V)
+    top = np.argpartition(-absV, k - 1, axis=1)[:, :k] if k < p else np.tile(np.arange(p), (len(comps), 1))
+    order = np.argsort(-np.take_along_axis(absV, top, axis=1), axis=1, kind="stable")
+    top = np.take_along_axis(top, order, axis=1)  # len(comps) × k, by decreasing |loading|
+
+    loading = np.take_along_axis(V, top, axis=1)
+    if model.feature_var_ is not None:
+        var = model.feature_var_[top]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cos2 = np.where(var > 0, loading**2 * model.explained_variance_[comps, None] / var, np.nan)
+    else:
+        cos2 = np.full(loading.shape, np.nan)
+
+    names = np.asarray(feature_names, dtype=object)[top.ravel()]
+    table = pd.DataFrame(
+        {
+            "component": np.repeat([f"PC{c + 1}" for c in comps], k),
+            "rank": np.tile(np.arange(1, k + 1), len(comps)),
+            "feature": names,
+        }
+    )
+    if annotations is not None:
+        keys = pd.Index([normalize_compound_name(n) for n in names])
+        labels = annotations.reindex(keys)
+        for col in annotations.columns:
+            table[col] = labels[col].to_numpy()
+    table["loading"] = loading.ravel()
+    table["abs_loading"] = np.abs(table["loading"])
+    table["contribution"] = 100 * loading.ravel() ** 2
+    table["cos2"] = cos2.ravel()
+    return table
+
+
+def run_pca_cimcb(
+    Xknn: np.ndarray,
+    group_label: pd.Series,
+    pcx: int = 1,
+    pcy: int = 2,
+) -> None:
+    """
+    Run PCA using cimcb_lite and plot scores/loadings.
+
+    Parameters
+    ----------
+    Xknn : np.ndarray
+        Preprocessed feature matrix (samples × features).
+    group_label : pd.Series
+        Sample group labels for coloring (e.g., 'Class').
+    pcx : int
+        Principal component for x-axis.
+    pcy : int
+        Principal component for y-axis.
+
+    Returns
+    -------
+    None
+        Displays PCA plot via cb.plot.pca.
+    """
+    logger.info(f"Running PCA with pcx={pcx}, pcy={pcy}...")
+    try:
+        cb.plot.pca(Xknn, pcx=pcx, pcy=pcy, group_label=group_label)
+        logger.info("PCA plot generated successfully.")
+    except Exception as e:
+        logger.error(f"PCA plotting failed: {e}")
+        raise
+
+
+def pca_summary(
+    Xknn: np.ndarray,
+    group_label: Sequence,
+    n_components: int = 2,
+) -> Dict[str, Any]:
+    """
+    Explained variance and group separation of a PCA on a preprocessed matrix.
+
+    Fits a :class:`PCAModel`, as the PCA page does. Group separation is the
+    silhouette score of the samples in the space of the first
+    ``n_components`` scores, using the samples with a label (NaN when fewer
+    than two groups are present).
+
+    Parameters
+    ----------
+    Xknn : np.ndarray
+        Preprocessed feature matrix (samples × features).
+    group_label : Sequence
+        Sample group labels (e.g. 'Class'); missing labels are ignored.
+    n_components : int
+        Number of principal components.
+
+    Returns
+    -------
+    Dict[str, Any]
+        'pc1_var', ..., 'pc<n>_var' (explained variance ratios),
+        'cum_var' (their sum) and 'silhouette'.
+    """
+    model = PCAModel(n_components=n_components).fit(Xknn)
+    scores = model.scores_
+    ratios = model.explained_variance_ratio_
+
+    summary: Dict[str, Any] = {f"pc{i + 1}_var": float(r) for i, r in enumerate(ratios)}
+    summary["cum_var"] = float(ratios.sum())
+
+    labels = pd.Series(group_label).reset_index(drop=True)
+    labelled = labels.notna().to_numpy()
+    n_groups = labels[labelled].nunique()
+    if 2 <= n_groups < int(labelled.sum()):
+        summary["silhouette"] = float(
+            silhouette_score(scores[labelled], labels[labelled].astype(str))
+        )
+    else:
+        summary["silhouette"] = np.nan
+    return summary
@@ -0,0 +1,515 @@
+"""
+Headless batch pipeline: load → preprocess → PCA → univariate stats, run as a DAG of cached stages.
+
+Usage:
+    python -m src [--config config/config.yaml] [--data study_data.xlsx]
+                  [--output-dir results] [--format parquet|csv] [--jobs 4] [--force]
+"""
+import argparse
+import json
+import logging
+import pickle
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from src.cache import DiskCache, file_fingerprint, is_tuple_column, parquet_compatible, write_parquet
+from src.config import get_cache_settings, get_config, get_paths, get_prefilter_settings
+from src.io_utils import load_excel_cached
+from src.labels import normalize_class_column
+from src.pca_utils import PCAModel, compound_annotations
+from src.preprocess import build_feature_matrix, feature_cache_key, normalize_compound_name
+from src.stats_utils import stats_dictionary, univariate_2class_wrapper
+
+logger = logging.getLogger(__name__)
+
+# Bump to invalidate cached stage outputs when stage code changes
+PIPELINE_VERSION = 2
+
+_ARRAYS_FILE = "arrays.npz"
+_FRAMES_FILE = "frames.json"
+_VALUES_FILE = "values.json"
+_OBJECTS_FILE = "objects.pkl"
+
+
+class Stage:
+    """
+    One node of the pipeline DAG.
+
+    Parameters
+    ----------
+    name : str
+        Unique stage name.
+    fn : Callable[[Dict[str, Any]], Dict[str, Any]]
+        Receives the merged outputs of the dependencies and returns this
+        stage's named outputs: DataFrames (cached as Parquet), arrays (npz),
+        JSON-able values or, as a last resort, other picklable objects.
+    deps : Sequence[str]
+        Names of the stages whose outputs ``fn`` needs.
+    params : Dict[str, Any], optional
+        Parameters that, with the dependency keys, identify the outputs in
+        the stage cache.
+    cache : bool
+        Store outputs in the stage cache (stages with their own cache, such
+        as workbook loading, set this to False).
+    artifacts : Sequence[str]
+        Output names (DataFrames) written to the output directory.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[[Dict[str, Any]], Dict[str, Any]],
+        deps: Sequence[str] = (),
+        params: Optional[Dict[str, Any]] = None,
+        cache: bool = True,
+        artifacts: Sequence[str] = (),
+    ):
+        self.name = name
+        self.fn = fn
+        self.deps = list(deps)
+        self.params = params or {}
+        self.cache = cache
+        self.artifacts = list(artifacts)
+
+
+def _normalize_outputs(outputs: Dict[str, Any]) -> Dict[str, Any]:
+    """Stage outputs as they read back from the cache (DataFrames in Parquet form)."""
+    return {k: parquet_compatible(v) if isinstance(v, pd.DataFrame) else v for k, v in outputs.items()}
+
+
+def _is_json(value: Any) -> bool:
+    try:
+        return json.loads(json.dumps(value)) == value
+    except (TypeError, ValueError):
+        return False
+
+
+def _write_outputs(outputs: Dict[str, Any], target: Path) -> None:
+    # DataFrames → Parquet, arrays → npz, JSON-able values → JSON; pickle only for the rest
+    arrays = {k: v for k, v in outputs.items() if isinstance(v, np.ndarray)}
+    frames = {k: v for k, v in outputs.items() if isinstance(v, pd.DataFrame)}
+    values = {k: v for k, v in outputs.items() if k not in arrays and k not in frames and _is_json(v)}
+    objects = {k: v for k, v in outputs.items() if k not in arrays and k not in frames and k not in values}
+    if arrays:
+        np.savez(target / _ARRAYS_FILE, **arrays)
+    tuple_columns = {}
+    for name, frame in frames.items():
+        write_parquet(frame, target / f"{name}.parquet")
+        tuple_columns[name] = [str(c) for c in frame.columns[frame.dtypes == object] if is_tuple_column(frame[c])]
+    with open(target / _FRAMES_FILE, "w", encoding="utf-8") as f:
+        json.dump(tuple_columns, f)
+    with open(target / _VALUES_FILE, "w", encoding="utf-8") as f:
+        json.dump(values, f)
+    if objects:
+        with open(target / _OBJECTS_FILE, "wb") as f:
+            pickle.dump(objects, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _read_outputs(entry: Path) -> Dict[str, Any]:
+    with open(entry / _VALUES_FILE, "r", encoding="utf-8") as f:
+        outputs = json.load(f)
+    with open(entry / _FRAMES_FILE, "r", encoding="utf-8") as f:
+        tuple_columns = json.load(f)
+    for name, columns in tuple_columns.items():
+        frame = pd.read_parquet(entry / f"{name}.parquet")
+        for col in columns:  # Parquet lists come back as arrays
+            frame[col] = [tuple(v) if v is not None else None for v in frame[col]]
+        outputs[name] = frame
+    if (entry / _ARRAYS_FILE).exists():
+        with np.load(entry / _ARRAYS_FILE, allow_pickle=False) as data:
+            outputs.update({k: data[k] for k in data.files})
+    if (entry / _OBJECTS_FILE).exists():
+        with open(entry / _OBJECTS_FILE, "rb") as f:
+            outputs.update(pickle.load(f))
+    return outputs
+
+
+def _topological_order(stages: Sequence[Stage]) -> List[Stage]:
+    by_name = {s.name: s for s in stages}
+    if len(by_name) != len(stages):
+        raise ValueError("Stage names must be unique.")
+    order, state = [], {}
+
+    def visit(stage: Stage) -> None:
+        if state.get(stage.name) == "done":
+            return
+        if state.get(stage.name) == "visiting":
+            raise ValueError(f"Pipeline has a cycle through stage '{stage.name}'.")
+        state[stage.name] = "visiting"
+        for dep in stage.deps:
+            if dep not in by_name:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown stage '{dep}'.")
+            visit(by_name[dep])
+        state[stage.name] = "done"
+        order.append(stage)
+
+    for stage in stages:
+        visit(stage)
+    return order
+
+
+def run_pipeline(
+    stages: Sequence[Stage],
+    root_key: str,
+    cache: Optional[DiskCache] = None,
+    n_jobs: Optional[int] = None,
+    force: bool = False,
+) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+    """
+    Run stages as soon as their dependencies finish, independent ones concurrently.
+
+    Each stage key hashes the pipeline version, the stage name and params
+    and the keys of its dependencies (the root stages hash ``root_key``),
+    so a change anywhere upstream invalidates everything downstream without
+    rehashing data. Stages run in a thread pool: the heavy work (BLAS,
+    LAPACK, SciPy tests) releases the GIL and no data is pickled between
+    stages.
+
+    Parameters
+    ----------
+    stages : Sequence[Stage]
+        Pipeline stages (any order; dependencies are resolved by name).
+    root_key : str
+        Fingerprint of the inputs (e.g. workbook hash + settings).
+    cache : DiskCache, optional
+        Stage output cache; None disables caching.
+    n_jobs : int, optional
+        Concurrent stages (defaults to the executor's default).
+    force : bool
+        Recompute every stage, refreshing the cache.
+
+    Returns
+    -------
+    Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]
+        (outputs per stage, timing record per stage with 'key', 'cached',
+        'start', 'end', 'seconds' relative to the pipeline start).
+
+    Raises
+    ------
+    ValueError
+        On duplicate stage names, unknown dependencies or cycles.
+    """
+    order = _topological_order(stages)
+    keys: Dict[str, str] = {}
+    outputs: Dict[str, Dict[str, Any]] = {}
+    timings: Dict[str, Dict[str, Any]] = {}
+    t0 = time.perf_counter()
+
+    def execute(stage: Stage, key: str, inputs: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        start = time.perf_counter()
+        result, cached = None, False
+        if stage.cache and cache is not None and not force:
+            entry = cache.get(key)
+            if entry is not None:
+                try:
+                    result, cached = _read_outputs(entry), True
+                except (OSError, ValueError, pickle.UnpicklingError) as e:
+                    logger.warning(f"Corrupt cache entry for stage '{stage.name}', recomputing: {e}")
+                    cache.invalidate(key)
+        if result is None:
+            result = stage.fn(inputs)
+            if stage.cache and cache is not None:
+                result = _normalize_outputs(result)
+                try:
+                    cache.put(key, lambda target: _write_outputs(result, target), metadata={"stage": stage.name})
+                except OSError as e:
+                    logger.warning(f"Could not cache stage '{stage.name}': {e}")
+        end = time.perf_counter()
+        logger.info(f"Stage '{stage.name}' {'loaded from cache' if cached else 'ran'} in {end - start:.2f}s")
+        return result, {
+            "key": key,
+            "deps": stage.deps,
+            "cached": cached,
+            "start": round(start - t0, 4),
+            "end": round(end - t0, 4),
+            "seconds": round(end - start, 4),
+        }
+
+    remaining = list(order)
+    running = {}
+    with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+        while remaining or running:
+            for stage in [s for s in remaining if all(d in outputs for d in s.deps)]:
+                dep_keys = [keys[d] for d in stage.deps] or [root_key]
+                keys[stage.name] = feature_cache_key(
+                    f"pipeline-v{PIPELINE_VERSION}", stage.name, sorted(stage.params.items()), dep_keys
+                )
+                inputs = {k: v for d in stage.deps for k, v in outputs[d].items()}
+                running[pool.submit(execute, stage, keys[stage.name], inputs)] = stage
+                remaining.remove(stage)
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                outputs[stage.name], timings[stage.name] = future.result()
+    return outputs, timings
+
+
+def _write_table(table: pd.DataFrame, path: Path, fmt: str) -> Path:
+    path = path.with_suffix(f".{fmt}")
+    if fmt == "parquet":
+        # Parquet needs uniform column types: mixed object columns become strings
+        table = table.copy()
+        table.columns = [str(c) for c in table.columns]
+        for col in table.columns[table.dtypes.eq(object)]:
+            if table[col].map(type).nunique() > 1:
+                table[col] = table[col].astype(str)
+        table.to_parquet(path, index=False)
+    else:
+        table.to_csv(path, index=False)
+    return path
+
+
+def write_artifacts(
+    stages: Sequence[Stage],
+    outputs: Dict[str, Dict[str, Any]],
+    timings: Dict[str, Dict[str, Any]],
+    output_dir: Union[str, Path],
+    fmt: str = "parquet",
+    extra: Optional[Dict[str, Any]] = None,
+) -> Path:
+    """
+    Write each stage's artifact tables and a ``manifest.json`` with timings.
+
+    Parameters
+    ----------
+    stages : Sequence[Stage]
+        Pipeline stages (their ``artifacts`` lists name the tables to write).
+    outputs : Dict[str, Dict[str, Any]]
+        Stage outputs from :func:`run_pipeline`.
+    timings : Dict[str, Dict[str, Any]]
+        Stage timings from :func:`run_pipeline`.
+    output_dir : str or Path
+        Target directory (created if missing).
+    fmt : str
+        'parquet' or 'csv'.
+    extra : Dict[str, Any], optional
+        Additional JSON-able manifest fields (inputs, settings).
+
+    Returns
+    -------
+    Path
+        Path of the manifest.
+    """
+    if fmt not in ("parquet", "csv"):
+        raise ValueError(f"Unsupported output format '{fmt}'; use 'parquet' or 'csv'.")
+    out = Path(output_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    artifacts = {}
+    for stage in stages:
+        for name in stage.artifacts:
+            table = outputs[stage.name][name]
+            path = _write_table(table, out / name, fmt)
+            artifacts[name] = {"path": path.name, "stage": stage.name, "rows": int(len(table))}
+
+    wall = max((t["end"] for t in timings.values()), default=0.0)
+    manifest = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "pipeline_version": PIPELINE_VERSION,
+        "wall_seconds": wall,
+        "stage_seconds": round(sum(t["seconds"] for t in timings.values()), 4),
+        "stages": timings,
+        "artifacts": artifacts,
+        **(extra or {}),
+    }
+    path = out / "manifest.json"
+    path.write_text(json.dumps(manifest, indent=2, default=str), encoding="utf-8")
+    logger.info(f"Wrote {len(artifacts)} artifacts and manifest to {out}")
+    return path
+
+
+def build_stages(config: Dict[str, Any], data_path: Optional[str] = None) -> List[Stage]:
+    """
+    The analysis DAG of the Streamlit pages, driven by ``config``.
+
+    ``load`` → ``features`` → {``pca``, ``stats_diabetes``, ``stats_healthy``}:
+    the PCA and the two univariate comparisons only depend on the feature
+    matrix and run concurrently.
+
+    Parameters
+    ----------
+    config : Dict[str, Any]
+        Configuration from :func:`src.config.get_config`.
+    data_path : str, optional
+        Workbook path (defaults to ``data.path``).
+
+    Returns
+    -------
+    List[Stage]
+        Stages with artifacts 'pca_scores', 'pca_loadings', 'pca_variance',
+        'stats_diabetes', 'significant_diabetes', 'stats_healthy',
+        'significant_healthy' and 'prefilter_report'.
+    """
+    paths = get_paths(config)
+    cache_settings = get_cache_settings(config)
+    preproc_cfg = config.get("preprocessing", {})
+    prefilter_cfg = get_prefilter_settings(config)
+    pca_cfg = config.get("pca", {})
+    stats_cfg = config.get("stats", {})
+    path = data_path or paths["data_path"]
+
+    def load(_: Dict[str, Any]) -> Dict[str, Any]:
+        meta, matrix, data_dict = load_excel_cached(
+            path,
+            paths["meta_sheet"],
+            paths["matrix_sheet"],
+            paths["dict_sheet"],
+            cache_dir=Path(cache_settings["cache_dir"]) / "workbooks",
+            max_bytes=cache_settings["max_bytes"],
+        )
+        return {"meta": meta, "matrix": matrix, "data_dict": data_dict}
+
+    feature_params = {
+        "scale_method": preproc_cfg.get("scale_method", "auto"),
+        "knn_k": preproc_cfg.get("knn_k", 3),
+        "log_offset": preproc_cfg.get("log_offset", 0.5),
+    }
+
+    def features(inputs: Dict[str, Any]) -> Dict[str, Any]:
+        hoja2, Xknn, peaklist = build_feature_matrix(
+            inputs["matrix"],
+            inputs["data_dict"],
+            inputs["meta"],
+            prefilter=prefilter_cfg,
+            **feature_params,
+        )
+        report = hoja2.attrs.get("prefilter")
+        hoja2 = normalize_class_column(hoja2, col="Class")
+        return {
+            "hoja2": hoja2,
+            "Xknn": np.asarray(Xknn),
+            "peaklist": list(peaklist),
+            "prefilter_report": report if report is not None else pd.DataFrame(columns=["compound", "reason"]),
+            "hoja3": stats_dictionary(inputs["data_dict"], peaklist if prefilter_cfg["enabled"] else None),
+            "annotations": compound_annotations(inputs["data_dict"]),
+        }
+
+    n_components = int(pca_cfg.get("n_components", 10))
+
+    def pca(inputs: Dict[str, Any]) -> Dict[str, Any]:
+        hoja2, Xknn, peaklist = inputs["hoja2"], inputs["Xknn"], inputs["peaklist"]
+        model = PCAModel(n_components=n_components).fit(Xknn)
+        pcs = [f"PC{i + 1}" for i in range(model.components_.shape[0])]
+        scores = pd.DataFrame(model.scores_, columns=pcs)
+        scores.insert(0, "SampleID", hoja2["SampleID"].astype(str).to_numpy())
+        scores.insert(1, "Class", hoja2["Class"].astype(str).to_numpy())
+
+        loadings = pd.DataFrame(model.loadings_, columns=pcs)
+        loadings.insert(0, "compound_id", [str(c) for c in peaklist])
+        labels = inputs["annotations"].reindex([normalize_compound_name(c) for c in peaklist])
+        for i, col in enumerate(labels.columns):
+            loadings.insert(1 + i, col, labels[col].to_numpy())
+
+        variance = pd.DataFrame(
+            {
+                "component": pcs,
+                "explained_variance": model.explained_variance_,
+                "explained_variance_ratio": model.explained_variance_ratio_,
+                "cumulative_ratio": np.cumsum(model.explained_variance_ratio_),
+            }
+        )
+        return {"pca_scores": scores, "pca_loadings": loadings, "pca_variance": variance}
+
+    stats_params = {
+        "parametric": stats_cfg.get("parametric", True),
+        "pvalue_threshold": stats_cfg.get("pvalue_threshold", 0.05),
+        "engine": stats_cfg.get("engine", "native"),
+    }
+
+    def stats_for(posclass: str, suffix: str) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+        def run(inputs: Dict[str, Any]) -> Dict[str, Any]:
+            full, significant = univariate_2class_wrapper(
+                inputs["hoja2"], inputs["hoja3"], group_col="Class", posclass=posclass, **stats_params
+            )
+            return {f"stats_{suffix}": full, f"significant_{suffix}": significant}
+
+        return run
+
+    return [
+        Stage("load", load, cache=False),
+        Stage(
+            "features",
+            features,
+            deps=["load"],
+            params={**feature_params, "prefilter": prefilter_cfg},
+            artifacts=["prefilter_report"],
+        ),
+        Stage(
+            "pca",
+            pca,
+            deps=["features"],
+            params={"n_components": n_components},
+            artifacts=["pca_scores", "pca_loadings", "pca_variance"],
+        ),
+        Stage(
+            "stats_diabetes",
+            stats_for("Diabetes", "diabetes"),
+            deps=["features"],
+            params={"posclass": "Diabetes", **stats_params},
+            artifacts=["stats_diabetes", "significant_diabetes"],
+        ),
+        Stage(
+            "stats_healthy",
+            stats_for("Healthy", "healthy"),
+            deps=["features"],
+            params={"posclass": "Healthy", **stats_params},
+            artifacts=["stats_healthy", "significant_healthy"],
+        ),
+    ]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> Path:
+    """
+    Command-line entry point (``python -m src``); runs the pipeline and writes artifacts.
+
+    Parameters
+    ----------
+    argv : Sequence[str], optional
+        Arguments (defaults to ``sys.argv[1:]``).
+
+    Returns
+    -------
+    Path
+        Path of the written manifest.
+    """
+    parser = argparse.ArgumentParser(prog="python -m src", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--config", default="config/config.yaml", help="Path to config.yaml")
+    parser.add_argument("--data", help="Workbook path (defaults to data.path in the config)")
+    parser.add_argument("--output-dir", default="results", help="Directory for tables and manifest.json")
+    parser.add_argument("--format", choices=["parquet", "csv"], default="parquet", help="Table format")
+    parser.add_argument("--jobs", type=int, help="Concurrent stages (default: executor default)")
+    parser.add_argument("--force", action="store_true", help="Ignore cached stage outputs")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    config = get_config(args.config)
+    paths = get_paths(config)
+    cache_settings = get_cache_settings(config)
+    data_path = args.data or paths["data_path"]
+    if not Path(data_path).exists():
+        parser.error(f"Workbook not found: {data_path} (pass --data or set data.path in {args.config})")
+
+    stages = build_stages(config, data_path)
+    root_key = feature_cache_key(
+        file_fingerprint(data_path), paths["meta_sheet"], paths["matrix_sheet"], paths["dict_sheet"]
+    )
+    cache = DiskCache(Path(cache_settings["cache_dir"]) / "pipeline", max_bytes=cache_settings["max_bytes"])
+    outputs, timings = run_pipeline(stages, root_key, cache=cache, n_jobs=args.jobs, force=args.force)
+    manifest = write_artifacts(
+        stages,
+        outputs,
+        timings,
+        args.output_dir,
+        fmt=args.format,
+        extra={"data": str(data_path), "config": args.config, "settings": config},
+    )
+
+    for name, t in timings.items():
+        print(f"{name:<16} {t['seconds']:>8.2f}s  {'(cached)' if t['cached'] else ''}")
+    print(f"Wrote {manifest}")
+    return manifest
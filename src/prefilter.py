@@ -0,0 +1,160 @@
+"""
+Missingness-, variance- and QC-RSD-based compound prefilter.
+"""
+import logging
+import warnings
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+def prefilter_features(
+    X: np.ndarray,
+    feature_names: Sequence,
+    max_missing_frac: Optional[float] = None,
+    min_variance: Optional[float] = None,
+    max_qc_rsd: Optional[float] = None,
+    qc_mask: Optional[np.ndarray] = None,
+    block_size: int = 1024,
+) -> Tuple[np.ndarray, pd.DataFrame]:
+    """
+    Flag compounds to drop before log transform, scaling and imputation.
+
+    All checks are vectorized per block of ``block_size`` columns on the raw
+    intensities, so temporaries stay bounded:
+
+    - missing fraction: share of samples that are NaN or ≤ 0 (the cells the
+      log step would replace);
+    - variance: variance (ddof=1) of log10 of the observed values; compounds
+      with fewer than two observed values fail;
+    - QC RSD: 100 · std / mean of the observed raw values over the QC
+      samples; compounds observed in fewer than two QC samples fail (the
+      check is skipped when there are fewer than two QC samples).
+
+    Parameters
+    ----------
+    X : np.ndarray
+        Raw samples × compounds intensities.
+    feature_names : Sequence
+        Compound names aligned with the columns of X.
+    max_missing_frac : float, optional
+        Drop compounds missing in more than this fraction of samples.
+    min_variance : float, optional
+        Drop compounds whose log10 variance is below this value.
+    max_qc_rsd : float, optional
+        Drop compounds whose QC RSD (%) is above this value.
+    qc_mask : np.ndarray, optional
+        Boolean mask of QC samples (rows of X).
+    block_size : int
+        Number of columns processed per block.
+
+    Returns
+    -------
+    Tuple[np.ndarray, pd.DataFrame]
+        (keep, report)
+        - keep: boolean mask of compounds to keep.
+        - report: one row per dropped compound with 'compound',
+          'missing_frac', 'log_variance', 'qc_rsd' and 'reason'
+          (comma-separated failed checks).
+    """
+    X = np.asarray(X)
+    n, p = X.shape
+    missing_frac = np.empty(p)
+    log_var = np.full(p, np.nan)
+    qc_rsd = np.full(p, np.nan)
+
+    use_qc = max_qc_rsd is not None and qc_mask is not None and int(np.sum(qc_mask)) >= 2
+    if max_qc_rsd is not None and not use_qc:
+        logger.warning("QC RSD filter skipped: fewer than two QC samples.")
+
+    with warnings.catch_warnings(), np.errstate(divide="ignore", invalid="ignore"):
+        warnings.simplefilter("ignore", RuntimeWarning)  # all-missing columns
+        for start in range(0, p, block_size):
+            sl = slice(start, min(start + block_size, p))
+            block = X[:, sl]
+            observed = block > 0  # NaNs compare False
+            missing_frac[sl] = 1.0 - observed.sum(axis=0) / max(n, 1)
+            if min_variance is not None:
+                log_var[sl] = np.nanvar(
+                    np.log10(np.where(observed, block, np.nan)), axis=0, ddof=1
+                )
+            if use_qc:
+                qc = np.where(observed[qc_mask], block[qc_mask], np.nan)
+                qc_rsd[sl] = 100.0 * np.nanstd(qc, axis=0, ddof=1) / np.nanmean(qc, axis=0)
+
+    checks = []
+    if max_missing_frac is not None:
+        checks.append(("missing", missing_frac > max_missing_frac))
+    if min_variance is not None:
+        checks.append(("low_variance", ~(log_var >= min_variance)))
+    if use_qc:
+        checks.append(("qc_rsd", ~(qc_rsd <= max_qc_rsd)))
+
+    drop = np.zeros(p, dtype=bool)
+    for _, failed in checks:
+        drop |= failed
+    keep = ~drop
+
+    idx = np.flatnonzero(drop)
+    reasons = [
+        ",".join(name for name, failed in checks if failed[j]) for j in idx
+    ]
+    report = pd.DataFrame(
+        {
+            "compound": [feature_names[j] for j in idx],
+            "missing_frac": missing_frac[idx],
+            "log_variance": log_var[idx],
+            "qc_rsd": qc_rsd[idx],
+            "reason": reasons,
+        }
+    )
+    counts = {name: int(failed.sum()) for name, failed in checks}
+    logger.info(f"Prefilter kept {int(keep.sum())}/{p} compounds (failed checks: {counts}).")
+    return keep, report
+
+
+def prefilter_from_settings(
+    X: np.ndarray,
+    feature_names: Sequence,
+    settings: Optional[Dict[str, Any]],
+    classes: Optional[Sequence] = None,
+) -> Tuple[np.ndarray, pd.DataFrame]:
+    """
+    Run :func:`prefilter_features` with ``preprocessing.prefilter`` settings.
+
+    Parameters
+    ----------
+    X : np.ndarray
+        Raw samples × compounds intensities.
+    feature_names : Sequence
+        Compound names aligned with the columns of X.
+    settings : Dict[str, Any], optional
+        Output of :func:`src.config.get_prefilter_settings` (or a subset).
+        None or ``enabled: False`` keeps every compound.
+    classes : Sequence, optional
+        Class label per sample; samples equal to ``settings['qc_label']``
+        are the QC samples.
+
+    Returns
+    -------
+    Tuple[np.ndarray, pd.DataFrame]
+        (keep, report), as :func:`prefilter_features`.
+    """
+    if not settings or not settings.get("enabled", True):
+        return np.ones(np.shape(X)[1], dtype=bool), pd.DataFrame(
+            columns=["compound", "missing_frac", "log_variance", "qc_rsd", "reason"]
+        )
+    qc_mask = None
+    if classes is not None:
+        qc_mask = np.asarray(pd.Series(classes).astype(str) == str(settings.get("qc_label", "QC")))
+    return prefilter_features(
+        X,
+        feature_names,
+        max_missing_frac=settings.get("max_missing_frac"),
+        min_variance=settings.get("min_variance"),
+        max_qc_rsd=settings.get("max_qc_rsd"),
+        qc_mask=qc_mask,
+    )
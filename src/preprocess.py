@@ -1,144 +1,881 @@
-"""
-Preprocessing utilities for metabolomics data: transpose, log, scale, impute.
-"""
-import pandas as pd
-import numpy as np
-import logging
-from typing import Tuple, List
-import cimcb_lite as cb
-
-logger = logging.getLogger(__name__)
-
-
-def build_feature_matrix(
-    data_matrix: pd.DataFrame,
-    data_dict: pd.DataFrame,
-    sample_metadata: pd.DataFrame,
-    scale_method: str = "auto",
-    knn_k: int = 3,
-    log_offset: float = 0.5,
-) -> Tuple[pd.DataFrame, np.ndarray, List[str]]:
-    """
-    Build preprocessed feature matrix (hoja2-style) for PCA/stats.
-
-    Steps:
-    1. Transpose data_matrix so samples are rows, compounds are columns.
-    2. Add Idx, Class (from sample_metadata['Health']), SampleID.
-    3. Rename data_dict columns: compound_id → Name, BIOCHEMICAL → Label.
-    4. Extract peaklist from data_dict['Name'].
-    5. Log10 transform (handle zeros), scale, KNN impute.
-
-    Parameters
-    ----------
-    data_matrix : pd.DataFrame
-        Raw metabolite matrix (samples as columns, compounds as rows).
-    data_dict : pd.DataFrame
-        Compound dictionary (compound_id, BIOCHEMICAL, SUPER_PATHWAY, etc.).
-    sample_metadata : pd.DataFrame
-        Sample metadata (sample_id, Health, sex, BMI, hba1c, etc.).
-    scale_method : str
-        Scaling method for cb.utils.scale ('auto', 'pareto', 'vast', 'level').
-    knn_k : int
-        Number of neighbors for KNN imputation.
-    log_offset : float
-        Offset multiplier for min positive value to handle zeros.
-
-    Returns
-    -------
-    Tuple[pd.DataFrame, np.ndarray, List[str]]
-        (hoja2_df, Xknn, peaklist)
-        - hoja2_df: DataFrame with Idx, Class, SampleID, and compound columns.
-        - Xknn: preprocessed numpy array (log10 + scaled + imputed).
-        - peaklist: list of compound names aligned with columns.
-    """
-    logger.info("Building feature matrix (hoja2-style)...")
-
-    # --- 1) Transpose data_matrix ---
-    matrix_t = data_matrix.copy()
-    # Assume first row is compound_id (or first column), samples are columns
-    # We want samples as rows → transpose
-    if "compound_id" in matrix_t.columns:
-        matrix_t = matrix_t.set_index("compound_id").T
-    else:
-        # If compound_id is the first column name or index
-        matrix_t = matrix_t.T
-
-    # Add Idx
-    matrix_t = matrix_t.reset_index(drop=False)
-    matrix_t.columns.name = None
-    matrix_t = matrix_t.rename(columns={matrix_t.columns[0]: "SampleID"})
-    matrix_t["Idx"] = range(1, len(matrix_t) + 1)
-
-    # --- 2) Add Class from sample_metadata['Health'] ---
-    # Match SampleID with sample_metadata['sample_id']
-    if "Health" in sample_metadata.columns and "sample_id" in sample_metadata.columns:
-        health_map = dict(
-            zip(sample_metadata["sample_id"], sample_metadata["Health"])
-        )
-        matrix_t["Class"] = matrix_t["SampleID"].map(health_map)
-        logger.info(f"Mapped Class column: {matrix_t['Class'].unique()}")
-    else:
-        logger.warning("'Health' or 'sample_id' not found in sample_metadata.")
-        matrix_t["Class"] = "Unknown"
-
-    hoja2 = matrix_t.copy()
-
-    # --- 3) Prepare hoja3 (data_dict) ---
-    hoja3 = data_dict.copy()
-    hoja3["Idx"] = range(1, len(hoja3) + 1)
-    hoja3 = hoja3.rename(
-        columns={"compound_id": "Name", "BIOCHEMICAL": "Label"}, errors="ignore"
-    )
-
-    # --- 4) Extract peaklist ---
-    if "Name" not in hoja3.columns:
-        logger.error("'Name' column not found in hoja3 (data_dict).")
-        raise ValueError("Missing 'Name' column in data_dict.")
-
-    peaklist_raw = hoja3["Name"].dropna().astype(str).tolist()
-
-    # --- 5) Align hoja2 columns with peaklist ---
-    meta_cols = [c for c in ["Idx", "Class", "SampleID"] if c in hoja2.columns]
-    feature_cols = [c for c in hoja2.columns if c not in meta_cols]
-
-    # Normalize column names for matching
-    def _norm(s):
-        return str(s).strip().lower().replace(" ", "_").replace("-", "_")
-
-    col_map = {_norm(c): c for c in feature_cols}
-    presentes = [
-        col_map[_norm(p)] for p in peaklist_raw if _norm(p) in col_map
-    ]
-
-    if not presentes:
-        logger.warning("No compound columns matched between hoja2 and hoja3.")
-        presentes = feature_cols[:100]  # fallback: use first 100 numeric columns
-
-    logger.info(f"Matched {len(presentes)}/{len(peaklist_raw)} compounds.")
-
-    # --- 6) Extract X matrix ---
-    X = hoja2[presentes].apply(pd.to_numeric, errors="coerce").to_numpy()
-
-    # --- 7) Log10 transform (handle zeros/negatives/NaN) ---
-    minpos = np.nanmin(X[X > 0]) if np.any(X > 0) else 1e-6
-    X_safe = np.where((X <= 0) | np.isnan(X), minpos * log_offset, X)
-    Xlog = np.log10(X_safe)
-
-    # --- 8) Scale ---
-    # Validate scale_method before passing to cimcb_lite
-    ALLOWED_METHODS = {"auto", "pareto", "vast", "level", "range"}
-    if scale_method not in ALLOWED_METHODS:
-        logger.warning(
-            f"Invalid scale_method '{scale_method}'. Falling back to 'auto'. "
-            f"Valid options: {ALLOWED_METHODS}"
-        )
-        scale_method = "auto"
-
-    Xscale = cb.utils.scale(Xlog, method=scale_method)
-    logger.info(f"Scaled data with method='{scale_method}'")
-
-    # --- 9) KNN impute ---
-    Xknn = cb.utils.knnimpute(Xscale, k=knn_k)
-    logger.info(f"KNN imputed with k={knn_k}. Shape: {Xknn.shape}")
-
-    return hoja2, Xknn, presentes
+"""
+Preprocessing utilities for metabolomics data: transpose, log, scale, impute.
+"""
+import hashlib
+import json
+import pandas as pd
+import numpy as np
+import logging
+from pathlib import Path
+from typing import Any, Dict, Tuple, List, Optional, Sequence, Union
+from src.cache import DiskCache, parquet_compatible, write_parquet
+from src.impute import knn_impute
+from src.prefilter import prefilter_from_settings
+from src.registry import SampleRegistry
+from src.scaling import SCALE_METHODS, Scaler
+
+logger = logging.getLogger(__name__)
+
+# Bump when preprocessing semantics change so stale cache entries are not reused
+FEATURE_CACHE_VERSION = "3"
+
+
+class Preprocessor:
+    """
+    Fitted log10 → scale → KNN-impute pipeline.
+
+    ``fit`` captures everything ``build_feature_matrix`` used to recompute
+    and discard on each call: the minimum positive intensity used to replace
+    zeros/NaNs before the log, the scaling statistics, and the scaled cohort
+    that serves as the KNN reference. ``transform`` then projects new sample
+    batches with those parameters, without refitting or reprocessing the
+    cohort, so they can be scored against existing PCA/statistics models.
+
+    Parameters
+    ----------
+    scale_method : str
+        Scaling method for src.scaling.Scaler ('auto', 'pareto', 'vast', 'level', 'range').
+    knn_k : int
+        Number of neighbors for KNN imputation.
+    log_offset : float
+        Offset multiplier for min positive value to handle zeros.
+
+    Attributes
+    ----------
+    minpos_ : float
+        Minimum positive intensity of the fitted cohort.
+    scaler_ : Scaler
+        Fitted scaler.
+    reference_ : np.ndarray
+        Scaled (pre-imputation) cohort used as KNN reference for new samples.
+    feature_names_ : List[str] or None
+        Compound names seen during fit, used to select DataFrame columns.
+    """
+
+    def __init__(self, scale_method: str = "auto", knn_k: int = 3, log_offset: float = 0.5):
+        if scale_method not in SCALE_METHODS:
+            raise ValueError(f"scale_method has to be one of {SCALE_METHODS}, got '{scale_method}'.")
+        self.scale_method = scale_method
+        self.knn_k = knn_k
+        self.log_offset = log_offset
+        self.minpos_: Optional[float] = None
+        self.scaler_: Optional[Scaler] = None
+        self.reference_: Optional[np.ndarray] = None
+        self.feature_names_: Optional[List[str]] = None
+
+    @property
+    def is_fitted(self) -> bool:
+        """Whether fit() (or load()) has been called."""
+        return self.scaler_ is not None
+
+    def _as_array(self, X: Union[pd.DataFrame, np.ndarray]) -> np.ndarray:
+        if isinstance(X, pd.DataFrame):
+            if self.feature_names_ is not None:
+                pos = pd.Index(X.columns.astype(str)).get_indexer(self.feature_names_)
+                if (pos < 0).any():
+                    missing = [c for c, p in zip(self.feature_names_, pos) if p < 0]
+                    raise ValueError(f"Missing {len(missing)} fitted compounds, e.g. {missing[:5]}")
+                X = X.iloc[:, pos]
+            try:
+                return X.to_numpy(dtype=np.float64, na_value=np.nan)
+            except (TypeError, ValueError):
+                X = X.apply(pd.to_numeric, errors="coerce")
+        return np.asarray(X, dtype=np.float64)
+
+    def _log(self, X: np.ndarray) -> np.ndarray:
+        # One new array: the replaced copy is log-transformed in place
+        X_safe = np.where((X <= 0) | np.isnan(X), self.minpos_ * self.log_offset, X)
+        return np.log10(X_safe, out=X_safe)
+
+    def fit(
+        self, X: Union[pd.DataFrame, np.ndarray], feature_names: Optional[Sequence[str]] = None
+    ) -> "Preprocessor":
+        """
+        Fit the log offset, scaling parameters and imputation reference.
+
+        Parameters
+        ----------
+        X : pd.DataFrame or np.ndarray
+            Raw samples × compounds intensities.
+        feature_names : Sequence[str], optional
+            Compound names (taken from the DataFrame columns when omitted).
+
+        Returns
+        -------
+        Preprocessor
+            The fitted preprocessor.
+        """
+        self.fit_transform(X, feature_names=feature_names)
+        return self
+
+    def fit_transform(
+        self, X: Union[pd.DataFrame, np.ndarray], feature_names: Optional[Sequence[str]] = None
+    ) -> np.ndarray:
+        """
+        Fit on X and return its preprocessed matrix (log10 + scaled + imputed).
+
+        Parameters
+        ----------
+        X : pd.DataFrame or np.ndarray
+            Raw samples × compounds intensities.
+        feature_names : Sequence[str], optional
+            Compound names (taken from the DataFrame columns when omitted).
+
+        Returns
+        -------
+        np.ndarray
+            Preprocessed matrix, imputed within the cohort.
+        """
+        if feature_names is None and isinstance(X, pd.DataFrame):
+            feature_names = X.columns
+        self.feature_names_ = None
+        X = self._as_array(X)
+        self.feature_names_ = None if feature_names is None else [str(c) for c in feature_names]
+
+        positive = X > 0  # NaNs compare False
+        self.minpos_ = float(np.min(X, where=positive, initial=np.inf)) if positive.any() else 1e-6
+        del positive
+        # The log output is a fresh array, so scale it in place instead of copying
+        self.scaler_ = Scaler(self.scale_method, block_size=256)  # bounds nanstd temporaries
+        Xscale = self.scaler_.fit_transform(self._log(X), copy=False)
+        self.reference_ = Xscale
+        logger.info(
+            f"Fitted preprocessor on {X.shape[0]} samples × {X.shape[1]} compounds "
+            f"(minpos={self.minpos_:.4g}, scale='{self.scale_method}')"
+        )
+        return knn_impute(Xscale, k=self.knn_k, copy=False)
+
+    def transform(self, X: Union[pd.DataFrame, np.ndarray]) -> np.ndarray:
+        """
+        Preprocess new samples with the fitted parameters.
+
+        Missing values are imputed from the fitted cohort (``reference_``),
+        never from the other new samples.
+
+        Parameters
+        ----------
+        X : pd.DataFrame or np.ndarray
+            Raw samples × compounds intensities. DataFrames are aligned on
+            the fitted compound names.
+
+        Returns
+        -------
+        np.ndarray
+            Preprocessed matrix.
+        """
+        if not self.is_fitted:
+            raise ValueError("Preprocessor is not fitted; call fit() first.")
+        X = self._as_array(X)
+        if X.ndim == 1:
+            X = X[None, :]
+        Xscale = self.scaler_.transform(self._log(X), copy=False)
+        return knn_impute(Xscale, k=self.knn_k, reference=self.reference_, copy=False)
+
+    def get_state(self) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+        """
+        Export the fitted state as a JSON-able config and named arrays.
+
+        Returns
+        -------
+        Tuple[Dict[str, Any], Dict[str, np.ndarray]]
+            (config, arrays) accepted by :meth:`from_state`.
+        """
+        if not self.is_fitted:
+            raise ValueError("Preprocessor is not fitted; call fit() first.")
+        params = self.scaler_.get_params()
+        config = {
+            "scale_method": self.scale_method,
+            "knn_k": self.knn_k,
+            "log_offset": self.log_offset,
+            "minpos": self.minpos_,
+            "ddof": params["ddof"],
+            "feature_names": self.feature_names_,
+        }
+        arrays = {"mean": params["mean"], "std": params["std"], "reference": self.reference_}
+        if params["range"] is not None:
+            arrays["range"] = params["range"]
+        return config, arrays
+
+    @classmethod
+    def from_state(cls, config: Dict[str, Any], arrays: Dict[str, np.ndarray]) -> "Preprocessor":
+        """
+        Rebuild a fitted preprocessor from :meth:`get_state` output.
+
+        Parameters
+        ----------
+        config : Dict[str, Any]
+            Exported config.
+        arrays : Dict[str, np.ndarray]
+            Exported arrays ('mean', 'std', 'reference' and optionally 'range').
+
+        Returns
+        -------
+        Preprocessor
+            Fitted preprocessor.
+        """
+        obj = cls(config["scale_method"], config["knn_k"], config["log_offset"])
+        obj.minpos_ = config["minpos"]
+        obj.feature_names_ = config["feature_names"]
+        obj.scaler_ = Scaler.from_params(
+            {
+                "method": config["scale_method"],
+                "ddof": config["ddof"],
+                "mean": arrays["mean"],
+                "std": arrays["std"],
+                "range": arrays.get("range"),
+            }
+        )
+        obj.reference_ = arrays["reference"]
+        return obj
+
+    def save(self, path: Union[str, Path]) -> Path:
+        """
+        Save the fitted state to a single ``.npz`` file.
+
+        Parameters
+        ----------
+        path : str or Path
+            Target file.
+
+        Returns
+        -------
+        Path
+            Path of the written file.
+        """
+        config, arrays = self.get_state()
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as f:
+            np.savez(f, config=np.array(json.dumps(config)), **arrays)
+        logger.info(f"Saved preprocessor to {path}")
+        return path
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "Preprocessor":
+        """
+        Load a preprocessor written by :meth:`save`.
+
+        Parameters
+        ----------
+        path : str or Path
+            Saved ``.npz`` file.
+
+        Returns
+        -------
+        Preprocessor
+            Fitted preprocessor.
+        """
+        with np.load(path, allow_pickle=False) as data:
+            config = json.loads(str(data["config"]))
+            return cls.from_state(config, {name: data[name] for name in data.files if name != "config"})
+
+
+def build_feature_matrix(
+    data_matrix: pd.DataFrame,
+    data_dict: pd.DataFrame,
+    sample_metadata: pd.DataFrame,
+    scale_method: str = "auto",
+    knn_k: int = 3,
+    log_offset: float = 0.5,
+    registry: Optional[SampleRegistry] = None,
+    preprocessor: Optional[Preprocessor] = None,
+    prefilter: Optional[Dict[str, Any]] = None,
+) -> Tuple[pd.DataFrame, np.ndarray, List[str]]:
+    """
+    Build preprocessed feature matrix (hoja2-style) for PCA/stats.
+
+    Steps:
+    1. Extract the numeric block of data_matrix as one contiguous
+       samples × compounds float array (see :func:`extract_sample_block`).
+    2. Build hoja2 around that array: SampleID, compound columns, Idx and
+       Class (from sample_metadata['Health']).
+    3. Match compounds against data_dict['compound_id'] (the hoja3 'Name').
+    4. Optionally drop compounds by missingness, variance or QC RSD.
+    5. Log10 transform (handle zeros), scale, KNN impute.
+
+    Memory: the raw frame is read once into the typed array, which hoja2's
+    compound columns share (no copy). Peak-memory target: at most 2.5× the
+    float64 samples × compounds matrix (typed block + preprocessed output +
+    1-byte masks; a gathered copy is added only when a subset of compounds
+    is matched). The old transpose/``apply(pd.to_numeric)`` path peaked at
+    4–6×; see ``benchmarks/bench_feature_matrix.py``.
+
+    Parameters
+    ----------
+    data_matrix : pd.DataFrame
+        Raw metabolite matrix (samples as columns, compounds as rows).
+    data_dict : pd.DataFrame
+        Compound dictionary (compound_id, BIOCHEMICAL, SUPER_PATHWAY, etc.).
+    sample_metadata : pd.DataFrame
+        Sample metadata (sample_id, Health, sex, BMI, hba1c, etc.).
+    scale_method : str
+        Scaling method for src.scaling.Scaler ('auto', 'pareto', 'vast', 'level', 'range').
+    knn_k : int
+        Number of neighbors for KNN imputation.
+    log_offset : float
+        Offset multiplier for min positive value to handle zeros.
+    registry : SampleRegistry, optional
+        Precomputed alignment (e.g. from ``validate_align``); built from
+        ``sample_metadata`` when omitted.
+    preprocessor : Preprocessor, optional
+        If fitted, samples are projected with its parameters (no refit; the
+        matched compounds must be the fitted ones). If not fitted, it is
+        fitted here so the caller can reuse it for new batches. When omitted
+        a throwaway Preprocessor is built from scale_method/knn_k/log_offset.
+    prefilter : Dict[str, Any], optional
+        ``preprocessing.prefilter`` settings (see
+        :func:`src.config.get_prefilter_settings`). When enabled, failing
+        compounds are dropped before scaling and imputation and the report
+        of dropped compounds is stored in ``hoja2.attrs['prefilter']``.
+        Ignored when projecting with a fitted preprocessor.
+
+    Returns
+    -------
+    Tuple[pd.DataFrame, np.ndarray, List[str]]
+        (hoja2_df, Xknn, peaklist)
+        - hoja2_df: DataFrame with SampleID, float64 compound columns (all
+          compounds, prefiltered or not), Idx and Class.
+        - Xknn: preprocessed numpy array (log10 + scaled + imputed).
+        - peaklist: list of compound names aligned with columns.
+    """
+    logger.info("Building feature matrix (hoja2-style)...")
+
+    # --- 1-3) hoja2 + raw matrix of the data_dict compounds ---
+    hoja2, X, presentes = matched_feature_block(
+        data_matrix, data_dict, sample_metadata, registry=registry
+    )
+
+    # --- 4) Project with a fitted preprocessor (its compounds decide) ---
+    if preprocessor is not None and preprocessor.is_fitted:
+        fitted = preprocessor.feature_names_
+        if fitted is None or fitted == [str(c) for c in presentes]:
+            Xknn = preprocessor.transform(X)
+        else:
+            Xknn = preprocessor.transform(hoja2[presentes])
+            by_name = {str(c): c for c in presentes}
+            presentes = [by_name[name] for name in fitted]
+        logger.info(f"Projected {Xknn.shape[0]} samples with a fitted preprocessor.")
+        return hoja2, Xknn, presentes
+
+    # --- 5) Optional prefilter (before the expensive steps) ---
+    if prefilter:
+        keep, report = prefilter_from_settings(X, presentes, prefilter, hoja2["Class"])
+        hoja2.attrs["prefilter"] = report
+        if not keep.all():
+            X = X[:, keep]
+            presentes = [c for c, k in zip(presentes, keep) if k]
+
+    # --- 6) Log10 transform, scale, KNN impute ---
+    if preprocessor is None:
+        # Validate scale_method before building the preprocessor
+        if scale_method not in SCALE_METHODS:
+            logger.warning(
+                f"Invalid scale_method '{scale_method}'. Falling back to 'auto'. "
+                f"Valid options: {SCALE_METHODS}"
+            )
+            scale_method = "auto"
+        preprocessor = Preprocessor(scale_method, knn_k=knn_k, log_offset=log_offset)
+
+    Xknn = preprocessor.fit_transform(X, feature_names=presentes)
+    logger.info(
+        f"Preprocessed with scale='{preprocessor.scale_method}', "
+        f"KNN k={preprocessor.knn_k}. Shape: {Xknn.shape}"
+    )
+
+    return hoja2, Xknn, presentes
+
+
+def matched_feature_block(
+    data_matrix: pd.DataFrame,
+    data_dict: pd.DataFrame,
+    sample_metadata: pd.DataFrame,
+    registry: Optional[SampleRegistry] = None,
+) -> Tuple[pd.DataFrame, np.ndarray, List[str]]:
+    """
+    Steps 1-3 of :func:`build_feature_matrix`: hoja2 plus the raw matched block.
+
+    These steps do not depend on the preprocessing parameters, so callers
+    that preprocess the same data several times (e.g. :mod:`src.sweep`)
+    run them once.
+
+    Parameters
+    ----------
+    data_matrix : pd.DataFrame
+        Raw metabolite matrix (samples as columns, compounds as rows).
+    data_dict : pd.DataFrame
+        Compound dictionary with 'compound_id' (or 'Name').
+    sample_metadata : pd.DataFrame
+        Sample metadata (sample_id, Health, ...).
+    registry : SampleRegistry, optional
+        Precomputed alignment; built from ``sample_metadata`` when omitted.
+
+    Returns
+    -------
+    Tuple[pd.DataFrame, np.ndarray, List[str]]
+        (hoja2_df, X, presentes)
+        - hoja2_df: SampleID, float64 compound columns, Idx and Class.
+        - X: raw samples × matched compounds float64 array.
+        - presentes: matched compound names aligned with X columns.
+    """
+    # --- 1) Typed samples × compounds block + sample metadata ---
+    sample_info, block, compounds = sample_feature_block(
+        data_matrix, sample_metadata, registry=registry
+    )
+
+    # --- 2) hoja2 around the block (compound columns are a view of it) ---
+    hoja2 = feature_table(sample_info, block, compounds)
+
+    # --- 3) Peaklist from data_dict (hoja3 'Name' = compound_id) ---
+    positions, peaklist_raw = match_peaklist(compounds, data_dict)
+    presentes = [compounds[j] for j in positions]
+    logger.info(f"Matched {len(presentes)}/{len(peaklist_raw)} compounds.")
+
+    # Whole block in order -> no copy; otherwise gather the matched columns
+    if np.array_equal(positions, np.arange(block.shape[1])):
+        X = block
+    else:
+        X = block[:, positions]
+    return hoja2, X, presentes
+
+
+def sample_feature_block(
+    data_matrix: pd.DataFrame,
+    sample_metadata: pd.DataFrame,
+    registry: Optional[SampleRegistry] = None,
+    id_col: str = "compound_id",
+) -> Tuple[pd.DataFrame, np.ndarray, pd.Index]:
+    """
+    Split a compounds × samples matrix into typed features and sample metadata.
+
+    Parameters
+    ----------
+    data_matrix : pd.DataFrame
+        Raw metabolite matrix (samples as columns, compounds as rows).
+    sample_metadata : pd.DataFrame
+        Sample metadata with 'sample_id' and 'Health'.
+    registry : SampleRegistry, optional
+        Precomputed alignment; rebuilt when it does not match the matrix.
+    id_col : str
+        Compound ID column (the frame index is used when absent).
+
+    Returns
+    -------
+    Tuple[pd.DataFrame, np.ndarray, pd.Index]
+        (sample_info, block, compounds)
+        - sample_info: SampleID, Idx and Class per sample (matrix order).
+        - block: C-contiguous float64 samples × compounds array.
+        - compounds: compound labels of the block columns.
+    """
+    if id_col in data_matrix.columns:
+        sample_pos = np.flatnonzero(data_matrix.columns != id_col)
+        compounds = pd.Index(data_matrix[id_col])
+    else:
+        sample_pos = np.arange(data_matrix.shape[1])
+        compounds = pd.Index(data_matrix.index)
+    sample_ids = data_matrix.columns[sample_pos]
+    block = extract_sample_block(data_matrix, sample_pos)
+
+    sample_info = pd.DataFrame(
+        {
+            "SampleID": np.asarray(sample_ids, dtype=object),
+            "Idx": np.arange(1, len(sample_ids) + 1),
+        }
+    )
+    # Match SampleID with sample_metadata['sample_id'] via take-indices
+    if "Health" in sample_metadata.columns and "sample_id" in sample_metadata.columns:
+        if registry is None or not registry.matrix_index.equals(
+            pd.Index(sample_ids.astype(str))
+        ):
+            registry = SampleRegistry(sample_metadata["sample_id"], sample_ids)
+        sample_info["Class"] = registry.take(sample_metadata["Health"])
+        logger.info(f"Mapped Class column: {sample_info['Class'].unique()}")
+    else:
+        logger.warning("'Health' or 'sample_id' not found in sample_metadata.")
+        sample_info["Class"] = "Unknown"
+    return sample_info, block, compounds
+
+
+def feature_table(sample_info: pd.DataFrame, block: np.ndarray, compounds: pd.Index) -> pd.DataFrame:
+    """
+    Assemble the hoja2 frame (SampleID, compounds, Idx, Class) without copying the block.
+
+    Parameters
+    ----------
+    sample_info : pd.DataFrame
+        Output of :func:`sample_feature_block`.
+    block : np.ndarray
+        Samples × compounds float array.
+    compounds : pd.Index
+        Compound labels.
+
+    Returns
+    -------
+    pd.DataFrame
+        hoja2 whose compound columns are a view of ``block``.
+    """
+    hoja2 = pd.DataFrame(block, columns=compounds, copy=False)
+    hoja2.insert(0, "SampleID", sample_info["SampleID"].to_numpy())
+    for col in sample_info.columns.drop("SampleID"):
+        hoja2[col] = sample_info[col].to_numpy()
+    return hoja2
+
+
+def normalize_compound_name(name: Any) -> str:
+    """
+    Normalize a compound label for matching (case, surrounding spaces, spaces/dashes → '_').
+
+    Parameters
+    ----------
+    name : Any
+        Compound label.
+
+    Returns
+    -------
+    str
+        Normalized label.
+    """
+    return str(name).strip().lower().replace(" ", "_").replace("-", "_")
+
+
+def match_peaklist(compounds: pd.Index, data_dict: pd.DataFrame) -> Tuple[List[int], List[str]]:
+    """
+    Positions of the data_dict compounds within the matrix compounds.
+
+    Names are compared after normalization (case, spaces, dashes). When
+    nothing matches, the first 100 compounds are used as a fallback.
+
+    Parameters
+    ----------
+    compounds : pd.Index
+        Matrix compound labels.
+    data_dict : pd.DataFrame
+        Compound dictionary with 'compound_id' (or 'Name').
+
+    Returns
+    -------
+    Tuple[List[int], List[str]]
+        (positions, peaklist_raw)
+
+    Raises
+    ------
+    ValueError
+        If data_dict has no compound name column.
+    """
+    name_col = "compound_id" if "compound_id" in data_dict.columns else "Name"
+    if name_col not in data_dict.columns:
+        logger.error("'Name' column not found in hoja3 (data_dict).")
+        raise ValueError("Missing 'Name' column in data_dict.")
+
+    peaklist_raw = data_dict[name_col].dropna().astype(str).tolist()
+
+    col_pos = {normalize_compound_name(c): j for j, c in enumerate(compounds)}
+    positions = [
+        col_pos[normalize_compound_name(p)] for p in peaklist_raw if normalize_compound_name(p) in col_pos
+    ]
+
+    if not positions:
+        logger.warning("No compound columns matched between hoja2 and hoja3.")
+        positions = list(range(min(100, len(compounds))))  # fallback: first 100 compounds
+    return positions, peaklist_raw
+
+
+def extract_sample_block(
+    data_matrix: pd.DataFrame, sample_pos: Sequence[int], dtype: type = np.float64
+) -> np.ndarray:
+    """
+    Copy sample columns of a compounds × samples frame into a samples × compounds array.
+
+    Each sample column is written straight into one row of a preallocated
+    C-contiguous array (a single copy, already transposed). Non-numeric
+    columns are coerced together in one ``pd.to_numeric`` call over their
+    flattened values (unparseable entries become NaN), instead of one call
+    per compound.
+
+    Parameters
+    ----------
+    data_matrix : pd.DataFrame
+        Raw matrix with compounds as rows.
+    sample_pos : Sequence[int]
+        Column positions of the samples.
+    dtype : type
+        Output dtype (np.float64 or np.float32).
+
+    Returns
+    -------
+    np.ndarray
+        Array of shape (len(sample_pos), n_compounds).
+    """
+    out = np.empty((len(sample_pos), data_matrix.shape[0]), dtype=dtype)
+    pending = []
+    for i, j in enumerate(sample_pos):
+        col = data_matrix.iloc[:, j]
+        if pd.api.types.is_numeric_dtype(col.dtype):
+            out[i] = col.to_numpy(dtype=dtype, na_value=np.nan)
+        else:
+            pending.append(i)
+
+    if pending:
+        cols = np.asarray(sample_pos)[pending]
+        raw = data_matrix.iloc[:, cols].to_numpy(dtype=object).T.ravel()
+        coerced = pd.to_numeric(pd.Series(raw, copy=False), errors="coerce")
+        out[pending] = coerced.to_numpy(dtype=dtype, na_value=np.nan).reshape(len(pending), -1)
+        logger.info(f"Coerced {len(pending)} non-numeric sample columns to {np.dtype(dtype).name}.")
+    return out
+
+
+def feature_cache_key(*parts: Any) -> str:
+    """
+    Content hash of preprocessing inputs and parameters.
+
+    DataFrames are hashed with ``pd.util.hash_pandas_object`` (values and
+    index) plus their column labels, arrays by shape, dtype and raw bytes,
+    and anything else by ``repr``.
+
+    Parameters
+    ----------
+    *parts : Any
+        Input frames/arrays and parameters, in a fixed order.
+
+    Returns
+    -------
+    str
+        Hex key (sha256, 40 characters).
+    """
+    digest = hashlib.sha256(f"v{FEATURE_CACHE_VERSION}".encode())
+    for part in parts:
+        if isinstance(part, pd.DataFrame):
+            digest.update(repr(list(part.columns)).encode())
+            digest.update(pd.util.hash_pandas_object(part, index=True).to_numpy().tobytes())
+        elif isinstance(part, np.ndarray):
+            digest.update(f"{part.shape}{part.dtype}".encode())
+            digest.update(np.ascontiguousarray(part).tobytes())
+        else:
+            digest.update(repr(part).encode())
+        digest.update(b"|")
+    return digest.hexdigest()[:40]
+
+
+def preprocess_cached(
+    X: np.ndarray,
+    scale_method: str = "auto",
+    knn_k: int = 3,
+    log_offset: float = 0.5,
+    cache_dir: Union[str, Path] = ".cache/features",
+    max_bytes: Optional[int] = None,
+    mmap: bool = True,
+    key: Optional[str] = None,
+) -> np.ndarray:
+    """
+    Log10 + scale + KNN-impute a raw matrix through the on-disk cache.
+
+    Parameters
+    ----------
+    X : np.ndarray
+        Raw samples × compounds intensities.
+    scale_method : str
+        Scaling method ('auto', 'pareto', 'vast', 'level', 'range').
+    knn_k : int
+        Number of neighbors for KNN imputation.
+    log_offset : float
+        Offset multiplier for min positive value to handle zeros.
+    cache_dir : str or Path
+        Cache directory, shared across pages and processes.
+    max_bytes : int, optional
+        Size bound for the cache directory (LRU eviction).
+    mmap : bool
+        Return cache hits as read-only memory maps instead of loading them.
+    key : str, optional
+        Precomputed ``feature_cache_key(X, scale_method, knn_k, log_offset)``,
+        for callers that also use it as the fingerprint of the result.
+
+    Returns
+    -------
+    np.ndarray
+        Preprocessed matrix. The fitted :class:`Preprocessor` is stored in
+        the same entry (see :func:`load_cached_preprocessor`).
+    """
+    X = np.asarray(X, dtype=np.float64)
+    cache = DiskCache(cache_dir, max_bytes=max_bytes)
+    key = key or feature_cache_key(X, scale_method, knn_k, log_offset)
+
+    entry = cache.get(key)
+    if entry is not None:
+        try:
+            return np.load(entry / "Xknn.npy", mmap_mode="r" if mmap else None)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Corrupt feature cache entry {key}, recomputing: {e}")
+            cache.invalidate(key)
+
+    preprocessor = Preprocessor(scale_method, knn_k=knn_k, log_offset=log_offset)
+    Xknn = preprocessor.fit_transform(X)
+
+    def _write(target: Path) -> None:
+        np.save(target / "Xknn.npy", Xknn)
+        preprocessor.save(target / "preprocessor.npz")
+
+    try:
+        cache.put(
+            key,
+            _write,
+            metadata={"shape": list(Xknn.shape), "scale_method": scale_method, "knn_k": knn_k},
+        )
+    except OSError as e:
+        logger.warning(f"Could not cache preprocessed matrix: {e}")
+    return Xknn
+
+
+def load_cached_preprocessor(
+    key: str,
+    cache_dir: Union[str, Path] = ".cache/features",
+    max_bytes: Optional[int] = None,
+    feature_names: Optional[Sequence[str]] = None,
+) -> Optional[Preprocessor]:
+    """
+    Fitted preprocessor stored by :func:`preprocess_cached` under ``key``.
+
+    Lets callers that need the fitted parameters (e.g. to export a PCA
+    artifact) reuse the cached fit instead of preprocessing the cohort again.
+
+    Parameters
+    ----------
+    key : str
+        ``feature_cache_key`` of the preprocessed matrix.
+    cache_dir : str or Path
+        Cache directory used by :func:`preprocess_cached`.
+    max_bytes : int, optional
+        Size bound for the cache directory (LRU eviction).
+    feature_names : Sequence[str], optional
+        Compound names of the matrix columns (the cached fit is on an array),
+        used to align DataFrames in :meth:`Preprocessor.transform`.
+
+    Returns
+    -------
+    Preprocessor or None
+        Fitted preprocessor, or None when the entry is missing or predates it.
+    """
+    entry = DiskCache(cache_dir, max_bytes=max_bytes).get(key)
+    if entry is None or not (entry / "preprocessor.npz").exists():
+        return None
+    try:
+        preprocessor = Preprocessor.load(entry / "preprocessor.npz")
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Could not load cached preprocessor {key}: {e}")
+        return None
+    if feature_names is not None:
+        preprocessor.feature_names_ = [str(c) for c in feature_names]
+    return preprocessor
+
+
+def build_feature_matrix_cached(
+    data_matrix: pd.DataFrame,
+    data_dict: pd.DataFrame,
+    sample_metadata: pd.DataFrame,
+    scale_method: str = "auto",
+    knn_k: int = 3,
+    log_offset: float = 0.5,
+    cache_dir: Union[str, Path] = ".cache/features",
+    max_bytes: Optional[int] = None,
+    mmap: bool = True,
+    prefilter: Optional[Dict[str, Any]] = None,
+) -> Tuple[pd.DataFrame, np.ndarray, List[str]]:
+    """
+    :func:`build_feature_matrix` backed by a content-addressed disk cache.
+
+    The key hashes the three input frames and
+    ``(scale_method, knn_k, log_offset, prefilter)``, so any page or process that asks
+    for the same preprocessing reuses the stored result, including after a
+    server restart. Entries hold ``Xknn.npy``, ``hoja2.parquet`` (plus one
+    Parquet file per DataFrame in ``hoja2.attrs``, e.g. the prefilter report)
+    and ``peaklist.json``; no pickles are read back. The cache is bounded by
+    ``max_bytes`` with LRU eviction and counts hits/misses (see
+    :class:`src.cache.DiskCache`). hoja2 is returned in its Parquet form
+    (:func:`src.cache.parquet_compatible`) on misses too, so results do not
+    depend on the cache state.
+
+    Parameters
+    ----------
+    data_matrix : pd.DataFrame
+        Raw metabolite matrix (samples as columns, compounds as rows).
+    data_dict : pd.DataFrame
+        Compound dictionary.
+    sample_metadata : pd.DataFrame
+        Sample metadata.
+    scale_method : str
+        Scaling method ('auto', 'pareto', 'vast', 'level', 'range').
+    knn_k : int
+        Number of neighbors for KNN imputation.
+    log_offset : float
+        Offset multiplier for min positive value to handle zeros.
+    cache_dir : str or Path
+        Cache directory, shared across pages and processes.
+    max_bytes : int, optional
+        Size bound for the cache directory (LRU eviction).
+    mmap : bool
+        Return a cached Xknn as a read-only memory map instead of loading it.
+    prefilter : Dict[str, Any], optional
+        ``preprocessing.prefilter`` settings passed to :func:`build_feature_matrix`.
+
+    Returns
+    -------
+    Tuple[pd.DataFrame, np.ndarray, List[str]]
+        (hoja2_df, Xknn, peaklist), as :func:`build_feature_matrix`.
+    """
+    cache = DiskCache(cache_dir, max_bytes=max_bytes)
+    prefilter = prefilter if prefilter and prefilter.get("enabled", True) else None
+    key = feature_cache_key(
+        data_matrix,
+        data_dict,
+        sample_metadata,
+        scale_method,
+        knn_k,
+        log_offset,
+        json.dumps(prefilter, sort_keys=True, default=str),
+    )
+
+    entry = cache.get(key)
+    if entry is not None:
+        try:
+            hoja2 = pd.read_parquet(entry / "hoja2.parquet")
+            for path in entry.glob("attrs_*.parquet"):
+                hoja2.attrs[path.stem[len("attrs_"):]] = pd.read_parquet(path)
+            with open(entry / "peaklist.json", "r", encoding="utf-8") as f:
+                peaklist = json.load(f)
+            Xknn = np.load(entry / "Xknn.npy", mmap_mode="r" if mmap else None)
+            logger.info(f"Loaded feature matrix {Xknn.shape} from cache")
+            return hoja2, Xknn, peaklist
+        except Exception as e:
+            logger.warning(f"Corrupt feature cache entry {key}, recomputing: {e}")
+            cache.invalidate(key)
+
+    hoja2, Xknn, peaklist = build_feature_matrix(
+        data_matrix,
+        data_dict,
+        sample_metadata,
+        scale_method=scale_method,
+        knn_k=knn_k,
+        log_offset=log_offset,
+        prefilter=prefilter,
+    )
+    attrs = hoja2.attrs
+    hoja2 = parquet_compatible(hoja2)
+    hoja2.attrs = attrs
+    peaklist = [str(p) for p in peaklist]
+
+    def _write(target: Path) -> None:
+        np.save(target / "Xknn.npy", Xknn)
+        write_parquet(hoja2, target / "hoja2.parquet")
+        for name, value in attrs.items():
+            if isinstance(value, pd.DataFrame):
+                write_parquet(value, target / f"attrs_{name}.parquet")
+        with open(target / "peaklist.json", "w", encoding="utf-8") as f:
+            json.dump(peaklist, f)
+
+    try:
+        cache.put(
+            key,
+            _write,
+            metadata={"shape": list(Xknn.shape), "scale_method": scale_method, "knn_k": knn_k},
+        )
+    except Exception as e:
+        logger.warning(f"Could not cache feature matrix: {e}")
+    return hoja2, Xknn, peaklist
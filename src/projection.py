@@ -0,0 +1,220 @@
+"""
+Stored PCA artifacts: project new samples onto an existing PCA map without refitting.
+"""
+import io
+import json
+import logging
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from src.pca_utils import PCAModel
+from src.preprocess import Preprocessor, extract_sample_block
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_VERSION = 1
+
+
+class PCAArtifact:
+    """
+    Fitted preprocessing + PCA bundle that places new samples on the reference map.
+
+    Holds everything needed to go from raw intensities to PCA scores: the
+    fitted :class:`src.preprocess.Preprocessor` (log offset, scaling
+    parameters, KNN reference), the :class:`src.pca_utils.PCAModel`
+    (centering, loadings, explained variance, reference scores), the class
+    label and ID of each reference sample and fit metadata. :meth:`save`
+    writes a single ``.npz`` (no pickles); :meth:`project` only applies the
+    stored parameters, so a handful of samples is placed in milliseconds.
+
+    Parameters
+    ----------
+    preprocessor : Preprocessor
+        Fitted preprocessor of the reference cohort.
+    model : PCAModel
+        PCA fitted on the preprocessed reference cohort.
+    labels : Sequence, optional
+        Class label per reference sample.
+    sample_ids : Sequence, optional
+        ID per reference sample.
+    metadata : Dict[str, Any], optional
+        Extra JSON-able fit metadata (e.g. data source); 'created',
+        'n_samples' and 'n_features' are filled in automatically.
+    """
+
+    def __init__(
+        self,
+        preprocessor: Preprocessor,
+        model: PCAModel,
+        labels: Optional[Sequence] = None,
+        sample_ids: Optional[Sequence] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+    ):
+        if not preprocessor.is_fitted or not model.is_fitted:
+            raise ValueError("Both the preprocessor and the PCA model must be fitted.")
+        n_features = model.components_.shape[1]
+        if preprocessor.scaler_.mean_.shape[0] != n_features:
+            raise ValueError(
+                f"Preprocessor has {preprocessor.scaler_.mean_.shape[0]} features, "
+                f"PCA model has {n_features}."
+            )
+        self.preprocessor = preprocessor
+        self.model = model
+        n_ref = None if model.scores_ is None else model.scores_.shape[0]
+        self.labels = None if labels is None else [str(v) for v in labels]
+        self.sample_ids = None if sample_ids is None else [str(v) for v in sample_ids]
+        self.metadata = {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "n_samples": n_ref,
+            "n_features": int(n_features),
+            **(metadata or {}),
+        }
+
+    @property
+    def feature_names(self) -> Optional[Sequence[str]]:
+        """Compound names the artifact expects (from the preprocessor)."""
+        return self.preprocessor.feature_names_
+
+    def project(self, X: Union[pd.DataFrame, np.ndarray]) -> np.ndarray:
+        """
+        Preprocess raw samples with the stored parameters and score them.
+
+        Parameters
+        ----------
+        X : pd.DataFrame or np.ndarray
+            Raw samples × compounds intensities. DataFrames are aligned on
+            :attr:`feature_names` (extra columns are ignored).
+
+        Returns
+        -------
+        np.ndarray
+            Samples × components scores in the reference PCA space.
+        """
+        start = time.perf_counter()
+        scores = self.model.transform(self.preprocessor.transform(X))
+        logger.info(
+            f"Projected {scores.shape[0]} samples onto stored PCA "
+            f"in {1000 * (time.perf_counter() - start):.1f} ms"
+        )
+        return scores
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialize the artifact to the ``.npz`` bytes written by :meth:`save`.
+
+        Returns
+        -------
+        bytes
+            Artifact file contents (e.g. for a download button).
+        """
+        buffer = io.BytesIO()
+        self._write(buffer)
+        return buffer.getvalue()
+
+    def save(self, path: Union[str, Path]) -> Path:
+        """
+        Write the artifact to a single ``.npz`` file.
+
+        Parameters
+        ----------
+        path : str or Path
+            Target file.
+
+        Returns
+        -------
+        Path
+            Path of the written file.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as f:
+            self._write(f)
+        logger.info(f"Saved PCA artifact to {path}")
+        return path
+
+    def _write(self, f) -> None:
+        pre_config, pre_arrays = self.preprocessor.get_state()
+        pca_config, pca_arrays = self.model.get_state()
+        config = {
+            "version": ARTIFACT_VERSION,
+            "preprocessor": pre_config,
+            "pca": pca_config,
+            "labels": self.labels,
+            "sample_ids": self.sample_ids,
+            "metadata": self.metadata,
+        }
+        arrays = {f"pre_{k}": v for k, v in pre_arrays.items()}
+        arrays.update({f"pca_{k}": v for k, v in pca_arrays.items()})
+        np.savez(f, config=np.array(json.dumps(config, default=str)), **arrays)
+
+    @classmethod
+    def load(cls, path: Union[str, Path, io.BytesIO]) -> "PCAArtifact":
+        """
+        Load an artifact written by :meth:`save` or :meth:`to_bytes`.
+
+        Parameters
+        ----------
+        path : str, Path or file-like
+            Saved ``.npz`` file, or a buffer holding its bytes.
+
+        Returns
+        -------
+        PCAArtifact
+            Loaded artifact.
+
+        Raises
+        ------
+        ValueError
+            If the file was written by a newer artifact version.
+        """
+        with np.load(path, allow_pickle=False) as data:
+            config = json.loads(str(data["config"]))
+            if config.get("version", 0) > ARTIFACT_VERSION:
+                raise ValueError(f"Unsupported PCA artifact version {config['version']}.")
+            pre_arrays = {k[4:]: data[k] for k in data.files if k.startswith("pre_")}
+            pca_arrays = {k[4:]: data[k] for k in data.files if k.startswith("pca_")}
+        obj = cls.__new__(cls)
+        obj.preprocessor = Preprocessor.from_state(config["preprocessor"], pre_arrays)
+        obj.model = PCAModel.from_state(config["pca"], pca_arrays)
+        obj.labels = config["labels"]
+        obj.sample_ids = config["sample_ids"]
+        obj.metadata = config["metadata"]
+        return obj
+
+
+def samples_frame(data_matrix: pd.DataFrame, id_col: str = "compound_id") -> pd.DataFrame:
+    """
+    Samples × compounds float frame from a compounds × samples matrix.
+
+    Used for batches of new samples laid out like the ``data_matrix`` sheet.
+
+    Parameters
+    ----------
+    data_matrix : pd.DataFrame
+        Matrix with compounds as rows and samples as columns.
+    id_col : str
+        Compound ID column (the frame index is used when absent).
+
+    Returns
+    -------
+    pd.DataFrame
+        Float64 frame indexed by sample ID with compound columns.
+    """
+    if id_col in data_matrix.columns:
+        sample_pos = np.flatnonzero(data_matrix.columns != id_col)
+        compounds = data_matrix[id_col].astype(str)
+    else:
+        sample_pos = np.arange(data_matrix.shape[1])
+        compounds = data_matrix.index.astype(str)
+    block = extract_sample_block(data_matrix, sample_pos)
+    return pd.DataFrame(
+        block,
+        index=pd.Index(data_matrix.columns[sample_pos].astype(str), name="SampleID"),
+        columns=pd.Index(compounds),
+        copy=False,
+    )
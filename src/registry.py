@@ -0,0 +1,168 @@
+"""
+Index-backed registry that aligns metadata samples with matrix samples.
+"""
+import logging
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class SampleRegistry:
+    """
+    Alignment between metadata rows and data-matrix samples.
+
+    Both sides are held as string ``pd.Index`` objects and the alignment is
+    computed once as integer take-indices, so joins and subsets downstream
+    are plain array gathers instead of per-row dictionary lookups.
+
+    Parameters
+    ----------
+    meta_ids : Sequence
+        Sample IDs in metadata row order (NaN entries are ignored; for
+        duplicated IDs the first row wins).
+    matrix_ids : Sequence
+        Sample IDs in data-matrix order.
+
+    Attributes
+    ----------
+    meta_index : pd.Index
+        Metadata sample IDs (as str, one per metadata row).
+    matrix_index : pd.Index
+        Matrix sample IDs (as str).
+    meta_take : np.ndarray
+        For each matrix sample, the metadata row position (-1 if absent).
+    matrix_take : np.ndarray
+        For each metadata row, the matrix sample position (-1 if absent).
+    n_meta : int
+        Number of unique, non-null metadata sample IDs.
+    missing : pd.Index
+        Metadata samples absent from the matrix.
+    extra : pd.Index
+        Matrix samples absent from the metadata.
+    """
+
+    def __init__(self, meta_ids: Sequence, matrix_ids: Sequence):
+        meta_ids = pd.Series(meta_ids, dtype=object)
+        valid = meta_ids.notna().to_numpy()
+        self.meta_index = pd.Index(meta_ids.astype(str).where(valid, None))
+        self.matrix_index = pd.Index(pd.Series(matrix_ids, dtype=object).astype(str))
+
+        # Unique lookup table over valid metadata IDs (first occurrence wins)
+        keep = valid & ~self.meta_index.duplicated(keep="first")
+        if (valid & ~keep).any():
+            logger.warning(
+                f"{int((valid & ~keep).sum())} duplicated sample IDs in metadata; "
+                "using the first occurrence."
+            )
+        lookup = self.meta_index[keep]
+        lookup_pos = np.flatnonzero(keep)
+
+        hit = lookup.get_indexer(self.matrix_index)
+        self.meta_take = np.where(hit >= 0, lookup_pos[hit], -1)
+
+        matrix_first = ~self.matrix_index.duplicated(keep="first")
+        matrix_lookup = self.matrix_index[matrix_first]
+        matrix_pos = np.flatnonzero(matrix_first)
+        hit = matrix_lookup.get_indexer(self.meta_index)
+        self.matrix_take = np.where(hit >= 0, matrix_pos[hit], -1)
+        self.matrix_take[~valid] = -1
+
+        self.n_meta = len(lookup)
+        self.missing = lookup[~lookup.isin(self.matrix_index)]
+        self.extra = self.matrix_index[self.meta_take < 0]
+
+    @classmethod
+    def from_frames(
+        cls,
+        meta: pd.DataFrame,
+        data_matrix: pd.DataFrame,
+        sample_col: str = "sample_id",
+        id_col: str = "compound_id",
+    ) -> "SampleRegistry":
+        """
+        Build a registry from metadata and a compounds × samples matrix.
+
+        Parameters
+        ----------
+        meta : pd.DataFrame
+            Sample metadata with a ``sample_col`` column.
+        data_matrix : pd.DataFrame
+            Data matrix with samples as columns (``id_col`` is skipped).
+        sample_col : str
+            Column name for sample IDs in metadata.
+        id_col : str
+            Compound ID column in the data matrix.
+
+        Returns
+        -------
+        SampleRegistry
+            Registry aligned on matrix sample order.
+        """
+        matrix_ids = [c for c in data_matrix.columns if c != id_col]
+        return cls(meta[sample_col], matrix_ids)
+
+    @property
+    def n_matched(self) -> int:
+        """Number of matrix samples that have a metadata row."""
+        return int((self.meta_take >= 0).sum())
+
+    @property
+    def overlap_pct(self) -> float:
+        """Percentage of (unique, non-null) metadata samples found in the matrix."""
+        return (self.n_meta - len(self.missing)) / max(self.n_meta, 1) * 100
+
+    def take(self, values: Sequence, fill_value=np.nan) -> np.ndarray:
+        """
+        Gather per-metadata-row values into matrix sample order.
+
+        Parameters
+        ----------
+        values : Sequence
+            Values aligned with metadata rows (e.g. ``meta['Health']``).
+        fill_value : scalar
+            Value for matrix samples without metadata.
+
+        Returns
+        -------
+        np.ndarray
+            Array of length ``len(matrix_index)``.
+        """
+        values = np.asarray(values)
+        matched = self.meta_take >= 0
+        if matched.all():
+            return values[self.meta_take]
+        out = np.full(
+            len(self.matrix_index),
+            fill_value,
+            dtype=values.dtype if values.dtype.kind in "fc" else object,
+        )
+        out[matched] = values[self.meta_take[matched]]
+        return out
+
+    def positions(self, labels: Sequence) -> np.ndarray:
+        """
+        Matrix positions of the given sample IDs (for O(n) subset gathers).
+
+        Parameters
+        ----------
+        labels : Sequence
+            Sample IDs to select.
+
+        Returns
+        -------
+        np.ndarray
+            Integer positions into the matrix sample axis.
+
+        Raises
+        ------
+        KeyError
+            If a label is not a matrix sample.
+        """
+        pos = self.matrix_index.get_indexer(pd.Index([str(v) for v in labels]))
+        if (pos < 0).any():
+            unknown = [str(v) for v, p in zip(labels, pos) if p < 0]
+            raise KeyError(f"Unknown sample IDs: {unknown[:5]}")
+        return pos
@@ -0,0 +1,290 @@
+"""
+Bootstrap and permutation stability analysis of PCA scores and group separation.
+"""
+import logging
+import os
+import time
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from scipy.linalg import orthogonal_procrustes
+from scipy.stats import chi2
+
+from src.parallel import map_shared, worker_array, worker_context
+from src.pca_utils import PCAModel
+
+logger = logging.getLogger(__name__)
+
+
+def silhouette_from_distances(D: np.ndarray, codes: np.ndarray) -> np.ndarray:
+    """
+    Mean silhouette for one or many labelings of the same samples.
+
+    Equivalent to ``sklearn.metrics.silhouette_score`` with a precomputed
+    distance matrix, but a whole batch of labelings (e.g. permutations) is
+    evaluated with one matrix product instead of one call per labeling.
+
+    Parameters
+    ----------
+    D : np.ndarray
+        n × n distance matrix.
+    codes : np.ndarray
+        Integer group codes, shape (n,) or (n_labelings, n).
+
+    Returns
+    -------
+    np.ndarray
+        Mean silhouette per labeling (scalar array for 1-D ``codes``).
+    """
+    codes = np.asarray(codes)
+    single = codes.ndim == 1
+    codes = np.atleast_2d(codes)
+    m, n = codes.shape
+    g = int(codes.max()) + 1
+    onehot = np.zeros((m, n, g))
+    onehot[np.arange(m)[:, None], np.arange(n)[None, :], codes] = 1.0
+    counts = onehot.sum(axis=1)  # m × g
+    sums = np.einsum("ij,mjg->mig", D, onehot)  # distance from each sample to each group
+
+    own = np.take_along_axis(sums, codes[:, :, None], axis=2)[:, :, 0]
+    own_count = np.take_along_axis(counts, codes, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        a = own / (own_count - 1)
+        mean_to = sums / counts[:, None, :]
+    np.put_along_axis(mean_to, codes[:, :, None], np.inf, axis=2)
+    b = mean_to.min(axis=2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        s = (b - a) / np.maximum(a, b)
+    s = np.where(own_count > 1, np.nan_to_num(s), 0.0)  # singletons score 0, as in sklearn
+    result = s.mean(axis=1)
+    return result[0] if single else result
+
+
+def _pairwise(scores: np.ndarray) -> np.ndarray:
+    sq = np.einsum("ij,ij->i", scores, scores)
+    return np.sqrt(np.maximum(sq[:, None] + sq[None, :] - 2.0 * scores @ scores.T, 0.0))
+
+
+def confidence_ellipse(points: np.ndarray, confidence: float = 0.95) -> Dict[str, float]:
+    """
+    Normal-theory confidence ellipse of 2-D points.
+
+    Parameters
+    ----------
+    points : np.ndarray
+        m × 2 array.
+    confidence : float
+        Coverage probability (chi-square with 2 degrees of freedom).
+
+    Returns
+    -------
+    Dict[str, float]
+        'center_x', 'center_y', 'width', 'height' (full axis lengths) and
+        'angle' (degrees of the width axis from the x-axis).
+    """
+    points = np.asarray(points, dtype=np.float64)
+    center = points.mean(axis=0)
+    cov = np.cov(points, rowvar=False) if len(points) > 1 else np.zeros((2, 2))
+    evals, evecs = np.linalg.eigh(cov)
+    evals = np.clip(evals[::-1], 0.0, None)
+    major = evecs[:, 1]
+    scale = np.sqrt(chi2.ppf(confidence, df=2))
+    return {
+        "center_x": float(center[0]),
+        "center_y": float(center[1]),
+        "width": float(2 * scale * np.sqrt(evals[0])),
+        "height": float(2 * scale * np.sqrt(evals[1])),
+        "angle": float(np.degrees(np.arctan2(major[1], major[0]))),
+    }
+
+
+def _bootstrap_task(seeds: Sequence[int]) -> Dict[str, Any]:
+    """Run one bootstrap refit per seed on the shared Xknn."""
+    X = worker_array()
+    ctx = worker_context()
+    ref_components = ctx["components"]
+    k = ref_components.shape[0]
+    n = X.shape[0]
+    count = len(seeds)
+
+    start = time.perf_counter()
+    scores = np.empty((count, n, k), dtype=np.float32)
+    separation = np.empty(count)
+    for r, seed in enumerate(seeds):
+        idx = np.random.default_rng(seed).integers(0, n, size=n)
+        try:
+            model = PCAModel(n_components=k, solver=ctx["solver"]).fit(X[idx])
+        except np.linalg.LinAlgError:
+            # LAPACK's divide-and-conquer SVD occasionally fails on the
+            # rank-deficient resamples (duplicated rows); ARPACK does not
+            model = PCAModel(n_components=k, solver="arpack").fit(X[idx])
+        # Rotate the bootstrap loadings onto the reference ones (sign flips and swaps)
+        R, _ = orthogonal_procrustes(model.components_.T, ref_components.T)
+        aligned = R.T @ model.components_
+        proj = (X - model.mean_) @ aligned.T
+        scores[r] = proj
+        sep_scores = proj[ctx["labelled"], : ctx["n_sep"]]
+        separation[r] = silhouette_from_distances(_pairwise(sep_scores), ctx["codes"])
+    return {"scores": scores, "separation": separation, "seconds": time.perf_counter() - start}
+
+
+def bootstrap_pca(
+    Xknn: np.ndarray,
+    labels: Sequence,
+    n_components: int = 2,
+    n_boot: int = 200,
+    n_perm: int = 1000,
+    confidence: float = 0.95,
+    pcx: int = 1,
+    pcy: int = 2,
+    n_jobs: Optional[int] = None,
+    random_state: int = 0,
+    sample_ids: Optional[Sequence] = None,
+) -> Dict[str, Any]:
+    """
+    Bootstrap PCA stability and permutation test of group separation.
+
+    Bootstrap: each replicate refits the PCA on samples drawn with
+    replacement, aligns its loadings to the reference fit by orthogonal
+    Procrustes rotation and projects every original sample, giving a score
+    cloud per sample and per group centroid. Replicates run in chunks on a
+    process pool with ``Xknn`` in shared memory (see
+    :func:`src.parallel.map_shared`).
+
+    Permutation: the PCA itself does not use the labels, so label
+    permutations leave the fit unchanged; the null distribution of the
+    separation statistic (silhouette of the labelled groups in the space of
+    the first ``n_components`` scores) is computed on the reference scores
+    for all permutations at once (:func:`silhouette_from_distances`).
+
+    Parameters
+    ----------
+    Xknn : np.ndarray
+        Preprocessed samples × features matrix.
+    labels : Sequence
+        Group label per sample; samples with missing labels are excluded
+        from the separation statistic.
+    n_components : int
+        Components fitted, aligned and used for the separation statistic.
+    n_boot : int
+        Bootstrap replicates.
+    n_perm : int
+        Label permutations.
+    confidence : float
+        Coverage of the ellipses and of the separation interval.
+    pcx, pcy : int
+        Component pair (1-based) of the returned ellipses.
+    n_jobs : int, optional
+        Worker processes; defaults to the number of CPUs (1 runs serially).
+    random_state : int
+        Seed for resampling and permutations.
+    sample_ids : Sequence, optional
+        Sample identifiers for the per-sample ellipse table.
+
+    Returns
+    -------
+    Dict[str, Any]
+        - 'reference': PCAModel fitted on all samples.
+        - 'boot_scores': n_boot × n_samples × n_components aligned scores (float32).
+        - 'sample_ellipses' / 'group_ellipses': DataFrames of ellipse
+          parameters (see :func:`confidence_ellipse`) for pcx/pcy; group
+          ellipses describe the bootstrap distribution of each centroid.
+        - 'separation': observed silhouette; 'separation_ci': bootstrap
+          percentile interval; 'perm_pvalue': (1 + #null ≥ observed) / (1 + n_perm);
+          'perm_null': null silhouettes.
+        - 'throughput': fits, wall seconds, workers and fits per second per core.
+    """
+    X = np.ascontiguousarray(Xknn, dtype=np.float64)
+    n = X.shape[0]
+    k = max(n_components, pcx, pcy)
+    labels = pd.Series(list(labels))
+    labelled = labels.notna().to_numpy()
+    codes_all, groups = pd.factorize(labels)
+    if len(groups) < 2:
+        raise ValueError("Need at least two groups to assess separation.")
+
+    reference = PCAModel(n_components=k).fit(X)
+    codes = codes_all[labelled]
+    if len(codes) <= len(groups):
+        raise ValueError("Need more labelled samples than groups to assess separation.")
+    D_ref = _pairwise(reference.scores_[labelled, :n_components])
+    observed = float(silhouette_from_distances(D_ref, codes))
+
+    # --- Bootstrap refits on the process pool ---
+    workers = min(n_jobs or os.cpu_count() or 1, max(n_boot, 1))
+    # One seed per replicate: results do not depend on the number of workers
+    seeds = [int(s) for s in np.random.SeedSequence(random_state).generate_state(n_boot)]
+    per_task = max(1, -(-n_boot // (4 * workers)))  # ~4 tasks per worker
+    tasks = [seeds[i : i + per_task] for i in range(0, n_boot, per_task)]
+
+    context = {
+        "components": reference.components_,
+        "solver": reference.solver_,
+        "labelled": labelled,
+        "codes": codes,
+        "n_sep": n_components,
+    }
+    wall = time.perf_counter()
+    results = map_shared(_bootstrap_task, tasks, X, context=context, n_jobs=workers) if n_boot else []
+    wall = time.perf_counter() - wall
+    boot_scores = (
+        np.concatenate([r["scores"] for r in results]) if results else np.empty((0, n, k), np.float32)
+    )
+    boot_sep = np.concatenate([r["separation"] for r in results]) if results else np.empty(0)
+    busy = sum(r["seconds"] for r in results)
+
+    # --- Permutation null on the reference scores ---
+    rng = np.random.default_rng(random_state)
+    null = np.empty(n_perm)
+    for start in range(0, n_perm, 200):
+        m = min(200, n_perm - start)
+        perms = np.stack([rng.permutation(codes) for _ in range(m)])
+        null[start : start + m] = silhouette_from_distances(D_ref, perms)
+    p_value = float((1 + np.sum(null >= observed)) / (1 + n_perm))
+
+    # --- Ellipses for the requested component pair ---
+    cols = [pcx - 1, pcy - 1]
+    ids = np.asarray(sample_ids if sample_ids is not None else np.arange(n)).astype(str)
+    sample_ellipses = pd.DataFrame(
+        [confidence_ellipse(boot_scores[:, i, cols], confidence) for i in range(n)]
+        if len(boot_scores)
+        else [],
+    )
+    if len(sample_ellipses):
+        sample_ellipses.insert(0, "SampleID", ids)
+        sample_ellipses.insert(1, "Class", labels.astype(str).to_numpy())
+    group_rows = []
+    for code, name in enumerate(groups):
+        members = codes_all == code
+        centroids = boot_scores[:, members][:, :, cols].mean(axis=1) if len(boot_scores) else np.empty((0, 2))
+        if len(centroids):
+            group_rows.append({"Class": str(name), "n": int(members.sum()), **confidence_ellipse(centroids, confidence)})
+    group_ellipses = pd.DataFrame(group_rows)
+
+    alpha = (1 - confidence) / 2
+    ci = (
+        tuple(float(v) for v in np.quantile(boot_sep, [alpha, 1 - alpha])) if len(boot_sep) else (np.nan, np.nan)
+    )
+    throughput = {
+        "fits": int(len(boot_scores)),
+        "wall_seconds": wall,
+        "workers": workers,
+        "fits_per_second_per_core": len(boot_scores) / busy if busy else np.nan,
+    }
+    logger.info(
+        f"Bootstrap: {throughput['fits']} PCA fits in {wall:.1f}s on {workers} workers "
+        f"({throughput['fits_per_second_per_core']:.1f} fits/s/core); "
+        f"separation={observed:.3f}, permutation p={p_value:.4f}"
+    )
+    return {
+        "reference": reference,
+        "boot_scores": boot_scores,
+        "sample_ellipses": sample_ellipses,
+        "group_ellipses": group_ellipses,
+        "separation": observed,
+        "separation_ci": ci,
+        "perm_pvalue": p_value,
+        "perm_null": null,
+        "throughput": throughput,
+    }
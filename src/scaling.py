@@ -0,0 +1,235 @@
+"""
+NaN-aware column scaling (auto, pareto, vast, level, range) with fitted parameters.
+"""
+import logging
+import warnings
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SCALE_METHODS = ("auto", "pareto", "vast", "level", "range")
+
+
+class Scaler:
+    """
+    Column-wise scaler equivalent to ``cimcb_lite.utils.scale``.
+
+    ``fit`` stores per-compound statistics (mean, standard deviation, range)
+    so new samples can be transformed with the cohort's parameters without
+    refitting. Every method reduces to ``z = (x - center_) * factor_``:
+
+    - auto:   factor = 1 / sigma
+    - pareto: factor = 1 / sqrt(sigma)
+    - vast:   factor = mu / sigma**2
+    - level:  factor = 1 / mu
+    - range:  factor = 1 / (max - min)
+
+    Statistics ignore NaNs; a zero standard deviation is replaced by 1, as in
+    cimcb_lite. Columns are processed in blocks of ``block_size`` to bound
+    temporaries, and ``transform(copy=False)`` works in place on float32 or
+    float64 arrays.
+
+    Parameters
+    ----------
+    method : str
+        One of 'auto', 'pareto', 'vast', 'level', 'range'.
+    ddof : int
+        Delta degrees of freedom for the standard deviation.
+    block_size : int
+        Number of columns processed per block.
+    """
+
+    def __init__(self, method: str = "auto", ddof: int = 1, block_size: int = 1024):
+        if method not in SCALE_METHODS:
+            raise ValueError(f"Method has to be one of {SCALE_METHODS}, got '{method}'.")
+        self.method = method
+        self.ddof = ddof
+        self.block_size = block_size
+        self.mean_: Optional[np.ndarray] = None
+        self.std_: Optional[np.ndarray] = None
+        self.range_: Optional[np.ndarray] = None
+        self.factor_: Optional[np.ndarray] = None
+
+    @property
+    def center_(self) -> Optional[np.ndarray]:
+        """Per-column centering value (the mean for every method)."""
+        return self.mean_
+
+    def _blocks(self, n_cols: int):
+        step = max(int(self.block_size), 1)
+        for start in range(0, n_cols, step):
+            yield slice(start, min(start + step, n_cols))
+
+    def fit(self, X: np.ndarray) -> "Scaler":
+        """
+        Compute per-column statistics (NaNs ignored).
+
+        Parameters
+        ----------
+        X : np.ndarray
+            Samples × features matrix.
+
+        Returns
+        -------
+        Scaler
+            The fitted scaler.
+        """
+        X = np.asarray(X)
+        if X.ndim == 1:
+            X = X[:, None]
+        n_cols = X.shape[1]
+        mean = np.empty(n_cols)
+        std = np.empty(n_cols)
+        rng = np.empty(n_cols) if self.method == "range" else None
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN columns
+            for sl in self._blocks(n_cols):
+                block = X[:, sl]
+                mean[sl] = np.nanmean(block, axis=0, dtype=np.float64)
+                std[sl] = np.nanstd(block, axis=0, ddof=self.ddof, dtype=np.float64)
+                if rng is not None:
+                    rng[sl] = np.nanmax(block, axis=0) - np.nanmin(block, axis=0)
+
+        self.mean_ = mean
+        self.std_ = np.where(std == 0, 1.0, std)
+        self.range_ = rng
+        self.factor_ = self._factor()
+        return self
+
+    def _factor(self) -> np.ndarray:
+        mu, sigma = self.mean_, self.std_
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if self.method == "auto":
+                return 1.0 / sigma
+            if self.method == "pareto":
+                return 1.0 / np.sqrt(sigma)
+            if self.method == "vast":
+                return mu / sigma**2
+            if self.method == "level":
+                return 1.0 / mu
+            return 1.0 / self.range_
+
+    def transform(self, X: np.ndarray, copy: bool = True) -> np.ndarray:
+        """
+        Scale X with the fitted parameters.
+
+        Parameters
+        ----------
+        X : np.ndarray
+            Samples × features matrix with the fitted number of columns.
+        copy : bool
+            If False and X is a float32/float64 array, scale in place.
+
+        Returns
+        -------
+        np.ndarray
+            Scaled matrix (X itself when scaled in place).
+        """
+        if self.factor_ is None:
+            raise ValueError("Scaler is not fitted; call fit() first.")
+        X = np.asarray(X)
+        squeeze = X.ndim == 1
+        if squeeze:
+            X = X[:, None]
+        if X.shape[1] != len(self.factor_):
+            raise ValueError(
+                f"X has {X.shape[1]} columns, scaler was fitted on {len(self.factor_)}."
+            )
+
+        inplace = not copy and X.dtype in (np.float32, np.float64) and X.flags.writeable
+        out = X if inplace else np.array(X, dtype=np.result_type(X.dtype, np.float32))
+        center = self.mean_.astype(out.dtype, copy=False)
+        factor = self.factor_.astype(out.dtype, copy=False)
+
+        with np.errstate(invalid="ignore"):
+            for sl in self._blocks(out.shape[1]):
+                block = out[:, sl]
+                block -= center[sl]
+                block *= factor[sl]
+        return out[:, 0] if squeeze else out
+
+    def fit_transform(self, X: np.ndarray, copy: bool = True) -> np.ndarray:
+        """
+        Fit on X and scale it.
+
+        Parameters
+        ----------
+        X : np.ndarray
+            Samples × features matrix.
+        copy : bool
+            If False, scale float arrays in place (saves one full-matrix copy).
+
+        Returns
+        -------
+        np.ndarray
+            Scaled matrix.
+        """
+        return self.fit(X).transform(X, copy=copy)
+
+    def get_params(self) -> Dict[str, Any]:
+        """
+        Export the fitted state for persistence.
+
+        Returns
+        -------
+        Dict[str, Any]
+            'method', 'ddof' and the fitted arrays ('mean', 'std', 'range').
+        """
+        return {
+            "method": self.method,
+            "ddof": self.ddof,
+            "mean": self.mean_,
+            "std": self.std_,
+            "range": self.range_,
+        }
+
+    @classmethod
+    def from_params(cls, params: Dict[str, Any]) -> "Scaler":
+        """
+        Rebuild a fitted scaler from :meth:`get_params` output.
+
+        Parameters
+        ----------
+        params : Dict[str, Any]
+            Exported state.
+
+        Returns
+        -------
+        Scaler
+            Fitted scaler.
+        """
+        scaler = cls(method=str(params["method"]), ddof=int(params["ddof"]))
+        scaler.mean_ = np.asarray(params["mean"], dtype=np.float64)
+        scaler.std_ = np.asarray(params["std"], dtype=np.float64)
+        rng = params.get("range")
+        scaler.range_ = None if rng is None else np.asarray(rng, dtype=np.float64)
+        scaler.factor_ = scaler._factor()
+        return scaler
+
+
+def scale(
+    X: np.ndarray, method: str = "auto", copy: bool = True, block_size: int = 1024
+) -> np.ndarray:
+    """
+    Scale X column-wise (drop-in for ``cimcb_lite.utils.scale``).
+
+    Parameters
+    ----------
+    X : np.ndarray
+        Samples × features matrix (may contain NaNs).
+    method : str
+        One of 'auto', 'pareto', 'vast', 'level', 'range'.
+    copy : bool
+        If False, scale float arrays in place.
+    block_size : int
+        Number of columns processed per block.
+
+    Returns
+    -------
+    np.ndarray
+        Scaled matrix.
+    """
+    return Scaler(method=method, block_size=block_size).fit_transform(X, copy=copy)
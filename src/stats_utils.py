@@ -1,86 +1,442 @@
-"""
-Statistical analysis utilities for metabolomics.
-"""
-import pandas as pd
-import logging
-from typing import Tuple
-import cimcb_lite as cb
-
-logger = logging.getLogger(__name__)
-
-
-def univariate_2class_wrapper(
-    hoja2: pd.DataFrame,
-    hoja3: pd.DataFrame,
-    group_col: str = "Class",
-    posclass: str = "Diabetes",
-    parametric: bool = True,
-    pvalue_threshold: float = 0.05,
-) -> Tuple[pd.DataFrame, pd.DataFrame]:
-    """
-    Perform univariate 2-class statistical tests using cimcb_lite.
-
-    Parameters
-    ----------
-    hoja2 : pd.DataFrame
-        Feature matrix with 'Class' column and compound columns.
-    hoja3 : pd.DataFrame
-        Compound dictionary (Name, Label, Idx).
-    group_col : str
-        Column in hoja2 defining groups (e.g., 'Class').
-    posclass : str
-        Positive class for comparison ('Diabetes' or 'Healthy').
-    parametric : bool
-        Whether to use parametric tests.
-    pvalue_threshold : float
-        P-value threshold for filtering significant results.
-
-    Returns
-    -------
-    Tuple[pd.DataFrame, pd.DataFrame]
-        (full_stats_table, filtered_table)
-        - full_stats_table: all statistical results.
-        - filtered_table: filtered for p ≤ threshold and Sign=1.
-    """
-    logger.info(f"Running univariate 2-class test: posclass={posclass}...")
-
-    # Filter hoja2 to include only relevant classes
-    if posclass == "Diabetes":
-        classes = ["diabetic", "Healthy", "Diabetes"]
-    elif posclass == "Healthy":
-        classes = ["Healthy", "diabetic", "Diabetes"]
-    else:
-        classes = [posclass]
-
-    stat_hoja2 = hoja2[hoja2[group_col].isin(classes)].copy()
-
-    # Normalize 'diabetic' → 'Diabetes'
-    stat_hoja2[group_col] = stat_hoja2[group_col].replace(
-        {"diabetic": "Diabetes"}
-    )
-
-    if stat_hoja2.empty:
-        logger.warning(f"No samples found for classes {classes}.")
-        return pd.DataFrame(), pd.DataFrame()
-
-    try:
-        stats_table = cb.utils.univariate_2class(
-            stat_hoja2, hoja3, group=group_col, posclass=posclass, parametric=parametric
-        )
-    except Exception as e:
-        logger.error(f"Univariate 2-class test failed: {e}")
-        raise
-
-    # Sort by TTestPvalue
-    stats_table = stats_table.sort_values(by="TTestPvalue", ascending=True)
-
-    # Filter: p ≤ threshold and Sign=1 (significantly higher in posclass)
-    filtered = stats_table[
-        (stats_table["TTestPvalue"] <= pvalue_threshold) & (stats_table["Sign"] == 1)
-    ].copy()
-
-    logger.info(
-        f"Found {len(filtered)} significant metabolites (p≤{pvalue_threshold}, Sign=1)."
-    )
-
-    return stats_table, filtered
+"""
+Statistical analysis utilities for metabolomics.
+"""
+import numpy as np
+import pandas as pd
+import logging
+import time
+import warnings
+from typing import Optional, Sequence, Tuple
+from scipy import stats
+import cimcb_lite as cb
+
+logger = logging.getLogger(__name__)
+
+
+def stats_dictionary(data_dict: pd.DataFrame, peaklist: Optional[Sequence] = None) -> pd.DataFrame:
+    """
+    Build the hoja3 compound table expected by cimcb_lite from the data dictionary.
+
+    Parameters
+    ----------
+    data_dict : pd.DataFrame
+        Compound dictionary (compound_id, BIOCHEMICAL, ...).
+    peaklist : Sequence, optional
+        Compounds to keep (e.g. those that passed the prefilter); all when None.
+
+    Returns
+    -------
+    pd.DataFrame
+        Dictionary with 'Idx' (1-based), 'Name' (compound_id) and 'Label'
+        (BIOCHEMICAL) columns.
+    """
+    hoja3 = data_dict.copy()
+    hoja3["Idx"] = range(1, len(hoja3) + 1)
+    hoja3 = hoja3.rename(columns={"compound_id": "Name", "BIOCHEMICAL": "Label"}, errors="ignore")
+    if peaklist is not None:
+        kept = {str(p) for p in peaklist}
+        hoja3 = hoja3[hoja3["Name"].astype(str).isin(kept)].reset_index(drop=True)
+    return hoja3
+
+
+def bh_qvalues(pvalues: np.ndarray) -> np.ndarray:
+    """
+    Benjamini-Hochberg q-values (same as statsmodels ``multipletests(method="fdr_bh")``).
+
+    Parameters
+    ----------
+    pvalues : np.ndarray
+        1-D array of p-values; NaN entries are left out of the correction.
+
+    Returns
+    -------
+    np.ndarray
+        q-values, NaN where the p-value is NaN.
+    """
+    p = np.asarray(pvalues, dtype=float)
+    q = np.full(p.shape, np.nan)
+    valid = ~np.isnan(p)
+    m = int(valid.sum())
+    if m == 0:
+        return q
+    order = np.argsort(p[valid])
+    scaled = p[valid][order] * m / np.arange(1, m + 1)
+    scaled = np.minimum.accumulate(scaled[::-1])[::-1]
+    adjusted = np.empty(m)
+    adjusted[order] = np.minimum(scaled, 1.0)
+    q[valid] = adjusted
+    return q
+
+
+def _column_ranks(X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Average ranks per column (NaNs ranked last) and the tie term sum(t³ - t) of the finite values.
+
+    Parameters
+    ----------
+    X : np.ndarray
+        2-D array (n_samples, n_features).
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        (ranks, tie_term): ranks with the shape of X, tie_term per column.
+    """
+    n = X.shape[0]
+    order = np.argsort(np.where(np.isnan(X), np.inf, X), axis=0, kind="mergesort")
+    S = np.take_along_axis(X, order, axis=0)
+    finite = ~np.isnan(S)
+    pos = np.arange(n)[:, None]
+
+    starts_run = np.ones(S.shape, dtype=bool)
+    starts_run[1:] = (S[1:] != S[:-1]) | ~finite[1:]
+    ends_run = np.ones(S.shape, dtype=bool)
+    ends_run[:-1] = (S[:-1] != S[1:]) | ~finite[:-1]
+    start = np.maximum.accumulate(np.where(starts_run, pos, 0), axis=0)
+    end = np.minimum.accumulate(np.where(ends_run, pos, n)[::-1], axis=0)[::-1]
+
+    size = (end - start + 1).astype(float)
+    tie_term = np.where(finite, size**2 - 1, 0.0).sum(axis=0)
+    ranks = np.empty(S.shape)
+    np.put_along_axis(ranks, order, (start + end) / 2.0 + 1.0, axis=0)
+    return ranks, tie_term
+
+
+def _mannwhitney_2class(x0: np.ndarray, x1: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Two-sided Mann-Whitney U test of every column of x0 against x1, NaNs omitted.
+
+    Uses the tie-corrected normal approximation with continuity correction, as
+    ``scipy.stats.mannwhitneyu`` does; the few columns where SciPy would pick the
+    exact distribution (a group with ≤ 8 values and no ties) are delegated to it.
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        (U statistic of x0, p-value) per column.
+    """
+    ranks, tie_term = _column_ranks(np.vstack([x0, x1]))
+    valid0 = ~np.isnan(x0)
+    n0 = valid0.sum(axis=0).astype(float)
+    n1 = (~np.isnan(x1)).sum(axis=0).astype(float)
+    n = n0 + n1
+
+    U = np.where(valid0, ranks[: len(x0)], 0.0).sum(axis=0) - n0 * (n0 + 1) / 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sigma = np.sqrt(n0 * n1 / 12 * ((n + 1) - tie_term / (n * (n - 1))))
+        z = (np.maximum(U, n0 * n1 - U) - n0 * n1 / 2 - 0.5) / sigma
+    p = np.clip(2 * stats.norm.sf(z), 0, 1)
+
+    exact = ((n0 <= 8) | (n1 <= 8)) & (tie_term == 0) & (n0 > 0) & (n1 > 0)
+    for j in np.flatnonzero(exact):
+        a, b = x0[:, j], x1[:, j]
+        p[j] = stats.mannwhitneyu(a[~np.isnan(a)], b[~np.isnan(b)], alternative="two-sided").pvalue
+    return U, p
+
+
+def _ttest_2class(
+    x0: np.ndarray, x1: np.ndarray, equal_var: bool = True
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Student (or Welch) t-test of every column of x0 against x1, NaNs omitted.
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        (t statistic, two-sided p-value) per column.
+    """
+    n0 = (~np.isnan(x0)).sum(axis=0)
+    n1 = (~np.isnan(x1)).sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        diff = np.nanmean(x0, axis=0) - np.nanmean(x1, axis=0)
+        v0 = np.nanvar(x0, axis=0, ddof=1)
+        v1 = np.nanvar(x1, axis=0, ddof=1)
+        if equal_var:
+            df = n0 + n1 - 2.0
+            pooled = ((n0 - 1) * v0 + (n1 - 1) * v1) / df
+            se = np.sqrt(pooled * (1.0 / n0 + 1.0 / n1))
+        else:
+            a, b = v0 / n0, v1 / n1
+            se = np.sqrt(a + b)
+            df = (a + b) ** 2 / (a**2 / (n0 - 1) + b**2 / (n1 - 1))
+        t = diff / se
+        p = 2 * stats.t.sf(np.abs(t), df)
+    return t, p
+
+
+def _levene_2class(x0: np.ndarray, x1: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Median-centered Levene (Brown-Forsythe) test per column, NaNs omitted.
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        (W statistic, p-value) per column.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        z0 = np.abs(x0 - np.nanmedian(x0, axis=0))
+        z1 = np.abs(x1 - np.nanmedian(x1, axis=0))
+        n0 = (~np.isnan(z0)).sum(axis=0)
+        n1 = (~np.isnan(z1)).sum(axis=0)
+        n = n0 + n1
+        m0 = np.nanmean(z0, axis=0)
+        m1 = np.nanmean(z1, axis=0)
+        grand = (np.nansum(z0, axis=0) + np.nansum(z1, axis=0)) / n
+        between = n0 * (m0 - grand) ** 2 + n1 * (m1 - grand) ** 2
+        within = np.nansum((z0 - m0) ** 2, axis=0) + np.nansum((z1 - m1) ** 2, axis=0)
+        W = (n - 2) * between / within
+        p = stats.f.sf(W, 1, n - 2)
+    return W, p
+
+
+def _shapiro_columns(X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Shapiro-Wilk test per column on the non-missing values (NaN below 3 values).
+
+    SciPy has no array form of this test, so this stays a loop over the
+    compiled per-sample routine.
+    """
+    W = np.full(X.shape[1], np.nan)
+    p = np.full(X.shape[1], np.nan)
+    for j in range(X.shape[1]):
+        col = X[:, j]
+        col = col[~np.isnan(col)]
+        if len(col) >= 3:
+            W[j], p[j] = stats.shapiro(col)
+    return W, p
+
+
+def _sorted_nanmedian(a: np.ndarray, axis: int = 0) -> np.ndarray:
+    """
+    NaN-ignoring median via one sort (NaNs sort last).
+
+    Same values as ``np.nanmedian(a, axis=axis)``, several times faster on the
+    stacked bootstrap resamples.
+    """
+    s = np.sort(a, axis=axis)
+    k = (~np.isnan(s)).sum(axis=axis, keepdims=True)
+    lo = np.take_along_axis(s, np.maximum((k - 1) // 2, 0), axis=axis)
+    hi = np.take_along_axis(s, np.minimum(k // 2, a.shape[axis] - 1), axis=axis)
+    return np.squeeze(np.where(k > 0, (lo + hi) / 2, np.nan), axis=axis)
+
+
+def _bootstrap_median_ci(
+    x: np.ndarray, seed: Optional[int], n_boot: int = 100, chunk_bytes: int = 64_000_000
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    95% CI of the column medians from ``n_boot`` row resamples.
+
+    The resampling indices follow ``np.random.seed(seed)`` + ``randint`` as in
+    ``cimcb_lite``, so a given seed reproduces its intervals; resamples are
+    evaluated in chunks of at most ``chunk_bytes``.
+    """
+    n = len(x)
+    idx = np.random.RandomState(seed).randint(0, n, size=(n_boot, n))
+    step = max(1, int(chunk_bytes // max(x.nbytes, 1)))
+    median = _sorted_nanmedian if np.isnan(x).any() else np.median
+    medians = np.empty((n_boot, x.shape[1]))
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        for start in range(0, n_boot, step):
+            medians[start:start + step] = median(x[idx[start:start + step]], axis=1)
+        low = np.round(np.percentile(medians, 2.5, axis=0), 2)
+        high = np.round(np.percentile(medians, 97.5, axis=0), 2)
+    return low, high
+
+
+def univariate_2class(
+    data_table: pd.DataFrame,
+    peak_table: pd.DataFrame,
+    group: str,
+    posclass,
+    parametric: bool = True,
+    seed: Optional[int] = None,
+    equal_var: bool = True,
+) -> pd.DataFrame:
+    """
+    Vectorized drop-in for ``cimcb_lite.utils.univariate_2class``.
+
+    Every statistic is computed for all compounds at once on NumPy arrays
+    (column-wise ranks for Mann-Whitney, masked moments for the t-test and
+    Levene); only Shapiro-Wilk is evaluated per compound. The returned table
+    has the same columns, order and index as the cimcb_lite one.
+
+    Parameters
+    ----------
+    data_table : pd.DataFrame
+        Samples with the group column and one column per compound.
+    peak_table : pd.DataFrame
+        Compound table with 'Idx', 'Name' and 'Label' columns.
+    group : str
+        Column of data_table holding the two classes.
+    posclass : str
+        Positive class (group 1); the other class is group 0.
+    parametric : bool
+        Mean 95% CI + t-test when True, median 95% CI + Mann-Whitney U otherwise.
+    seed : int, optional
+        Seed of the bootstrap for the median 95% CI (non-parametric only).
+    equal_var : bool
+        Student t-test (default, as cimcb_lite) when True, Welch t-test otherwise.
+
+    Returns
+    -------
+    pd.DataFrame
+        Statistics table indexed from 1. Unlike statsmodels, bhQvalue ignores
+        compounds whose p-value is NaN instead of turning every q-value into NaN.
+    """
+    missing_cols = {"Idx", "Name", "Label"} - set(peak_table.columns)
+    if missing_cols:
+        raise ValueError(f"Peak table is missing columns: {sorted(missing_cols)}")
+    if group not in data_table:
+        raise ValueError(f"Column '{group}' does not exist in data table")
+    classes = data_table[group].unique()
+    if posclass not in classes:
+        raise ValueError(f"Positive class was not found in '{group}' column.")
+    if len(classes) != 2:
+        raise ValueError(f"Column '{group}' should have exactly 2 groups")
+    names = peak_table["Name"]
+    absent = [n for n in names if n not in data_table.columns]
+    if absent:
+        raise ValueError(f"{len(absent)} compounds of the peak table are not in the data table: {absent[:5]}")
+
+    X = data_table[list(names)].to_numpy(dtype=float)
+    is_pos = (data_table[group] == posclass).to_numpy()
+    x0, x1 = X[~is_pos], X[is_pos]
+
+    table = pd.DataFrame(
+        {
+            "Idx": peak_table["Idx"].to_numpy(),
+            "Name": names.to_numpy(),
+            "Label": peak_table["Label"].to_numpy(),
+        }
+    )
+    with np.errstate(divide="ignore", invalid="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        med0 = np.nanmedian(x0, axis=0)
+        med1 = np.nanmedian(x1, axis=0)
+        fold = med1 / med0
+        sign = np.where(fold > 1, 1, 0)
+
+        if parametric:
+            for label, xg in (("Grp0", x0), ("Grp1", x1)):
+                mean = np.nanmean(xg, axis=0)
+                half = 1.96 * np.nanstd(xg, ddof=1, axis=0) / np.sqrt((~np.isnan(xg)).sum(axis=0))
+                table[f"{label}_Mean"] = mean
+                table[f"{label}_Mean-95CI"] = list(zip(np.round(mean - half, 2), np.round(mean + half, 2)))
+            table["Sign"] = sign
+            t, p = _ttest_2class(x0, x1, equal_var=equal_var)
+            table["TTestStat"] = t
+            table["TTestPvalue"] = p
+        else:
+            for label, xg, med in (("Grp0", x0, med0), ("Grp1", x1, med1)):
+                table[f"{label}_Median"] = med
+                table[f"{label}_Median-95CI"] = list(zip(*_bootstrap_median_ci(xg, seed)))
+            table["MedianFC"] = fold
+            table["Sign"] = sign
+            U, p = _mannwhitney_2class(x0, x1)
+            table["MannWhitneyU"] = U
+            table["MannWhitneyPvalue"] = p
+        table["bhQvalue"] = bh_qvalues(p)
+
+    missing = np.isnan(X)
+    table["TotalMissing"] = missing.sum(axis=0)
+    table["PercTotalMissing"] = np.round(missing.mean(axis=0) * 100, 3)
+    table["Grp0_Missing"] = np.round(missing[~is_pos].mean(axis=0) * 100, 3)
+    table["Grp1_Missing"] = np.round(missing[is_pos].mean(axis=0) * 100, 3)
+    table["ShapiroW"], table["ShapiroPvalue"] = _shapiro_columns(X)
+    table["LeveneW"], table["LevenePvalue"] = _levene_2class(x0, x1)
+
+    table.index = np.arange(1, len(table) + 1)
+    return table
+
+
+def pvalue_column(parametric: bool = True) -> str:
+    """Name of the p-value column of the statistics table ('TTestPvalue' or 'MannWhitneyPvalue')."""
+    return "TTestPvalue" if parametric else "MannWhitneyPvalue"
+
+
+def univariate_2class_wrapper(
+    hoja2: pd.DataFrame,
+    hoja3: pd.DataFrame,
+    group_col: str = "Class",
+    posclass: str = "Diabetes",
+    parametric: bool = True,
+    pvalue_threshold: float = 0.05,
+    engine: str = "native",
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Perform univariate 2-class statistical tests.
+
+    Parameters
+    ----------
+    hoja2 : pd.DataFrame
+        Feature matrix with 'Class' column and compound columns.
+    hoja3 : pd.DataFrame
+        Compound dictionary (Name, Label, Idx).
+    group_col : str
+        Column in hoja2 defining groups (e.g., 'Class').
+    posclass : str
+        Positive class for comparison ('Diabetes' or 'Healthy').
+    parametric : bool
+        Whether to use parametric tests.
+    pvalue_threshold : float
+        P-value threshold for filtering significant results.
+    engine : str
+        'native' (vectorized ``univariate_2class``) or 'cimcb' (reference
+        ``cimcb_lite.utils.univariate_2class``, one loop per compound).
+
+    Returns
+    -------
+    Tuple[pd.DataFrame, pd.DataFrame]
+        (full_stats_table, filtered_table)
+        - full_stats_table: all statistical results.
+        - filtered_table: filtered for p ≤ threshold and Sign=1.
+    """
+    if engine not in ("native", "cimcb"):
+        raise ValueError(f"Unknown engine '{engine}'. Valid: native, cimcb.")
+    logger.info(f"Running univariate 2-class test: posclass={posclass}, engine={engine}...")
+
+    # Filter hoja2 to include only relevant classes
+    if posclass == "Diabetes":
+        classes = ["diabetic", "Healthy", "Diabetes"]
+    elif posclass == "Healthy":
+        classes = ["Healthy", "diabetic", "Diabetes"]
+    else:
+        classes = [posclass]
+
+    stat_hoja2 = hoja2[hoja2[group_col].isin(classes)].copy()
+
+    # Normalize 'diabetic' → 'Diabetes'
+    stat_hoja2[group_col] = stat_hoja2[group_col].replace(
+        {"diabetic": "Diabetes"}
+    )
+
+    if stat_hoja2.empty:
+        logger.warning(f"No samples found for classes {classes}.")
+        return pd.DataFrame(), pd.DataFrame()
+
+    test = univariate_2class if engine == "native" else cb.utils.univariate_2class
+    start = time.perf_counter()
+    try:
+        stats_table = test(stat_hoja2, hoja3, group_col, posclass, parametric=parametric)
+    except Exception as e:
+        logger.error(f"Univariate 2-class test failed: {e}")
+        raise
+    logger.info(f"{len(stats_table)} compounds tested in {time.perf_counter() - start:.2f}s.")
+
+    # Sort by the test p-value (t-test or Mann-Whitney)
+    pvalue_col = pvalue_column(parametric)
+    stats_table = stats_table.sort_values(by=pvalue_col, ascending=True)
+
+    # Filter: p ≤ threshold and Sign=1 (significantly higher in posclass)
+    filtered = stats_table[
+        (stats_table[pvalue_col] <= pvalue_threshold) & (stats_table["Sign"] == 1)
+    ].copy()
+
+    logger.info(
+        f"Found {len(filtered)} significant metabolites (p≤{pvalue_threshold}, Sign=1)."
+    )
+
+    return stats_table, filtered
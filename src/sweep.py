@@ -0,0 +1,207 @@
+"""
+Preprocessing parameter sweep: log10/scale/KNN + PCA over a grid, in parallel.
+
+Usage:
+    python -m src.sweep [--scale auto pareto] [--knn-k 3 5] [--log-offset 0.5 1]
+                        [--components 2] [--jobs 4] [--output sweep.csv]
+"""
+import argparse
+import itertools
+import logging
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from src.config import get_cache_settings, get_config, get_paths, get_prefilter_settings
+from src.io_utils import load_excel_cached
+from src.parallel import map_shared, worker_array, worker_context
+from src.pca_utils import pca_summary
+from src.prefilter import prefilter_from_settings
+from src.preprocess import Preprocessor, matched_feature_block
+from src.scaling import SCALE_METHODS
+
+logger = logging.getLogger(__name__)
+
+
+def parameter_grid(
+    scale_methods: Sequence[str] = SCALE_METHODS,
+    knn_ks: Sequence[int] = (3,),
+    log_offsets: Sequence[float] = (0.5,),
+) -> List[Dict[str, Any]]:
+    """
+    Cartesian product of preprocessing parameters.
+
+    Parameters
+    ----------
+    scale_methods : Sequence[str]
+        Scaling methods ('auto', 'pareto', 'vast', 'level', 'range').
+    knn_ks : Sequence[int]
+        KNN neighbour counts.
+    log_offsets : Sequence[float]
+        Log offset multipliers.
+
+    Returns
+    -------
+    List[Dict[str, Any]]
+        One dict per configuration with 'scale_method', 'knn_k', 'log_offset'.
+
+    Raises
+    ------
+    ValueError
+        If a scaling method is not supported.
+    """
+    invalid = [m for m in scale_methods if m not in SCALE_METHODS]
+    if invalid:
+        raise ValueError(f"Unsupported scale methods {invalid}; valid: {SCALE_METHODS}")
+    return [
+        {"scale_method": m, "knn_k": int(k), "log_offset": float(o)}
+        for m, k, o in itertools.product(scale_methods, knn_ks, log_offsets)
+    ]
+
+
+def _run_config(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Preprocess the shared raw matrix with one configuration and summarize its PCA."""
+    ctx = worker_context()
+    start = time.perf_counter()
+    Xknn = Preprocessor(**params).fit_transform(worker_array())
+    summary = pca_summary(Xknn, ctx["labels"], n_components=ctx["n_components"])
+    return {**params, **summary, "seconds": time.perf_counter() - start}
+
+
+def run_sweep(
+    data_matrix: pd.DataFrame,
+    data_dict: pd.DataFrame,
+    sample_metadata: pd.DataFrame,
+    grid: Optional[List[Dict[str, Any]]] = None,
+    n_components: int = 2,
+    prefilter: Optional[Dict[str, Any]] = None,
+    n_jobs: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    Run the ``build_feature_matrix`` preprocessing plus PCA for every configuration.
+
+    The parameter-independent steps (typed block, compound matching,
+    optional prefilter) run once; the raw matched matrix is then placed in
+    shared memory and each configuration runs in a worker process (see
+    :func:`src.parallel.map_shared`), so the matrix is not pickled per task.
+
+    Parameters
+    ----------
+    data_matrix : pd.DataFrame
+        Raw metabolite matrix (samples as columns, compounds as rows).
+    data_dict : pd.DataFrame
+        Compound dictionary.
+    sample_metadata : pd.DataFrame
+        Sample metadata (sample_id, Health, ...).
+    grid : List[Dict[str, Any]], optional
+        Configurations from :func:`parameter_grid`; defaults to every
+        scaling method with knn_k=3 and log_offset=0.5.
+    n_components : int
+        Principal components used for explained variance and separation.
+    prefilter : Dict[str, Any], optional
+        ``preprocessing.prefilter`` settings applied before the sweep.
+    n_jobs : int, optional
+        Worker processes; defaults to the number of CPUs (1 runs serially).
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per configuration: 'scale_method', 'knn_k', 'log_offset',
+        'pc1_var', ..., 'cum_var', 'silhouette' (group separation by Class
+        in PCA score space) and 'seconds'. ``attrs['n_compounds']`` and
+        ``attrs['n_samples']`` describe the input.
+    """
+    grid = grid if grid is not None else parameter_grid()
+    hoja2, X, presentes = matched_feature_block(data_matrix, data_dict, sample_metadata)
+    if prefilter:
+        keep, _ = prefilter_from_settings(X, presentes, prefilter, hoja2["Class"])
+        X = X[:, keep]
+
+    labels = hoja2["Class"].to_numpy(dtype=object)
+    logger.info(f"Sweeping {len(grid)} configurations over {X.shape[0]} × {X.shape[1]} matrix")
+    start = time.perf_counter()
+    rows = map_shared(
+        _run_config,
+        grid,
+        np.ascontiguousarray(X, dtype=np.float64),
+        context={"labels": labels, "n_components": n_components},
+        n_jobs=n_jobs,
+    )
+    logger.info(f"Sweep finished in {time.perf_counter() - start:.1f}s")
+
+    table = pd.DataFrame(rows)
+    table.attrs.update(n_samples=int(X.shape[0]), n_compounds=int(X.shape[1]))
+    return table
+
+
+def main(argv: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """
+    Command-line entry point; prints the comparison table and optionally saves it.
+
+    Parameters
+    ----------
+    argv : Sequence[str], optional
+        Arguments (defaults to ``sys.argv[1:]``).
+
+    Returns
+    -------
+    pd.DataFrame
+        Sweep table.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--config", default="config/config.yaml", help="Path to config.yaml")
+    parser.add_argument("--data", help="Workbook path (defaults to data.path in the config)")
+    parser.add_argument("--scale", nargs="+", default=list(SCALE_METHODS), help="Scaling methods")
+    parser.add_argument("--knn-k", nargs="+", type=int, help="KNN k values (default: config)")
+    parser.add_argument("--log-offset", nargs="+", type=float, help="Log offsets (default: config)")
+    parser.add_argument("--components", type=int, default=2, help="Principal components")
+    parser.add_argument("--jobs", type=int, help="Worker processes (default: CPUs)")
+    parser.add_argument("--output", help="Save the table as .csv or .parquet")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    config = get_config(args.config)
+    paths = get_paths(config)
+    cache_settings = get_cache_settings(config)
+    preproc_cfg = config.get("preprocessing", {})
+
+    meta, matrix, data_dict = load_excel_cached(
+        args.data or paths["data_path"],
+        paths["meta_sheet"],
+        paths["matrix_sheet"],
+        paths["dict_sheet"],
+        cache_dir=Path(cache_settings["cache_dir"]) / "workbooks",
+        max_bytes=cache_settings["max_bytes"],
+    )
+    grid = parameter_grid(
+        args.scale,
+        args.knn_k or [preproc_cfg.get("knn_k", 3)],
+        args.log_offset or [preproc_cfg.get("log_offset", 0.5)],
+    )
+    table = run_sweep(
+        matrix,
+        data_dict,
+        meta,
+        grid=grid,
+        n_components=args.components,
+        prefilter=get_prefilter_settings(config),
+        n_jobs=args.jobs,
+    )
+
+    print(f"{table.attrs['n_samples']} samples × {table.attrs['n_compounds']} compounds")
+    print(table.sort_values("silhouette", ascending=False).to_string(index=False, float_format="%.4f"))
+    if args.output:
+        out = Path(args.output)
+        if out.suffix == ".parquet":
+            table.to_parquet(out, index=False)
+        else:
+            table.to_csv(out, index=False)
+        print(f"Saved {out}")
+    return table
+
+
+if __name__ == "__main__":
+    main()
@@ -1,213 +1,479 @@
-"""
-Visualization utilities for metabolomics EDA.
-"""
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-import plotly.express as px
-import plotly.graph_objects as go
-import logging
-from typing import Optional
-
-logger = logging.getLogger(__name__)
-
-
-def plot_group_counts_bar(meta: pd.DataFrame, col: str = "HEALTH_STATUS") -> plt.Figure:
-    """
-    Bar chart of sample counts per group.
-
-    Parameters
-    ----------
-    meta : pd.DataFrame
-        Sample metadata.
-    col : str
-        Column for grouping.
-
-    Returns
-    -------
-    plt.Figure
-        Matplotlib figure.
-    """
-    counts = meta[col].value_counts()
-    fig, ax = plt.subplots(figsize=(8, 5), dpi=100)
-    ax.bar(counts.index, counts.values, color="steelblue")
-    ax.set_xlabel(col)
-    ax.set_ylabel("Count")
-    ax.set_title(f"Sample Count by {col}")
-    plt.tight_layout()
-    logger.info(f"Bar chart created for {col}.")
-    return fig
-
-
-def plot_group_counts_donut(meta: pd.DataFrame, col: str = "HEALTH_STATUS") -> plt.Figure:
-    """
-    Donut chart of sample counts per group.
-
-    Parameters
-    ----------
-    meta : pd.DataFrame
-        Sample metadata.
-    col : str
-        Column for grouping.
-
-    Returns
-    -------
-    plt.Figure
-        Matplotlib figure.
-    """
-    counts = meta[col].value_counts()
-    fig, ax = plt.subplots(figsize=(8, 8))
-    my_circle = plt.Circle((0, 0), 0.5, color="white")
-    ax.pie(
-        counts.values,
-        labels=counts.index,
-        autopct="%1.2f%%",
-        startangle=90,
-        colors=sns.color_palette("Set2", len(counts)),
-    )
-    ax.add_artist(my_circle)
-    ax.set_title(f"Sample Distribution by {col}")
-    plt.tight_layout()
-    logger.info(f"Donut chart created for {col}.")
-    return fig
-
-
-def scatter_bmi_hba1c(
-    meta: pd.DataFrame,
-    hue_col: str = "HEALTH_STATUS",
-    figsize: tuple = (12, 8),
-) -> plt.Figure:
-    """
-    Scatter plot of BMI vs HbA1c, colored by hue_col.
-
-    Parameters
-    ----------
-    meta : pd.DataFrame
-        Sample metadata.
-    hue_col : str
-        Column for color grouping.
-    figsize : tuple
-        Figure size.
-
-    Returns
-    -------
-    plt.Figure
-        Matplotlib figure.
-    """
-    fig, ax = plt.subplots(figsize=figsize)
-    sns.scatterplot(
-        data=meta, x="BMI", y="hba1c", hue=hue_col, s=200, ax=ax, palette="Set1"
-    )
-    ax.set_title(f"BMI vs HbA1c (colored by {hue_col})")
-    ax.set_xlabel("BMI")
-    ax.set_ylabel("HbA1c")
-    plt.legend(title=hue_col, bbox_to_anchor=(1.05, 1), loc="upper left")
-    plt.tight_layout()
-    logger.info(f"Scatter plot created: BMI vs HbA1c by {hue_col}.")
-    return fig
-
-
-def bars_bmi_hba1c_plotly(meta: pd.DataFrame, group_col: str = "HEALTH_STATUS") -> go.Figure:
-    """
-    Grouped bar chart (Plotly) comparing BMI and HbA1c per group.
-
-    Parameters
-    ----------
-    meta : pd.DataFrame
-        Sample metadata.
-    group_col : str
-        Column for grouping.
-
-    Returns
-    -------
-    go.Figure
-        Plotly figure.
-    """
-    trace1 = go.Bar(
-        x=meta[group_col],
-        y=meta["BMI"],
-        name="BMI",
-        marker=dict(color="rgba(0, 40, 70, 0.6)"),
-    )
-    trace2 = go.Bar(
-        x=meta[group_col],
-        y=meta["hba1c"],
-        name="HbA1c",
-        marker=dict(color="rgba(255, 148, 7, 0.6)"),
-    )
-    fig = go.Figure(data=[trace1, trace2])
-    fig.update_layout(
-        barmode="group",
-        title="BMI and HbA1c by Health Status",
-        xaxis_title=group_col,
-        yaxis_title="Value",
-    )
-    logger.info("Plotly grouped bar chart created.")
-    return fig
-
-
-def sex_by_group_catplot(meta: pd.DataFrame, col: str = "HEALTH_STATUS") -> plt.Figure:
-    """
-    Catplot showing sample count by sex and health status.
-
-    Parameters
-    ----------
-    meta : pd.DataFrame
-        Sample metadata.
-    col : str
-        Column for facet grouping.
-
-    Returns
-    -------
-    plt.Figure
-        Seaborn FacetGrid (returns the underlying figure).
-    """
-    g = sns.catplot(
-        data=meta,
-        x="sex",
-        col=col,
-        kind="count",
-        height=4,
-        aspect=1.2,
-        palette="muted",
-    )
-    g.set_titles(col_template="{col_name}")
-    g.set_axis_labels("Sex", "Count")
-    g.fig.suptitle(f"Sample Count by Sex and {col}", y=1.02)
-    plt.tight_layout()
-    logger.info(f"Catplot created: sex by {col}.")
-    return g.fig
-
-
-def bar_super_pathway(data_dict: pd.DataFrame, col: str = "SUPER_PATHWAY") -> go.Figure:
-    """
-    Bar chart of compound counts per super pathway.
-
-    Parameters
-    ----------
-    data_dict : pd.DataFrame
-        Data dictionary with SUPER_PATHWAY column.
-    col : str
-        Column for grouping.
-
-    Returns
-    -------
-    go.Figure
-        Plotly bar chart.
-    """
-    counts = data_dict[col].value_counts().reset_index()
-    counts.columns = [col, "count"]
-
-    fig = px.bar(
-        counts,
-        x=col,
-        y="count",
-        color=col,
-        title=f"Compound Count by {col}",
-        labels={col: "Super Pathway", "count": "Count"},
-    )
-    fig.update_traces(marker_line_width=0)
-    fig.update_layout(showlegend=False, xaxis_tickangle=-45)
-    logger.info(f"Bar chart created for {col}.")
-    return fig
+"""
+Visualization utilities for metabolomics EDA.
+"""
+import pandas as pd
+import numpy as np
+import matplotlib.pyplot as plt
+import seaborn as sns
+import plotly.express as px
+import plotly.graph_objects as go
+import logging
+import time
+from typing import Optional, Sequence
+from scipy.stats import chi2
+from src.pca_utils import PCAModel
+
+logger = logging.getLogger(__name__)
+
+
+def plot_group_counts_bar(meta: pd.DataFrame, col: str = "HEALTH_STATUS") -> plt.Figure:
+    """
+    Bar chart of sample counts per group.
+
+    Parameters
+    ----------
+    meta : pd.DataFrame
+        Sample metadata.
+    col : str
+        Column for grouping.
+
+    Returns
+    -------
+    plt.Figure
+        Matplotlib figure.
+    """
+    counts = meta[col].value_counts()
+    fig, ax = plt.subplots(figsize=(8, 5), dpi=100)
+    ax.bar(counts.index, counts.values, color="steelblue")
+    ax.set_xlabel(col)
+    ax.set_ylabel("Count")
+    ax.set_title(f"Sample Count by {col}")
+    plt.tight_layout()
+    logger.info(f"Bar chart created for {col}.")
+    return fig
+
+
+def plot_group_counts_donut(meta: pd.DataFrame, col: str = "HEALTH_STATUS") -> plt.Figure:
+    """
+    Donut chart of sample counts per group.
+
+    Parameters
+    ----------
+    meta : pd.DataFrame
+        Sample metadata.
+    col : str
+        Column for grouping.
+
+    Returns
+    -------
+    plt.Figure
+        Matplotlib figure.
+    """
+    counts = meta[col].value_counts()
+    fig, ax = plt.subplots(figsize=(8, 8))
+    my_circle = plt.Circle((0, 0), 0.5, color="white")
+    ax.pie(
+        counts.values,
+        labels=counts.index,
+        autopct="%1.2f%%",
+        startangle=90,
+        colors=sns.color_palette("Set2", len(counts)),
+    )
+    ax.add_artist(my_circle)
+    ax.set_title(f"Sample Distribution by {col}")
+    plt.tight_layout()
+    logger.info(f"Donut chart created for {col}.")
+    return fig
+
+
+def scatter_bmi_hba1c(
+    meta: pd.DataFrame,
+    hue_col: str = "HEALTH_STATUS",
+    figsize: tuple = (12, 8),
+) -> plt.Figure:
+    """
+    Scatter plot of BMI vs HbA1c, colored by hue_col.
+
+    Parameters
+    ----------
+    meta : pd.DataFrame
+        Sample metadata.
+    hue_col : str
+        Column for color grouping.
+    figsize : tuple
+        Figure size.
+
+    Returns
+    -------
+    plt.Figure
+        Matplotlib figure.
+    """
+    fig, ax = plt.subplots(figsize=figsize)
+    sns.scatterplot(
+        data=meta, x="BMI", y="hba1c", hue=hue_col, s=200, ax=ax, palette="Set1"
+    )
+    ax.set_title(f"BMI vs HbA1c (colored by {hue_col})")
+    ax.set_xlabel("BMI")
+    ax.set_ylabel("HbA1c")
+    plt.legend(title=hue_col, bbox_to_anchor=(1.05, 1), loc="upper left")
+    plt.tight_layout()
+    logger.info(f"Scatter plot created: BMI vs HbA1c by {hue_col}.")
+    return fig
+
+
+def bars_bmi_hba1c_plotly(meta: pd.DataFrame, group_col: str = "HEALTH_STATUS") -> go.Figure:
+    """
+    Grouped bar chart (Plotly) comparing BMI and HbA1c per group.
+
+    Parameters
+    ----------
+    meta : pd.DataFrame
+        Sample metadata.
+    group_col : str
+        Column for grouping.
+
+    Returns
+    -------
+    go.Figure
+        Plotly figure.
+    """
+    trace1 = go.Bar(
+        x=meta[group_col],
+        y=meta["BMI"],
+        name="BMI",
+        marker=dict(color="rgba(0, 40, 70, 0.6)"),
+    )
+    trace2 = go.Bar(
+        x=meta[group_col],
+        y=meta["hba1c"],
+        name="HbA1c",
+        marker=dict(color="rgba(255, 148, 7, 0.6)"),
+    )
+    fig = go.Figure(data=[trace1, trace2])
+    fig.update_layout(
+        barmode="group",
+        title="BMI and HbA1c by Health Status",
+        xaxis_title=group_col,
+        yaxis_title="Value",
+    )
+    logger.info("Plotly grouped bar chart created.")
+    return fig
+
+
+def sex_by_group_catplot(meta: pd.DataFrame, col: str = "HEALTH_STATUS") -> plt.Figure:
+    """
+    Catplot showing sample count by sex and health status.
+
+    Parameters
+    ----------
+    meta : pd.DataFrame
+        Sample metadata.
+    col : str
+        Column for facet grouping.
+
+    Returns
+    -------
+    plt.Figure
+        Seaborn FacetGrid (returns the underlying figure).
+    """
+    g = sns.catplot(
+        data=meta,
+        x="sex",
+        col=col,
+        kind="count",
+        height=4,
+        aspect=1.2,
+        palette="muted",
+    )
+    g.set_titles(col_template="{col_name}")
+    g.set_axis_labels("Sex", "Count")
+    g.fig.suptitle(f"Sample Count by Sex and {col}", y=1.02)
+    plt.tight_layout()
+    logger.info(f"Catplot created: sex by {col}.")
+    return g.fig
+
+
+def bar_super_pathway(data_dict: pd.DataFrame, col: str = "SUPER_PATHWAY") -> go.Figure:
+    """
+    Bar chart of compound counts per super pathway.
+
+    Parameters
+    ----------
+    data_dict : pd.DataFrame
+        Data dictionary with SUPER_PATHWAY column.
+    col : str
+        Column for grouping.
+
+    Returns
+    -------
+    go.Figure
+        Plotly bar chart.
+    """
+    counts = data_dict[col].value_counts().reset_index()
+    counts.columns = [col, "count"]
+
+    fig = px.bar(
+        counts,
+        x=col,
+        y="count",
+        color=col,
+        title=f"Compound Count by {col}",
+        labels={col: "Super Pathway", "count": "Count"},
+    )
+    fig.update_traces(marker_line_width=0)
+    fig.update_layout(showlegend=False, xaxis_tickangle=-45)
+    logger.info(f"Bar chart created for {col}.")
+    return fig
+
+
+def downsample_points(
+    xy: np.ndarray,
+    max_points: int,
+    bins: int = 200,
+    groups: Optional[Sequence] = None,
+    outlier_quantile: float = 0.999,
+    random_state: int = 0,
+) -> np.ndarray:
+    """
+    Density-preserving subset of 2-D points for plotting.
+
+    Points are binned on a ``bins`` × ``bins`` grid (per group when given)
+    and every occupied cell keeps a random share of its points proportional
+    to its count (at least one), so dense regions are thinned while sparse
+    regions and small groups stay visible. Outliers (squared Mahalanobis
+    distance above the chi-square ``outlier_quantile``) are always kept.
+
+    Parameters
+    ----------
+    xy : np.ndarray
+        n × 2 coordinates.
+    max_points : int
+        Target number of points (exceeded only when there are more
+        outliers plus occupied cells than this).
+    bins : int
+        Grid bins per axis (halved while the occupied cells exceed half
+        of ``max_points``).
+    groups : Sequence, optional
+        Group label per point; sampling is stratified by group.
+    outlier_quantile : float
+        Chi-square (2 dof) quantile beyond which points count as outliers.
+    random_state : int
+        Seed of the within-cell sampling.
+
+    Returns
+    -------
+    np.ndarray
+        Sorted row indices of the retained points.
+    """
+    xy = np.asarray(xy, dtype=np.float64)
+    n = len(xy)
+    if n <= max_points:
+        return np.arange(n)
+
+    centered = xy - xy.mean(axis=0)
+    d2 = np.einsum("ij,jk,ik->i", centered, np.linalg.pinv(np.cov(xy, rowvar=False)), centered)
+    outlier = d2 > chi2.ppf(outlier_quantile, df=2)
+
+    lo, hi = xy.min(axis=0), xy.max(axis=0)
+    span = np.where(hi > lo, hi - lo, 1.0)
+    codes = None if groups is None else pd.factorize(pd.Series(list(groups)))[0].astype(np.int64)
+    inliers = np.flatnonzero(~outlier)
+    budget = max(int(max_points) - int(outlier.sum()), 1)
+    # Coarsen the grid until the occupied cells use at most half of the budget
+    while True:
+        cell = np.minimum(((xy[inliers] - lo) / span * bins).astype(np.int64), bins - 1)
+        key = cell[:, 0] * bins + cell[:, 1]
+        if codes is not None:
+            key += codes[inliers] * bins * bins
+        cells, cell_of, counts = np.unique(key, return_inverse=True, return_counts=True)
+        if 2 * len(cells) <= budget or bins == 1:
+            break
+        bins = max(1, bins // 2)
+    budget = max(budget, len(cells))
+    # Largest sampling rate whose per-cell quotas fit the budget
+    lo_rate, hi_rate = 0.0, 1.0
+    for _ in range(40):
+        rate = (lo_rate + hi_rate) / 2
+        if np.ceil(counts * rate).sum() <= budget:
+            lo_rate = rate
+        else:
+            hi_rate = rate
+    quota = np.maximum(1, np.ceil(counts * lo_rate)).astype(np.int64)
+
+    # Random rank of each point within its cell; keep the first `quota`
+    rng = np.random.default_rng(random_state)
+    order = np.lexsort((rng.random(len(inliers)), cell_of))
+    sorted_cells = cell_of[order]
+    rank = np.arange(len(order)) - np.searchsorted(sorted_cells, sorted_cells)
+    kept = inliers[order[rank < quota[sorted_cells]]]
+    return np.sort(np.concatenate([np.flatnonzero(outlier), kept]))
+
+
+def pca_scores_figure(
+    model: PCAModel,
+    group_label: Sequence,
+    pcx: int = 1,
+    pcy: int = 2,
+    sample_ids: Optional[Sequence] = None,
+    title: Optional[str] = None,
+    webgl_threshold: Optional[int] = None,
+    downsample_threshold: Optional[int] = None,
+    max_points: int = 20_000,
+    bins: int = 200,
+) -> go.Figure:
+    """
+    Plotly scores scatter for one component pair of a fitted PCA model.
+
+    The model is fitted once; switching pcx/pcy only reads its stored scores.
+    Large cohorts are drawn with WebGL traces above ``webgl_threshold``
+    points and downsampled server-side (:func:`downsample_points`) above
+    ``downsample_threshold``; hover information is kept for every drawn
+    point. Build time and JSON payload size are logged, and
+    ``fig.layout.meta`` records 'n_points', 'n_shown' and 'webgl'.
+
+    Parameters
+    ----------
+    model : PCAModel
+        Fitted PCA model (see :class:`src.pca_utils.PCAModel`).
+    group_label : Sequence
+        Sample group labels used for coloring (e.g. 'Class').
+    pcx : int
+        Principal component for x-axis (1-based).
+    pcy : int
+        Principal component for y-axis (1-based).
+    sample_ids : Sequence, optional
+        Sample identifiers shown on hover.
+    title : str, optional
+        Figure title (defaults to the explained variance of both PCs).
+    webgl_threshold : int, optional
+        Use WebGL (Scattergl) when more points than this are drawn
+        (None: always SVG).
+    downsample_threshold : int, optional
+        Downsample when the model has more samples than this (None: never).
+    max_points : int
+        Points kept when downsampling.
+    bins : int
+        Grid bins per axis when downsampling.
+
+    Returns
+    -------
+    go.Figure
+        Plotly scatter plot.
+    """
+    start = time.perf_counter()
+    scores, var_exp = model.pair(pcx, pcy)
+    n = scores.shape[0]
+    df_scores = pd.DataFrame(
+        {
+            f"PC{pcx}": scores[:, 0],
+            f"PC{pcy}": scores[:, 1],
+            "Class": pd.Series(group_label).astype(str).to_numpy(),
+            "SampleID": np.asarray(sample_ids if sample_ids is not None else np.arange(n)).astype(str),
+        }
+    )
+    if title is None:
+        title = f"PCA — PC{pcx} {var_exp[0]:.1%} | PC{pcy} {var_exp[1]:.1%}"
+    if downsample_threshold is not None and n > downsample_threshold:
+        keep = downsample_points(scores, max_points, bins=bins, groups=df_scores["Class"])
+        df_scores = df_scores.iloc[keep]
+        title = f"{title} (showing {len(df_scores):,} of {n:,} samples)"
+    webgl = webgl_threshold is not None and len(df_scores) > webgl_threshold
+    fig = px.scatter(
+        df_scores,
+        x=f"PC{pcx}",
+        y=f"PC{pcy}",
+        color="Class",
+        hover_data=["SampleID"],
+        title=title,
+        render_mode="webgl" if webgl else "svg",
+    )
+    fig.layout.meta = {"n_points": n, "n_shown": len(df_scores), "webgl": webgl}
+    if logger.isEnabledFor(logging.INFO):
+        payload = len(fig.to_json())
+        logger.info(
+            f"PCA scores plot created for PC{pcx} vs PC{pcy}: {len(df_scores)}/{n} points, "
+            f"{'WebGL' if webgl else 'SVG'}, {payload / 1e6:.2f} MB JSON, "
+            f"{1000 * (time.perf_counter() - start):.0f} ms"
+        )
+    return fig
+
+
+def overlay_projected_samples(
+    fig: go.Figure,
+    scores: np.ndarray,
+    sample_ids: Optional[Sequence] = None,
+    name: str = "Projected samples",
+) -> go.Figure:
+    """
+    Add projected samples to an existing PCA scores scatter.
+
+    Parameters
+    ----------
+    fig : go.Figure
+        Reference scores figure (e.g. from :func:`pca_scores_figure`).
+    scores : np.ndarray
+        n × 2 scores of the new samples for the figure's component pair.
+    sample_ids : Sequence, optional
+        Sample identifiers shown on hover.
+    name : str
+        Legend entry.
+
+    Returns
+    -------
+    go.Figure
+        The same figure with one extra trace.
+    """
+    scores = np.asarray(scores)
+    ids = np.asarray(sample_ids if sample_ids is not None else np.arange(len(scores))).astype(str)
+    fig.add_trace(
+        go.Scatter(
+            x=scores[:, 0],
+            y=scores[:, 1],
+            mode="markers",
+            name=name,
+            text=ids,
+            hovertemplate="%{text}<extra>" + name + "</extra>",
+            marker=dict(symbol="x", size=11, color="black", line=dict(width=1)),
+        )
+    )
+    logger.info(f"Overlaid {len(scores)} projected samples.")
+    return fig
+
+
+def add_confidence_ellipses(
+    fig: go.Figure,
+    ellipses: pd.DataFrame,
+    name_col: str = "Class",
+    n_points: int = 100,
+) -> go.Figure:
+    """
+    Draw confidence ellipses (e.g. from :func:`src.resampling.bootstrap_pca`) on a scores figure.
+
+    Each ellipse takes the color of the figure trace with the same name, so
+    group ellipses match the groups of :func:`pca_scores_figure`.
+
+    Parameters
+    ----------
+    fig : go.Figure
+        Scores figure.
+    ellipses : pd.DataFrame
+        Rows with 'center_x', 'center_y', 'width', 'height', 'angle' (degrees).
+    name_col : str
+        Column naming each ellipse.
+    n_points : int
+        Points per outline.
+
+    Returns
+    -------
+    go.Figure
+        The same figure with one outline trace per ellipse.
+    """
+    colors = {t.name: getattr(t.marker, "color", None) for t in fig.data}
+    t = np.linspace(0, 2 * np.pi, n_points)
+    for row in ellipses.itertuples(index=False):
+        theta = np.radians(row.angle)
+        ex, ey = row.width / 2 * np.cos(t), row.height / 2 * np.sin(t)
+        name = str(getattr(row, name_col))
+        fig.add_trace(
+            go.Scatter(
+                x=row.center_x + ex * np.cos(theta) - ey * np.sin(theta),
+                y=row.center_y + ex * np.sin(theta) + ey * np.cos(theta),
+                mode="lines",
+                name=f"{name} (IC)",
+                legendgroup=name,
+                hoverinfo="skip",
+                line=dict(color=colors.get(name), dash="dash", width=1.5),
+            )
+        )
+    logger.info(f"Added {len(ellipses)} confidence ellipses.")
+    return fig
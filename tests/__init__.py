@@ -1,3 +1,3 @@
-"""
-Tests package for metabolomics EDA.
-"""
+"""
+Tests package for metabolomics EDA.
+"""
@@ -0,0 +1,81 @@
+"""
+Tests for cache module and cached workbook loading.
+"""
+import pytest
+import pandas as pd
+import numpy as np
+from src.cache import DiskCache
+from src.io_utils import load_excel_cached
+
+
+def _write_bytes(n):
+    def _writer(target):
+        (target / "blob.bin").write_bytes(b"x" * n)
+
+    return _writer
+
+
+def test_disk_cache_hit_miss_and_eviction(tmp_path):
+    """Test DiskCache counters, LRU eviction by bytes and invalidation."""
+    cache = DiskCache(tmp_path / "cache", max_bytes=2500)
+
+    assert cache.get("a") is None
+    cache.put("a", _write_bytes(1000))
+    cache.put("b", _write_bytes(1000))
+    assert cache.get("a") is not None  # 'a' is now the most recently used
+
+    cache.put("c", _write_bytes(1000))  # exceeds the bound → evicts 'b'
+    keys = {r["key"] for r in cache.entries()}
+    assert keys == {"a", "c"}
+
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+    assert stats["total_bytes"] <= 2500
+
+    # Totals are shared by every instance on the directory
+    other = DiskCache(tmp_path / "cache", max_bytes=2500)
+    assert other.get("c") is not None and other.get("b") is None
+    assert other.hits == 1 and other.stats()["hits"] == 2 and other.stats()["misses"] == 2
+
+    assert cache.invalidate() == 2
+    assert cache.stats()["entries"] == 0
+
+
+def test_load_excel_cached_roundtrip(tmp_path):
+    """Test that cold and warm loads return identical frames, numeric and mixed columns included."""
+    xlsx = tmp_path / "study.xlsx"
+    meta = pd.DataFrame({"sample_id": ["S1", "S2"], "Health": ["Healthy", "diabetic"]})
+    matrix = pd.DataFrame({"compound_id": ["C1", "C2"], "S1": [1.5, 2.0], "S2": [3.0, np.nan]})
+    data_dict = pd.DataFrame(
+        {"compound_id": ["C1", "C2"], "BIOCHEMICAL": ["Glucose", "Lactate"], 2023: [101, "pending"]}
+    )
+    with pd.ExcelWriter(xlsx) as writer:
+        meta.to_excel(writer, sheet_name="sample_metadata", index=False)
+        matrix.to_excel(writer, sheet_name="data_matrix", index=False)
+        data_dict.to_excel(writer, sheet_name="data_dictionary", index=False)
+
+    args = (xlsx, "sample_metadata", "data_matrix", "data_dictionary")
+    first = load_excel_cached(*args, cache_dir=tmp_path / "cache")
+    second = load_excel_cached(*args, cache_dir=tmp_path / "cache")
+
+    assert len([p for p in (tmp_path / "cache").iterdir() if p.is_dir()]) == 1
+    for a, b in zip(first, second):
+        pd.testing.assert_frame_equal(a, b)
+    assert list(first[2].columns) == ["compound_id", "BIOCHEMICAL", "2023"]
+    assert first[2]["2023"].tolist() == ["101", "pending"]
+
+
+def test_load_excel_cached_keys_reader_mode(tmp_path):
+    """Test that the streaming and pandas readers keep separate cache entries."""
+    xlsx = tmp_path / "study.xlsx"
+    with pd.ExcelWriter(xlsx) as writer:
+        pd.DataFrame({"sample_id": ["S1"]}).to_excel(writer, sheet_name="sample_metadata", index=False)
+        pd.DataFrame({"compound_id": ["C1"], "S1": [1.5]}).to_excel(writer, sheet_name="data_matrix", index=False)
+        pd.DataFrame({"compound_id": ["C1"]}).to_excel(writer, sheet_name="data_dictionary", index=False)
+
+    args = (xlsx, "sample_metadata", "data_matrix", "data_dictionary")
+    load_excel_cached(*args, cache_dir=tmp_path / "cache")
+    streamed = load_excel_cached(*args, cache_dir=tmp_path / "cache", streaming=True, dtype=np.float32)
+
+    assert len([p for p in (tmp_path / "cache").iterdir() if p.is_dir()]) == 2
+    assert streamed[1]["S1"].dtype == np.float32
@@ -0,0 +1,70 @@
+"""
+Tests for impute module.
+"""
+import warnings
+
+import pytest
+import numpy as np
+import cimcb_lite as cb
+from src.impute import impute_from_neighbors, knn_impute
+
+
+@pytest.mark.parametrize("k", [1, 3, 5])
+def test_knn_impute_matches_cimcb(k):
+    """Test equality with cb.utils.knnimpute, including sliding windows and duplicates."""
+    rng = np.random.default_rng(k)
+    X = rng.normal(size=(40, 30))
+    X[1] = X[0]  # zero distance -> infinite weight branch
+    X[:, 10:] = np.where(rng.random((40, 20)) < 0.4, np.nan, X[:, 10:])
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        expected = cb.utils.knnimpute(X, k=k)
+    # Few candidates and small blocks force the full-sort fallback and threading
+    result = knn_impute(X, k=k, block_size=4, n_jobs=3, n_candidates=k + 1)
+    np.testing.assert_allclose(result, expected, rtol=1e-10, equal_nan=True)
+
+
+def test_knn_impute_edge_cases():
+    """Test no-NaN passthrough, k clamping and input validation."""
+    X = np.arange(12, dtype=float).reshape(4, 3)
+    out = knn_impute(X, k=3)
+    assert out is not X and np.array_equal(out, X)
+
+    X[0, 2] = np.nan
+    out = knn_impute(X, k=10)  # clamped to n - 1
+    assert not np.isnan(out).any()
+    assert np.isnan(X[0, 2])  # input untouched
+
+    with pytest.raises(ValueError):
+        knn_impute(X, k=0)
+    with pytest.raises(ValueError):
+        knn_impute(np.full((3, 2), np.nan), k=1)
+
+
+def test_knn_impute_with_reference():
+    """Test that reference mode draws neighbours only from the reference rows."""
+    reference = np.array([[0.0, 0.0, 1.0], [10.0, 10.0, 2.0], [20.0, 20.0, 3.0]])
+    X = np.array([[9.0, 11.0, np.nan], [0.5, 0.0, np.nan]])
+
+    out = knn_impute(X, k=1, reference=reference)
+    np.testing.assert_array_equal(out[:, 2], [2.0, 1.0])
+    assert np.isnan(X).sum() == 2  # input untouched
+
+
+def test_impute_from_neighbors_matches_knn_impute():
+    """Test the precomputed-neighbour helper against knn_impute row by row."""
+    rng = np.random.default_rng(7)
+    X = rng.normal(size=(20, 12))
+    X[:, 4:] = np.where(rng.random((20, 8)) < 0.5, np.nan, X[:, 4:])
+    expected = knn_impute(X, k=3)
+
+    Xc = X[:, :4]
+    for row in np.flatnonzero(np.isnan(X).any(axis=1)):
+        others = np.delete(np.arange(len(X)), row)
+        dist = np.sqrt(((Xc[others] - Xc[row]) ** 2).sum(axis=1))
+        order = np.lexsort((others, dist))
+        feats, values = impute_from_neighbors(X, row, others[order], dist[order], k=3)
+        np.testing.assert_allclose(values, expected[row, feats], rtol=1e-10)
+        assert np.isnan(expected[row, np.setdiff1d(np.flatnonzero(np.isnan(X[row])), feats)]).all()
+    assert np.isnan(X).any()  # the helper does not write to X
@@ -0,0 +1,63 @@
+"""
+Tests for incremental module.
+"""
+import pytest
+import numpy as np
+from src.incremental import IncrementalPreprocessor, RunningStats
+from src.preprocess import Preprocessor
+
+
+def _cohort(seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.lognormal(3, 1, size=(90, 12))
+    X[rng.random(X.shape) < 0.1] = np.nan
+    X[rng.random(X.shape) < 0.05] = 0
+    return X
+
+
+@pytest.mark.parametrize("method", ["auto", "range"])
+def test_rebaseline_matches_full_fit(method):
+    """Test that batch updates + rebaseline equal a full Preprocessor fit."""
+    X = _cohort()
+    inc = IncrementalPreprocessor(method)
+    for batch in np.array_split(X, 5):
+        inc.partial_fit(batch)
+    inc.rebaseline()
+
+    expected = Preprocessor(method).fit_transform(X)
+    np.testing.assert_allclose(inc.transform(X), expected, atol=1e-10)
+
+
+def test_running_stats_merge_and_drift(tmp_path):
+    """Test Welford merging, frozen baseline, drift report and persistence."""
+    X = _cohort(1)
+    stats = RunningStats(X.shape[1]).update(X[:40]).update(X[40:])
+    observed = np.where(X > 0, np.log10(np.where(X > 0, X, 1)), np.nan)
+    np.testing.assert_allclose(stats.mean, np.nanmean(observed, axis=0))
+    np.testing.assert_allclose(stats.m2, np.nanvar(observed, axis=0) * stats.n_obs)
+    assert stats.n_missing.sum() == np.isnan(X).sum()
+
+    inc = IncrementalPreprocessor().partial_fit(X[:45])
+    first = inc.transform(X[:5])
+    shifted = X[45:] * 10
+    inc.partial_fit(shifted)
+    np.testing.assert_array_equal(inc.transform(X[:5]), first)  # baseline frozen
+    assert inc.drift()["mean_shift"].max() > 0.5 and inc.needs_rebaseline()
+
+    loaded = IncrementalPreprocessor.load(inc.save(tmp_path / "inc.npz"))
+    np.testing.assert_array_equal(loaded.transform(X[:5]), first)
+    loaded.rebaseline()
+    assert not loaded.needs_rebaseline()
+
+
+def test_needs_rebaseline_minpos_tolerance():
+    """Test that a small minpos change is tolerated and a large one is not."""
+    X = _cohort(2)
+    inc = IncrementalPreprocessor().partial_fit(X)
+    minpos = np.nanmin(np.where(X > 0, X, np.nan))
+    batch = X[:10].copy()
+    batch[0, 0] = minpos / 1.2
+    inc.partial_fit(batch)
+    assert inc.drift().attrs["minpos_ratio"] != 1.0
+    assert not inc.needs_rebaseline()
+    assert inc.needs_rebaseline(max_minpos_ratio=1.1)
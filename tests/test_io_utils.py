@@ -1,34 +1,125 @@
-"""
-Tests for io_utils module.
-"""
-import pytest
-import pandas as pd
-from src.io_utils import validate_align
-
-
-def test_validate_align_perfect():
-    """Test validate_align with perfect sample alignment."""
-    meta = pd.DataFrame({"sample_id": ["S1", "S2", "S3"]})
-    matrix = pd.DataFrame(
-        {"compound_id": ["C1", "C2"], "S1": [1, 2], "S2": [3, 4], "S3": [5, 6]}
-    )
-    # Should not raise
-    validate_align(meta, matrix, sample_col="sample_id")
-
-
-def test_validate_align_partial():
-    """Test validate_align with partial overlap."""
-    meta = pd.DataFrame({"sample_id": ["S1", "S2", "S3", "S4"]})
-    matrix = pd.DataFrame(
-        {"compound_id": ["C1", "C2"], "S1": [1, 2], "S2": [3, 4]}
-    )
-    # Should log warning but not raise
-    validate_align(meta, matrix, sample_col="sample_id")
-
-
-def test_validate_align_missing_col():
-    """Test validate_align with missing sample_id column."""
-    meta = pd.DataFrame({"patient_id": ["P1", "P2"]})
-    matrix = pd.DataFrame({"compound_id": ["C1"], "P1": [1], "P2": [2]})
-    # Should log warning and return without error
-    validate_align(meta, matrix, sample_col="sample_id")
+"""
+Tests for io_utils module.
+"""
+import pytest
+import pandas as pd
+import numpy as np
+from src.io_utils import load_excel, load_excel_batches, validate_align
+
+
+def test_validate_align_perfect():
+    """Test validate_align with perfect sample alignment."""
+    meta = pd.DataFrame({"sample_id": ["S1", "S2", "S3"]})
+    matrix = pd.DataFrame(
+        {"compound_id": ["C1", "C2"], "S1": [1, 2], "S2": [3, 4], "S3": [5, 6]}
+    )
+    # Should not raise
+    validate_align(meta, matrix, sample_col="sample_id")
+
+
+def test_validate_align_partial():
+    """Test validate_align with partial overlap."""
+    meta = pd.DataFrame({"sample_id": ["S1", "S2", "S3", "S4"]})
+    matrix = pd.DataFrame(
+        {"compound_id": ["C1", "C2"], "S1": [1, 2], "S2": [3, 4]}
+    )
+    # Should log warning but not raise
+    validate_align(meta, matrix, sample_col="sample_id")
+
+
+def test_validate_align_missing_col():
+    """Test validate_align with missing sample_id column."""
+    meta = pd.DataFrame({"patient_id": ["P1", "P2"]})
+    matrix = pd.DataFrame({"compound_id": ["C1"], "P1": [1], "P2": [2]})
+    # Should log warning and return without error
+    validate_align(meta, matrix, sample_col="sample_id")
+
+
+def test_validate_align_registry_take():
+    """Test that validate_align returns reusable take-indices."""
+    meta = pd.DataFrame(
+        {"sample_id": ["S3", "S1", "S4"], "Health": ["Healthy", "diabetic", "Healthy"]}
+    )
+    matrix = pd.DataFrame(
+        {"compound_id": ["C1"], "S1": [1], "S2": [2], "S3": [3]}
+    )
+    registry = validate_align(meta, matrix, sample_col="sample_id")
+
+    assert list(registry.meta_take) == [1, -1, 0]
+    assert list(registry.missing) == ["S4"]
+    assert list(registry.extra) == ["S2"]
+    assert registry.overlap_pct == pytest.approx(200 / 3)
+
+    health = registry.take(meta["Health"])
+    assert health[0] == "diabetic" and health[2] == "Healthy"
+    assert pd.isna(health[1])
+    assert list(registry.positions(["S3", "S1"])) == [2, 0]
+
+
+def _write_workbook(path, meta, matrix, data_dict):
+    with pd.ExcelWriter(path) as writer:
+        meta.to_excel(writer, sheet_name="sample_metadata", index=False)
+        matrix.to_excel(writer, sheet_name="data_matrix", index=False)
+        data_dict.to_excel(writer, sheet_name="data_dictionary", index=False)
+
+
+def test_load_excel_streaming_matches_pandas(tmp_path):
+    """Test that the streaming reader returns the same frames as read_excel."""
+    xlsx = tmp_path / "study.xlsx"
+    meta = pd.DataFrame({"sample_id": ["S1", "S2"], "BMI": [22.5, 30.1]})
+    matrix = pd.DataFrame(
+        {"compound_id": ["C1", "C2", "C3"], "S1": [1.5, 2.0, 0.3], "S2": [3.0, np.nan, 4.2]}
+    )
+    data_dict = pd.DataFrame({"compound_id": ["C1", "C2", "C3"], "KEGG": ["K1", None, "K3"]})
+    _write_workbook(xlsx, meta, matrix, data_dict)
+
+    sheets = ("sample_metadata", "data_matrix", "data_dictionary")
+    expected = load_excel(xlsx, *sheets)
+    streamed = load_excel(xlsx, *sheets, streaming=True)
+    for a, b in zip(expected, streamed):
+        pd.testing.assert_frame_equal(a, b)
+
+    _, matrix32, _ = load_excel(xlsx, *sheets, streaming=True, dtype=np.float32)
+    assert (matrix32.dtypes.iloc[1:] == np.float32).all()
+
+
+def test_load_excel_batches_aligns_compounds(tmp_path):
+    """Test that batches are merged on the union of compound IDs."""
+    for name, samples, compounds in [
+        ("batch1", ["S1", "S2"], ["C1", "C2"]),
+        ("batch2", ["S3"], ["C2", "C3"]),
+    ]:
+        meta = pd.DataFrame({"sample_id": samples})
+        matrix = pd.DataFrame({"compound_id": compounds})
+        for i, s in enumerate(samples):
+            matrix[s] = [float(i + 1)] * len(compounds)
+        data_dict = pd.DataFrame({"compound_id": compounds})
+        _write_workbook(tmp_path / f"{name}.xlsx", meta, matrix, data_dict)
+
+    meta, matrix, data_dict, timings = load_excel_batches(
+        tmp_path, "sample_metadata", "data_matrix", "data_dictionary", use_processes=False
+    )
+
+    assert list(matrix["compound_id"]) == ["C1", "C2", "C3"]
+    assert list(matrix.columns[1:]) == ["S1", "S2", "S3"]
+    assert np.isnan(matrix.loc[matrix["compound_id"] == "C1", "S3"]).all()
+    assert list(meta["batch"]) == ["batch1", "batch1", "batch2"]
+    assert len(data_dict) == 3
+    assert len(timings) == 2
+
+
+def test_load_excel_batches_duplicate_compounds(tmp_path):
+    """Test that a compound ID repeated within a workbook is reported by file."""
+    for name, compounds in [("batch1", ["C1", "C2"]), ("batch2", ["C2", "C2"])]:
+        matrix = pd.DataFrame({"compound_id": compounds, name: [1.0, 2.0]})
+        _write_workbook(
+            tmp_path / f"{name}.xlsx",
+            pd.DataFrame({"sample_id": [name]}),
+            matrix,
+            pd.DataFrame({"compound_id": compounds}),
+        )
+
+    with pytest.raises(ValueError, match=r"batch2\.xlsx.*'C2'"):
+        load_excel_batches(
+            tmp_path, "sample_metadata", "data_matrix", "data_dictionary", use_processes=False
+        )
@@ -0,0 +1,61 @@
+"""
+Tests for long_format module.
+"""
+import pytest
+import pandas as pd
+import numpy as np
+from scipy import sparse
+from src.long_format import read_long_format, long_to_data_matrix
+
+
+def _write_long(path):
+    long_df = pd.DataFrame(
+        {
+            "sample_id": ["S1", "S1", "S2", "S2", "S3"],
+            "compound_id": ["C1", "C2", "C1", "C3", "C2"],
+            "intensity": [1.0, 2.0, 3.0, 4.0, 5.0],
+        }
+    )
+    long_df.to_csv(path, sep="\t", index=False)
+    return long_df
+
+
+def test_long_to_data_matrix_matches_pivot(tmp_path):
+    """Test chunked ingestion against a full pandas pivot."""
+    path = tmp_path / "export.tsv"
+    long_df = _write_long(path)
+
+    matrix = long_to_data_matrix(path, chunksize=2)
+    expected = long_df.pivot(index="compound_id", columns="sample_id", values="intensity")
+
+    assert list(matrix.columns) == ["compound_id", "S1", "S2", "S3"]
+    assert list(matrix["compound_id"]) == ["C1", "C2", "C3"]
+    np.testing.assert_array_equal(matrix.iloc[:, 1:].to_numpy(), expected.to_numpy())
+
+
+def test_read_long_format_sparse(tmp_path):
+    """Test that low coverage yields a CSC matrix with the same values."""
+    path = tmp_path / "export.tsv"
+    _write_long(path)
+
+    values, compounds, samples = read_long_format(path, chunksize=2, min_density=0.9)
+    assert sparse.isspmatrix_csc(values)
+    assert values.shape == (len(compounds), len(samples)) == (3, 3)
+    assert values.nnz == 5
+    assert values[compounds.get_loc("C3"), samples.get_loc("S2")] == 4.0
+
+
+@pytest.mark.parametrize("min_density", [0.0, 0.9])
+def test_long_to_data_matrix_duplicates_and_missing(tmp_path, min_density):
+    """Dense and sparse paths keep the last duplicate and leave unobserved cells NaN."""
+    path = tmp_path / "export.tsv"
+    long_df = _write_long(path)
+    dup = pd.DataFrame({"sample_id": ["S1"], "compound_id": ["C1"], "intensity": [9.0]})
+    pd.concat([long_df, dup]).to_csv(path, sep="\t", index=False)
+
+    matrix = long_to_data_matrix(path, chunksize=4, min_density=min_density)
+    assert all(isinstance(dt, pd.SparseDtype) for dt in matrix.dtypes[1:]) == (min_density > 0.5)
+    dense = matrix.iloc[:, 1:].to_numpy(dtype=float, na_value=np.nan)
+    assert dense[0, 0] == 9.0
+    assert np.isnan(dense[2, 0])  # C3 never measured in S1
+    assert np.isnan(dense).sum() == 4
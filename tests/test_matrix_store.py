@@ -0,0 +1,38 @@
+"""
+Tests for matrix_store module.
+"""
+import pytest
+import numpy as np
+from src.matrix_store import MatrixStore
+
+
+def test_matrix_store_roundtrip_and_views(tmp_path):
+    """Test write/read, read-only memmaps and label-based subsets."""
+    store = MatrixStore(tmp_path)
+    X = np.arange(20, dtype=np.float64).reshape(4, 5)
+    samples = ["S1", "S2", "S3", "S4"]
+    compounds = [f"C{i}" for i in range(5)]
+    store.write("preprocessed", X, samples, compounds)
+
+    Xr, s_idx, c_idx = store.read("preprocessed")
+    assert isinstance(Xr, np.memmap)
+    np.testing.assert_array_equal(Xr, X)
+    assert list(s_idx) == samples and list(c_idx) == compounds
+    with pytest.raises(ValueError):
+        Xr[0, 0] = -1.0  # read-only mapping
+
+    # Contiguous selection → zero-copy view of the mapping
+    Xs, s_sub, _ = store.read("preprocessed", samples=["S2", "S3"])
+    assert not Xs.flags.writeable  # still a view of the read-only mapping
+    np.testing.assert_array_equal(Xs, X[1:3])
+    assert list(s_sub) == ["S2", "S3"]
+
+    # Arbitrary selection → gathered block
+    Xc, _, c_sub = store.read("preprocessed", samples=["S4", "S1"], compounds=["C3", "C0"])
+    np.testing.assert_array_equal(Xc, X[[3, 0]][:, [3, 0]])
+    assert Xc.flags.writeable  # private copy of the selected block
+    assert list(c_sub) == ["C3", "C0"]
+
+    with pytest.raises(KeyError):
+        store.read("preprocessed", samples=["S9"])
+    assert store.names() == ["preprocessed"]
@@ -0,0 +1,51 @@
+"""
+Tests for out_of_core module.
+"""
+import pytest
+import numpy as np
+from src.impute import knn_impute
+from src.matrix_store import MatrixStore
+from src.out_of_core import knn_impute_out_of_core, preprocess_store
+from src.preprocess import Preprocessor
+
+
+@pytest.mark.parametrize("method", ["auto", "pareto", "range"])
+def test_preprocess_store_matches_in_memory(tmp_path, method):
+    """Test chunked store-to-store preprocessing against Preprocessor.fit_transform."""
+    rng = np.random.default_rng(0)
+    X = rng.lognormal(3, 1, size=(30, 23))
+    X[rng.random(X.shape) < 0.1] = np.nan
+    X[rng.random(X.shape) < 0.05] = 0.0
+    X[:, 7] = 5.0  # constant column (range scaling → all NaN)
+    store = MatrixStore(tmp_path)
+    compounds = [f"C{i}" for i in range(23)]
+    store.write("raw", X, [f"S{i}" for i in range(30)], compounds)
+
+    ref = Preprocessor(method, knn_k=3)
+    expected = ref.fit_transform(X)
+    # 30 rows × 32 bytes per cell → 5 columns per chunk
+    pre = preprocess_store(store, scale_method=method, memory_budget=30 * 32 * 5)
+
+    result, _, c_idx = store.read("preprocessed")
+    np.testing.assert_allclose(result, expected, rtol=1e-12, equal_nan=True)
+    assert list(c_idx) == compounds and pre.feature_names_ == compounds
+    assert pre.minpos_ == ref.minpos_
+    new = rng.lognormal(3, 1, size=(4, 23))
+    np.testing.assert_allclose(pre.transform(new), ref.transform(new), rtol=1e-12, equal_nan=True)
+
+
+def test_knn_impute_out_of_core_matches_knn_impute():
+    """Test chunked in-place KNN imputation against knn_impute."""
+    rng = np.random.default_rng(1)
+    X = rng.normal(size=(25, 18))
+    X[1] = X[0]  # zero distance -> infinite weight branch
+    X[:, 6:] = np.where(rng.random((25, 12)) < 0.3, np.nan, X[:, 6:])
+    expected = knn_impute(X, k=3)
+
+    out = X.copy()
+    n_imputed = knn_impute_out_of_core(out, k=3, memory_budget=25 * 32 * 4)
+    np.testing.assert_allclose(out, expected, rtol=1e-10, equal_nan=True)
+    assert n_imputed == int(np.isnan(X).sum() - np.isnan(expected).sum())
+
+    with pytest.raises(ValueError):
+        knn_impute_out_of_core(np.full((3, 2), np.nan))
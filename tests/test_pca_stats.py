@@ -1,56 +1,231 @@
-"""
-Tests for PCA and stats utilities.
-"""
-import pytest
-import pandas as pd
-import numpy as np
-from src.pca_utils import run_pca_cimcb
-from src.stats_utils import univariate_2class_wrapper
-
-
-def test_run_pca_cimcb_no_crash():
-    """Test that PCA function doesn't crash with synthetic data."""
-    Xknn = np.random.randn(20, 50)
-    group_label = pd.Series(["A"] * 10 + ["B"] * 10)
-
-    # Should not raise
-    try:
-        run_pca_cimcb(Xknn, group_label, pcx=1, pcy=2)
-    except Exception as e:
-        pytest.fail(f"PCA function raised exception: {e}")
-
-
-def test_univariate_2class_synthetic():
-    """Test univariate_2class_wrapper with synthetic data."""
-    # Synthetic hoja2
-    hoja2 = pd.DataFrame(
-        {
-            "Idx": range(1, 21),
-            "Class": ["Healthy"] * 10 + ["Diabetes"] * 10,
-            "SampleID": [f"S{i}" for i in range(1, 21)],
-            "compound_001": np.random.rand(20),
-            "compound_002": np.random.rand(20),
-            "compound_003": np.random.rand(20),
-        }
-    )
-
-    # Synthetic hoja3
-    hoja3 = pd.DataFrame(
-        {
-            "Idx": [1, 2, 3],
-            "Name": ["compound_001", "compound_002", "compound_003"],
-            "Label": ["Glucose", "Lactate", "Pyruvate"],
-        }
-    )
-
-    stats_full, stats_filt = univariate_2class_wrapper(
-        hoja2,
-        hoja3,
-        group_col="Class",
-        posclass="Diabetes",
-        parametric=True,
-        pvalue_threshold=0.05,
-    )
-
-    assert isinstance(stats_full, pd.DataFrame), "Expected DataFrame"
-    assert isinstance(stats_filt, pd.DataFrame), "Expected filtered DataFrame"
+"""
+Tests for PCA and stats utilities.
+"""
+import pytest
+import pandas as pd
+import numpy as np
+from sklearn.decomposition import PCA
+from src.pca_utils import (
+    IncrementalPCAModel,
+    PCAModel,
+    choose_pca_solver,
+    compare_pca,
+    compound_annotations,
+    run_pca_cimcb,
+    top_loadings,
+)
+import cimcb_lite as cb
+from src.stats_utils import bh_qvalues, univariate_2class, univariate_2class_wrapper
+
+
+def test_run_pca_cimcb_no_crash():
+    """Test that PCA function doesn't crash with synthetic data."""
+    Xknn = np.random.randn(20, 50)
+    group_label = pd.Series(["A"] * 10 + ["B"] * 10)
+
+    # Should not raise
+    try:
+        run_pca_cimcb(Xknn, group_label, pcx=1, pcy=2)
+    except Exception as e:
+        pytest.fail(f"PCA function raised exception: {e}")
+
+
+def test_pca_model_matches_sklearn_and_reuses_fit():
+    """Test PCAModel scores/loadings vs sklearn, PC pairs, projection and float32."""
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(30, 12)) @ rng.normal(size=(12, 40))
+    model = PCAModel(n_components=5).fit(X)
+    ref = PCA(n_components=5, svd_solver="full").fit(X)
+
+    assert model.solver_ == "full"
+    np.testing.assert_allclose(model.scores_, ref.transform(X), atol=1e-8)
+    np.testing.assert_allclose(model.explained_variance_ratio_, ref.explained_variance_ratio_)
+    assert model.loadings_.shape == (40, 5)
+    np.testing.assert_allclose(model.transform(X[:3]), model.scores_[:3], atol=1e-8)
+
+    scores, var = model.pair(3, 1)
+    np.testing.assert_array_equal(scores, model.scores_[:, [2, 0]])
+    assert var[1] == model.explained_variance_ratio_[0]
+    with pytest.raises(ValueError):
+        model.pair(1, 6)
+
+    # Randomized and truncated solvers recover the same (rank-12) subspace
+    for solver in ("randomized", "arpack"):
+        other = PCAModel(n_components=5, solver=solver).fit(X)
+        np.testing.assert_allclose(np.abs(other.scores_), np.abs(model.scores_), rtol=1e-6, atol=1e-6)
+    lite = PCAModel(n_components=5, dtype=np.float32).fit(X)
+    assert lite.scores_.dtype == np.float32
+    np.testing.assert_allclose(lite.explained_variance_ratio_, ref.explained_variance_ratio_, rtol=1e-4)
+
+    assert choose_pca_solver(180, 1486, 10) == "full"
+    assert choose_pca_solver(10000, 20000, 10) == "randomized"
+    assert choose_pca_solver(10000, 20000, 2000) == "arpack"
+
+
+def test_incremental_pca_memmap_matches_full_refit(tmp_path):
+    """Test batch-wise IncrementalPCAModel on a memmap against a full PCAModel refit."""
+    rng = np.random.default_rng(1)
+    latent = rng.normal(size=(400, 4)) * np.array([8.0, 5.0, 3.0, 2.0])
+    basis = np.linalg.qr(rng.normal(size=(60, 4)))[0]
+    X = latent @ basis.T + 0.1 * rng.normal(size=(400, 60))
+    np.save(tmp_path / "X.npy", X)
+    Xm = np.load(tmp_path / "X.npy", mmap_mode="r")
+
+    inc = IncrementalPCAModel(n_components=3, batch_size=62).fit(Xm)  # short tail merged
+    ref = PCAModel(n_components=3).fit(X)
+    table = compare_pca(inc, ref, X)
+    assert inc.n_samples_seen_ == 400 and inc.scores_.shape == (400, 3)
+    assert (table["abs_cosine"] > 0.999).all() and (table["score_corr"] > 0.999).all()
+    np.testing.assert_allclose(table["var_ratio"], table["var_ratio_ref"], atol=1e-3)
+    assert table.attrs["max_subspace_angle_deg"] < 2.0
+
+    # Streaming: tiny batches are buffered, scores must be refreshed
+    stream = IncrementalPCAModel(n_components=3)
+    for batch in (X[:2], X[2:150], X[150:]):
+        stream.partial_fit(batch)
+    assert stream.n_samples_seen_ == 400
+    with pytest.raises(ValueError):
+        stream.pair(1, 2)
+    stream.refresh_scores(X)
+    assert stream.pair(1, 2)[0].shape == (400, 2)
+
+
+def test_top_loadings_matches_full_sort_and_cos2():
+    """Test argpartition top-k against a full sort, squared cosines and dictionary labels."""
+    rng = np.random.default_rng(2)
+    X = rng.normal(size=(50, 8)) @ rng.normal(size=(8, 30)) + rng.normal(size=(50, 30))
+    names = [f"compound_{j:04d}" for j in range(30)]
+    model = PCAModel(n_components=4).fit(X)
+    data_dict = pd.DataFrame({
+        "compound_id": [n.upper() for n in names],  # matched after normalization
+        "BIOCHEMICAL": [f"metabolite {j}" for j in range(30)],
+    })
+
+    table = top_loadings(model, names, k=5, components=[2, 1], annotations=compound_annotations(data_dict))
+    assert list(table["component"].unique()) == ["PC2", "PC1"] and len(table) == 10
+    pc2 = table[table["component"] == "PC2"]
+    expected = np.argsort(-np.abs(model.components_[1]))[:5]
+    assert list(pc2["feature"]) == [names[j] for j in expected]
+    assert list(pc2["BIOCHEMICAL"]) == [f"metabolite {j}" for j in expected]
+
+    # cos2 is the squared correlation between the compound and the component scores
+    j = expected[0]
+    r = np.corrcoef(X[:, j], model.scores_[:, 1])[0, 1]
+    assert pc2["cos2"].iloc[0] == pytest.approx(r**2)
+    full = top_loadings(model, names, k=30)
+    np.testing.assert_allclose(full.groupby("component")["contribution"].sum(), 100.0)
+
+    restored = PCAModel.from_state(*model.get_state())
+    np.testing.assert_allclose(top_loadings(restored, names, k=5)["cos2"], top_loadings(model, names, k=5)["cos2"])
+    inc = IncrementalPCAModel(n_components=2, batch_size=20).fit(X)
+    np.testing.assert_allclose(inc.feature_var_, X.var(axis=0, ddof=1))
+    with pytest.raises(ValueError):
+        top_loadings(model, names[:-1])
+
+
+def test_univariate_2class_synthetic():
+    """Test univariate_2class_wrapper with synthetic data."""
+    # Synthetic hoja2
+    hoja2 = pd.DataFrame(
+        {
+            "Idx": range(1, 21),
+            "Class": ["Healthy"] * 10 + ["Diabetes"] * 10,
+            "SampleID": [f"S{i}" for i in range(1, 21)],
+            "compound_001": np.random.rand(20),
+            "compound_002": np.random.rand(20),
+            "compound_003": np.random.rand(20),
+        }
+    )
+
+    # Synthetic hoja3
+    hoja3 = pd.DataFrame(
+        {
+            "Idx": [1, 2, 3],
+            "Name": ["compound_001", "compound_002", "compound_003"],
+            "Label": ["Glucose", "Lactate", "Pyruvate"],
+        }
+    )
+
+    stats_full, stats_filt = univariate_2class_wrapper(
+        hoja2,
+        hoja3,
+        group_col="Class",
+        posclass="Diabetes",
+        parametric=True,
+        pvalue_threshold=0.05,
+    )
+
+    assert isinstance(stats_full, pd.DataFrame), "Expected DataFrame"
+    assert isinstance(stats_filt, pd.DataFrame), "Expected filtered DataFrame"
+
+
+def _two_class_tables(n0=30, n1=25, n_features=20, seed=0):
+    """Synthetic cimcb-style data/peak tables with missing values and ties."""
+    rng = np.random.default_rng(seed)
+    X = rng.lognormal(size=(n0 + n1, n_features))
+    X[:, :3] = np.round(X[:, :3])
+    X[rng.random(X.shape) < 0.1] = np.nan
+    names = [f"M{i:03d}" for i in range(n_features)]
+    data = pd.DataFrame(X, columns=names)
+    data.insert(0, "Class", ["A"] * n0 + ["B"] * n1)
+    data.insert(0, "SampleID", [f"S{i}" for i in range(n0 + n1)])
+    data.insert(0, "Idx", range(1, n0 + n1 + 1))
+    peaks = pd.DataFrame({"Idx": range(1, n_features + 1), "Name": names, "Label": names})
+    return data, peaks
+
+
+@pytest.mark.parametrize("parametric", [True, False])
+@pytest.mark.parametrize("sizes", [(30, 25), (6, 7)])
+def test_univariate_2class_matches_cimcb(parametric, sizes):
+    """Vectorized engine reproduces cimcb_lite's table (NaNs, ties, exact Mann-Whitney)."""
+    data, peaks = _two_class_tables(*sizes)
+    ref = cb.utils.univariate_2class(data, peaks, "Class", "B", parametric=parametric, seed=1)
+    out = univariate_2class(data, peaks, "Class", "B", parametric=parametric, seed=1)
+
+    assert list(out.columns) == list(ref.columns)
+    assert list(out.index) == list(ref.index)
+    for col in ref.columns[3:]:
+        expected, actual = ref[col], out[col]
+        if expected.dtype == object:  # 95% CI tuples
+            expected, actual = expected.tolist(), actual.tolist()
+        np.testing.assert_allclose(
+            np.asarray(actual, float), np.asarray(expected, float), rtol=1e-7, atol=1e-10, err_msg=col
+        )
+
+
+def test_univariate_2class_welch_and_checks():
+    """Welch option matches SciPy; bad groups raise ValueError."""
+    from scipy import stats
+
+    data, peaks = _two_class_tables()
+    out = univariate_2class(data, peaks, "Class", "B", equal_var=False)
+    X = data[peaks["Name"]].to_numpy()
+    ref = stats.ttest_ind(X[:30], X[30:], equal_var=False, nan_policy="omit")
+    np.testing.assert_allclose(out["TTestPvalue"], np.asarray(ref.pvalue))
+
+    with pytest.raises(ValueError):
+        univariate_2class(data, peaks, "Class", "C")
+    with pytest.raises(ValueError):
+        univariate_2class(data.assign(Class=["A", "B", "C"] * 18 + ["A"]), peaks, "Class", "B")
+
+
+def test_bh_qvalues_skips_nan():
+    """BH q-values match statsmodels and leave NaN p-values out of the correction."""
+    from statsmodels.stats.multitest import multipletests
+
+    p = np.array([0.01, 0.04, 0.03, 0.2, 0.5])
+    np.testing.assert_allclose(bh_qvalues(p), multipletests(p, method="fdr_bh")[1])
+    q = bh_qvalues(np.append(p, np.nan))
+    assert np.isnan(q[-1])
+    np.testing.assert_allclose(q[:-1], multipletests(p, method="fdr_bh")[1])
+
+
+def test_univariate_wrapper_nonparametric_sorts_by_mannwhitney():
+    """Non-parametric runs sort and filter on MannWhitneyPvalue."""
+    data, peaks = _two_class_tables()
+    data["Class"] = data["Class"].map({"A": "Healthy", "B": "Diabetes"})
+    full, filtered = univariate_2class_wrapper(data, peaks, posclass="Diabetes", parametric=False, pvalue_threshold=1.0)
+    assert full["MannWhitneyPvalue"].is_monotonic_increasing
+    assert (filtered["Sign"] == 1).all()
+    with pytest.raises(ValueError):
+        univariate_2class_wrapper(data, peaks, posclass="Diabetes", engine="R")
@@ -0,0 +1,33 @@
+"""
+Tests for pca_store module.
+"""
+import numpy as np
+from src.pca_store import PCAResultStore
+from src.pca_utils import PCAModel
+from src.preprocess import feature_cache_key, preprocess_cached
+
+
+def test_pca_store_hit_and_subset_slicing(tmp_path):
+    """Test that a stored result is reused and subsets are fitted on sliced rows."""
+    rng = np.random.default_rng(0)
+    X = rng.lognormal(3, 1, size=(30, 12))
+    data_key = feature_cache_key(X, "auto", 3, 0.5)
+    Xknn = preprocess_cached(X, cache_dir=tmp_path / "features", key=data_key)
+    store = PCAResultStore(tmp_path / "pca")
+
+    first = store.get_or_fit(Xknn, data_key, n_components=3)
+    again = store.get_or_fit(None, data_key, n_components=3)  # hit: the matrix is not read
+    assert store.cache.hits == 1 and store.cache.misses == 1
+    np.testing.assert_allclose(again.scores_, first.scores_)
+
+    rows = np.arange(0, 30, 2)
+    subset = store.get_or_fit(Xknn, data_key, rows=rows, n_components=3)
+    expected = PCAModel(n_components=3).fit(Xknn[rows])
+    np.testing.assert_allclose(np.abs(subset.scores_), np.abs(expected.scores_), atol=1e-10)
+
+    assert len({
+        store.key(data_key, n_components=3),
+        store.key(data_key, rows, n_components=3),
+        store.key(data_key, n_components=2),
+        store.key(data_key, n_components=3, incremental=True, batch_size=10),
+    }) == 4
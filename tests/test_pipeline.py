@@ -0,0 +1,90 @@
+"""
+Tests for pipeline module.
+"""
+import json
+import time
+import pytest
+import pandas as pd
+import numpy as np
+from src.cache import DiskCache
+from src.config import get_config
+from src.pipeline import Stage, build_stages, run_pipeline, write_artifacts
+
+
+def test_run_pipeline_concurrency_caching_and_invalidation(tmp_path):
+    """Test concurrent independent stages, cache hits and upstream invalidation."""
+    calls = []
+
+    def source(_):
+        calls.append("source")
+        return {"x": np.arange(5.0)}
+
+    def slow(name):
+        def fn(inputs):
+            calls.append(name)
+            time.sleep(0.2)
+            return {name: pd.DataFrame({"v": inputs["x"] * len(name)})}
+        return fn
+
+    def stages(offset=0):
+        return [
+            Stage("b", slow("b"), deps=["src"], artifacts=["b"]),
+            Stage("src", source, params={"offset": offset}),
+            Stage("cc", slow("cc"), deps=["src"], artifacts=["cc"]),
+        ]
+
+    cache = DiskCache(tmp_path / "cache")
+    outputs, timings = run_pipeline(stages(), "root", cache=cache, n_jobs=2)
+    assert timings["b"]["start"] < timings["cc"]["end"] and timings["cc"]["start"] < timings["b"]["end"]
+    assert list(outputs["cc"]["cc"]["v"]) == [0.0, 2.0, 4.0, 6.0, 8.0]
+
+    calls.clear()
+    outputs, timings = run_pipeline(stages(), "root", cache=cache)
+    assert calls == [] and all(t["cached"] for t in timings.values())
+    np.testing.assert_array_equal(outputs["src"]["x"], np.arange(5.0))
+
+    run_pipeline(stages(offset=1), "root", cache=cache)
+    assert sorted(calls) == ["b", "cc", "source"]
+
+    manifest = json.loads(write_artifacts(stages(), outputs, timings, tmp_path / "out", fmt="csv").read_text())
+    assert manifest["artifacts"]["b"]["rows"] == 5 and (tmp_path / "out" / "cc.csv").exists()
+    assert set(manifest["stages"]) == {"src", "b", "cc"}
+
+    with pytest.raises(ValueError):
+        run_pipeline([Stage("a", source, deps=["z"]), Stage("z", source, deps=["a"])], "root")
+
+
+def test_build_stages_writes_pca_and_stats_tables(tmp_path):
+    """Test the analysis DAG on synthetic sheets (load stage replaced)."""
+    rng = np.random.default_rng(0)
+    samples = [f"S{i}" for i in range(20)]
+    compounds = [f"compound_{j:03d}" for j in range(12)]
+    values = rng.lognormal(5, 1, size=(12, 20))
+    values[:4, :10] *= 4.0
+    matrix = pd.DataFrame(values, columns=samples)
+    matrix.insert(0, "compound_id", compounds)
+    data_dict = pd.DataFrame({"compound_id": compounds, "BIOCHEMICAL": [f"m{j}" for j in range(12)]})
+    meta = pd.DataFrame({"sample_id": samples, "Health": ["diabetic"] * 10 + ["Healthy"] * 10})
+
+    config = get_config("missing.yaml")
+    config["pca"]["n_components"] = 3
+    stages = build_stages(config)
+    stages[0] = Stage("load", lambda _: {"meta": meta, "matrix": matrix, "data_dict": data_dict}, cache=False)
+    cache = DiskCache(tmp_path / "cache")
+    outputs, timings = run_pipeline(stages, "synthetic", cache=cache)
+    write_artifacts(stages, outputs, timings, tmp_path, fmt="parquet")
+
+    # Warm run: tables come back from Parquet/JSON (no pickles) equal to the cold run
+    warm, warm_timings = run_pipeline(stages, "synthetic", cache=cache)
+    assert warm_timings["stats_diabetes"]["cached"] and not list((tmp_path / "cache").glob("*/*.pkl"))
+    for stage, name in [("features", "hoja2"), ("features", "annotations"), ("stats_diabetes", "stats_diabetes")]:
+        pd.testing.assert_frame_equal(warm[stage][name], outputs[stage][name])
+    assert warm["features"]["peaklist"] == outputs["features"]["peaklist"]
+    assert isinstance(warm["stats_diabetes"]["stats_diabetes"].iloc[0]["Grp0_Mean-95CI"], tuple)
+
+    scores = pd.read_parquet(tmp_path / "pca_scores.parquet")
+    loadings = pd.read_parquet(tmp_path / "pca_loadings.parquet")
+    assert list(scores.columns) == ["SampleID", "Class", "PC1", "PC2", "PC3"] and len(scores) == 20
+    assert loadings.loc[0, "BIOCHEMICAL"] == "m0" and len(loadings) == 12
+    stats = pd.read_parquet(tmp_path / "stats_diabetes.parquet")
+    assert len(stats) == 12 and set(stats["Name"]) == set(compounds)
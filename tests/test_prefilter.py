@@ -0,0 +1,58 @@
+"""
+Tests for prefilter module.
+"""
+import numpy as np
+import pandas as pd
+from src.config import get_prefilter_settings
+from src.prefilter import prefilter_features, prefilter_from_settings
+from src.preprocess import build_feature_matrix
+
+
+def _matrix():
+    rng = np.random.default_rng(0)
+    X = rng.lognormal(5, 0.1, size=(20, 5))
+    X[:12, 1] = np.nan  # 60% missing
+    X[:, 2] = 100.0  # constant
+    X[:4, 3] = [1.0, 100.0, 1.0, 100.0]  # unstable across QC samples
+    X[4:, 4] = 0.0  # mostly non-positive
+    return X
+
+
+def test_prefilter_features_reasons():
+    """Test each check and the per-compound report."""
+    X = _matrix()
+    qc = np.arange(20) < 4
+    keep, report = prefilter_features(
+        X, list("abcde"), max_missing_frac=0.5, min_variance=1e-4, max_qc_rsd=30, qc_mask=qc
+    )
+    assert keep.tolist() == [True, False, False, False, False]
+    reasons = dict(zip(report["compound"], report["reason"]))
+    assert reasons == {
+        "b": "missing,qc_rsd",  # never observed in QC samples
+        "c": "low_variance",
+        "d": "qc_rsd",
+        "e": "missing",
+    }
+
+    # Thresholds set to None disable their check
+    keep, report = prefilter_features(X, list("abcde"), max_missing_frac=0.5)
+    assert keep.tolist() == [True, False, True, True, False] and len(report) == 2
+
+
+def test_build_feature_matrix_prefilter_from_config():
+    """Test that build_feature_matrix drops compounds and stores the report."""
+    X = _matrix()
+    samples = [f"S{i}" for i in range(20)]
+    matrix = pd.DataFrame(X.T, columns=samples)
+    matrix.insert(0, "compound_id", list("abcde"))
+    data_dict = pd.DataFrame({"compound_id": list("abcde")})
+    meta = pd.DataFrame({"sample_id": samples, "Health": ["QC"] * 4 + ["Healthy"] * 16})
+
+    settings = get_prefilter_settings({"preprocessing": {"prefilter": {"enabled": True}}})
+    hoja2, Xknn, peaklist = build_feature_matrix(matrix, data_dict, meta, prefilter=settings)
+    assert peaklist == ["a"] and Xknn.shape == (20, 1)
+    assert len(hoja2.attrs["prefilter"]) == 4
+    assert list(hoja2.columns[1:6]) == list("abcde")  # raw columns are kept
+
+    keep, report = prefilter_from_settings(X, list("abcde"), get_prefilter_settings({}))
+    assert keep.all() and report.empty  # disabled by default
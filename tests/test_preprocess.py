@@ -1,48 +1,171 @@
-"""
-Tests for preprocess module.
-"""
-import pytest
-import pandas as pd
-import numpy as np
-from src.preprocess import build_feature_matrix
-
-
-def test_build_feature_matrix_synthetic():
-    """Test build_feature_matrix with synthetic data."""
-    # Synthetic data_matrix (compounds as rows, samples as columns)
-    matrix = pd.DataFrame(
-        {
-            "compound_id": ["compound_001", "compound_002", "compound_003"],
-            "S1": [100, 200, 300],
-            "S2": [150, 250, 350],
-            "S3": [120, 220, 320],
-        }
-    )
-
-    # Synthetic data_dict
-    data_dict = pd.DataFrame(
-        {
-            "compound_id": ["compound_001", "compound_002", "compound_003"],
-            "BIOCHEMICAL": ["Glucose", "Lactate", "Pyruvate"],
-            "SUPER_PATHWAY": ["Carbohydrate", "Carbohydrate", "Carbohydrate"],
-        }
-    )
-
-    # Synthetic sample_metadata
-    meta = pd.DataFrame(
-        {
-            "sample_id": ["S1", "S2", "S3"],
-            "Health": ["Healthy", "Diabetes", "Healthy"],
-            "BMI": [22, 30, 25],
-            "hba1c": [5.0, 7.5, 5.5],
-        }
-    )
-
-    hoja2, Xknn, peaklist = build_feature_matrix(
-        matrix, data_dict, meta, scale_method="auto", knn_k=3, log_offset=0.5
-    )
-
-    assert hoja2.shape[0] == 3, "Expected 3 samples"
-    assert Xknn.shape[0] == 3, "Expected 3 samples in Xknn"
-    assert Xknn.shape[1] > 0, "Expected at least one feature"
-    assert not np.isnan(Xknn).any(), "Xknn should have no NaNs after imputation"
+"""
+Tests for preprocess module.
+"""
+import pytest
+import pandas as pd
+import numpy as np
+from src.preprocess import (
+    Preprocessor,
+    build_feature_matrix,
+    build_feature_matrix_cached,
+    extract_sample_block,
+    feature_cache_key,
+    load_cached_preprocessor,
+    match_peaklist,
+    sample_feature_block,
+    preprocess_cached,
+)
+
+
+def test_build_feature_matrix_synthetic():
+    """Test build_feature_matrix with synthetic data."""
+    # Synthetic data_matrix (compounds as rows, samples as columns)
+    matrix = pd.DataFrame(
+        {
+            "compound_id": ["compound_001", "compound_002", "compound_003"],
+            "S1": [100, 200, 300],
+            "S2": [150, 250, 350],
+            "S3": [120, 220, 320],
+        }
+    )
+
+    # Synthetic data_dict
+    data_dict = pd.DataFrame(
+        {
+            "compound_id": ["compound_001", "compound_002", "compound_003"],
+            "BIOCHEMICAL": ["Glucose", "Lactate", "Pyruvate"],
+            "SUPER_PATHWAY": ["Carbohydrate", "Carbohydrate", "Carbohydrate"],
+        }
+    )
+
+    # Synthetic sample_metadata
+    meta = pd.DataFrame(
+        {
+            "sample_id": ["S1", "S2", "S3"],
+            "Health": ["Healthy", "Diabetes", "Healthy"],
+            "BMI": [22, 30, 25],
+            "hba1c": [5.0, 7.5, 5.5],
+        }
+    )
+
+    hoja2, Xknn, peaklist = build_feature_matrix(
+        matrix, data_dict, meta, scale_method="auto", knn_k=3, log_offset=0.5
+    )
+
+    assert hoja2.shape[0] == 3, "Expected 3 samples"
+    assert Xknn.shape[0] == 3, "Expected 3 samples in Xknn"
+    assert Xknn.shape[1] > 0, "Expected at least one feature"
+    assert not np.isnan(Xknn).any(), "Xknn should have no NaNs after imputation"
+
+
+def test_preprocessor_projects_new_samples(tmp_path):
+    """Test that a saved Preprocessor reproduces fit_transform and projects new samples."""
+    rng = np.random.default_rng(0)
+    X = rng.lognormal(3, 1, size=(30, 8))
+    X[rng.random(X.shape) < 0.1] = 0  # zeros are replaced before the log
+    names = [f"c{i}" for i in range(8)]
+
+    pre = Preprocessor("pareto", knn_k=3)
+    fitted = pre.fit_transform(X, feature_names=names)
+    loaded = Preprocessor.load(pre.save(tmp_path / "pre.npz"))
+
+    # Projecting the cohort (no missing values after the log) matches fitting
+    np.testing.assert_allclose(loaded.transform(X), fitted)
+    assert loaded.minpos_ == pre.minpos_ and loaded.feature_names_ == names
+
+    # New batch as a DataFrame with shuffled columns and a missing cell (offset like zeros)
+    new = pd.DataFrame(X[:2, ::-1], columns=names[::-1])
+    new.iloc[0, 0] = np.nan
+    out = loaded.transform(new)
+    assert out.shape == (2, 8) and not np.isnan(out).any()
+
+    with pytest.raises(ValueError):
+        Preprocessor().transform(X)
+
+
+def test_feature_cache_hits_across_instances(tmp_path):
+    """Test that cached preprocessing is reused and keyed on inputs and parameters."""
+    rng = np.random.default_rng(2)
+    samples = [f"S{i}" for i in range(12)]
+    matrix = pd.DataFrame(rng.lognormal(3, 1, size=(5, 12)), columns=samples)
+    matrix.insert(0, "compound_id", [f"c{i}" for i in range(5)])
+    data_dict = pd.DataFrame({"compound_id": matrix["compound_id"], "BIOCHEMICAL": list("abcde")})
+    meta = pd.DataFrame({"sample_id": samples, "Health": ["Healthy", "Diabetes"] * 6})
+
+    expected = build_feature_matrix(matrix, data_dict, meta, scale_method="pareto")
+    first = build_feature_matrix_cached(matrix, data_dict, meta, "pareto", cache_dir=tmp_path)
+    second = build_feature_matrix_cached(matrix, data_dict, meta, "pareto", cache_dir=tmp_path)
+    assert isinstance(second[1], np.memmap)
+    for result in (first, second):
+        pd.testing.assert_frame_equal(result[0], expected[0])
+        np.testing.assert_array_equal(result[1], expected[1])
+        assert result[2] == expected[2]
+
+    # Different parameters or data -> new entry
+    build_feature_matrix_cached(matrix, data_dict, meta, "auto", cache_dir=tmp_path)
+    X = matrix.iloc[:, 1:].to_numpy().T
+    np.testing.assert_allclose(preprocess_cached(X, "pareto", cache_dir=tmp_path), expected[1])
+    np.testing.assert_allclose(preprocess_cached(X, "pareto", cache_dir=tmp_path), expected[1])
+    assert len(list(tmp_path.glob("*/_entry.json"))) == 3
+    assert not list(tmp_path.glob("*/*.pkl"))
+
+    # The prefilter report in hoja2.attrs survives the Parquet round trip
+    matrix.iloc[0, 1:] = 5.0  # constant compound → dropped by min_variance
+    prefilter = {"enabled": True, "max_missing_frac": 0.5, "min_variance": 1e-4, "max_qc_rsd": None, "qc_label": "QC"}
+    cold = build_feature_matrix_cached(matrix, data_dict, meta, "pareto", cache_dir=tmp_path, prefilter=prefilter)
+    warm = build_feature_matrix_cached(matrix, data_dict, meta, "pareto", cache_dir=tmp_path, prefilter=prefilter)
+    assert len(cold[0].attrs["prefilter"]) == 1
+    pd.testing.assert_frame_equal(warm[0].attrs["prefilter"], cold[0].attrs["prefilter"])
+    assert warm[2] == cold[2] == ["c1", "c2", "c3", "c4"]
+
+
+def test_load_cached_preprocessor_reuses_fit(tmp_path):
+    """Test that preprocess_cached stores its fitted preprocessor for later projection."""
+    rng = np.random.default_rng(3)
+    raw = pd.DataFrame(rng.lognormal(3, 1, size=(15, 6)), columns=[f"c{i}" for i in range(6)])
+    X = raw.to_numpy()
+    key = feature_cache_key(X, "auto", 3, 0.5)
+    assert load_cached_preprocessor(key, cache_dir=tmp_path) is None
+
+    Xknn = preprocess_cached(X, "auto", cache_dir=tmp_path, key=key)
+    pre = load_cached_preprocessor(key, cache_dir=tmp_path, feature_names=raw.columns)
+    assert pre.feature_names_ == list(raw.columns)
+    np.testing.assert_allclose(pre.transform(raw[raw.columns[::-1]].iloc[:4]), Xknn[:4], atol=1e-10)
+
+
+def test_extract_sample_block_typed_and_shared_with_hoja2():
+    """Test typed extraction (with coercion of text cells) and the zero-copy hoja2 view."""
+    matrix = pd.DataFrame(
+        {
+            "compound_id": ["c1", "c2", "c3"],
+            "S1": [1.0, np.nan, 3.0],
+            "S2": ["4", "bad", 6],  # object column: coerced in one call
+            "S3": pd.array([7, None, 9], dtype="Int64"),
+        }
+    )
+    block = extract_sample_block(matrix, [1, 2, 3])
+    expected = np.array([[1, np.nan, 3], [4, np.nan, 6], [7, np.nan, 9]], dtype=float)
+    np.testing.assert_array_equal(block, expected)
+    assert block.flags.c_contiguous
+
+    meta = pd.DataFrame({"sample_id": ["S1", "S2", "S3"], "Health": ["Healthy", "Diabetes", "Healthy"]})
+    data_dict = pd.DataFrame({"compound_id": ["c1", "c2", "c3"]})
+    hoja2, _, peaklist = build_feature_matrix(matrix, data_dict, meta, knn_k=1)
+    assert list(hoja2.columns) == ["SampleID", "c1", "c2", "c3", "Idx", "Class"]
+    assert hoja2[peaklist].dtypes.eq(np.float64).all()
+    assert hoja2["Class"].tolist() == ["Healthy", "Diabetes", "Healthy"]
+
+
+def test_sample_feature_block_and_match_peaklist():
+    """Test the typed split used by the PCA page and normalized compound matching."""
+    matrix = pd.DataFrame({"compound_id": ["Comp-1", "comp 2"], "S2": [1.0, 2.0], "S1": [3.0, 4.0]})
+    meta = pd.DataFrame({"sample_id": ["S1", "S2"], "Health": ["Healthy", "Diabetes"]})
+
+    info, block, compounds = sample_feature_block(matrix, meta)
+    assert info["Class"].tolist() == ["Diabetes", "Healthy"]  # matrix order, matched by label
+    np.testing.assert_array_equal(block, [[1.0, 2.0], [3.0, 4.0]])
+
+    data_dict = pd.DataFrame({"compound_id": ["COMP_2", "missing", "comp_1"]})
+    positions, peaklist_raw = match_peaklist(compounds, data_dict)
+    assert positions == [1, 0] and len(peaklist_raw) == 3
+    assert match_peaklist(compounds, pd.DataFrame({"compound_id": ["x"]}))[0] == [0, 1]
@@ -0,0 +1,60 @@
+"""
+Tests for projection module.
+"""
+import io
+import pytest
+import pandas as pd
+import numpy as np
+from src.pca_utils import IncrementalPCAModel, PCAModel
+from src.preprocess import Preprocessor
+from src.projection import PCAArtifact, samples_frame
+
+
+def _cohort(n_samples=30, n_compounds=12):
+    rng = np.random.default_rng(0)
+    X = rng.lognormal(4, 1, size=(n_samples, n_compounds))
+    X[rng.random(X.shape) < 0.05] = 0.0
+    names = [f"C{j}" for j in range(n_compounds)]
+    return pd.DataFrame(X, columns=names)
+
+
+def test_pca_artifact_roundtrip_and_projection(tmp_path):
+    """Test save/load and that projecting cohort samples reproduces their scores."""
+    raw = _cohort()
+    pre = Preprocessor("pareto")
+    model = PCAModel(n_components=4).fit(pre.fit_transform(raw))
+    labels = ["Healthy", "Diabetes"] * 15
+    artifact = PCAArtifact(pre, model, labels=labels, sample_ids=range(30), metadata={"source": "t"})
+
+    loaded = PCAArtifact.load(artifact.save(tmp_path / "pca.npz"))
+    assert (tmp_path / "pca.npz").read_bytes()[:4] == artifact.to_bytes()[:4]
+    in_memory = PCAArtifact.load(io.BytesIO(artifact.to_bytes()))
+    np.testing.assert_allclose(in_memory.model.components_, model.components_)
+    assert loaded.labels == labels and loaded.sample_ids[-1] == "29"
+    assert loaded.metadata["source"] == "t" and loaded.metadata["n_samples"] == 30
+    assert loaded.feature_names == list(raw.columns)
+    np.testing.assert_allclose(loaded.model.scores_, model.scores_)
+
+    # Reordered columns plus an unknown compound: aligned on fitted names
+    new = raw.iloc[[3, 7]][raw.columns[::-1]].assign(extra=1.0)
+    np.testing.assert_allclose(loaded.project(new), model.scores_[[3, 7]], atol=1e-10)
+    with pytest.raises(ValueError):
+        loaded.project(raw.drop(columns="C0"))
+
+
+def test_pca_artifact_from_incremental_model_and_samples_frame(tmp_path):
+    """Test artifacts of incremental models and parsing compounds × samples batches."""
+    raw = _cohort()
+    pre = Preprocessor("auto")
+    Xknn = pre.fit_transform(raw)
+    model = IncrementalPCAModel(n_components=3, batch_size=10).fit(Xknn)
+    loaded = PCAArtifact.load(PCAArtifact(pre, model).save(tmp_path / "inc.npz"))
+    assert type(loaded.model) is PCAModel and loaded.model.solver_ == "incremental"
+
+    matrix = raw.iloc[:2].T.reset_index().rename(columns={"index": "compound_id", 0: "N1", 1: "N2"})
+    frame = samples_frame(matrix)
+    assert list(frame.index) == ["N1", "N2"] and list(frame.columns) == list(raw.columns)
+    np.testing.assert_allclose(loaded.project(frame), model.scores_[:2], atol=1e-10)
+
+    with pytest.raises(ValueError):
+        PCAArtifact(pre, PCAModel(n_components=2).fit(Xknn[:, :5]))
@@ -0,0 +1,57 @@
+"""
+Tests for resampling module.
+"""
+import pytest
+import pandas as pd
+import numpy as np
+from sklearn.metrics import silhouette_score
+from src.resampling import _pairwise, bootstrap_pca, confidence_ellipse, silhouette_from_distances
+
+
+def _two_groups(n=40, p=30, shift=3.0, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, p))
+    X[: n // 2, :5] += shift
+    labels = ["A"] * (n // 2) + ["B"] * (n - n // 2)
+    return X, labels
+
+
+def test_silhouette_from_distances_matches_sklearn_and_ellipse():
+    """Test the batched silhouette against sklearn and the ellipse of a known cloud."""
+    rng = np.random.default_rng(1)
+    S = rng.normal(size=(30, 3))
+    codes = rng.integers(0, 3, size=(4, 30))
+    D = _pairwise(S)
+    expected = [silhouette_score(S, c) for c in codes]
+    np.testing.assert_allclose(silhouette_from_distances(D, codes), expected, atol=1e-8)
+    assert silhouette_from_distances(D, codes[0]) == pytest.approx(expected[0], abs=1e-8)
+
+    points = rng.normal(size=(20000, 2)) * [3.0, 1.0]
+    ell = confidence_ellipse(points, confidence=0.95)
+    assert ell["width"] == pytest.approx(2 * 3.0 * np.sqrt(5.991), rel=0.03)
+    assert ell["height"] == pytest.approx(2 * 1.0 * np.sqrt(5.991), rel=0.03)
+    assert abs(np.cos(np.radians(ell["angle"]))) == pytest.approx(1.0, abs=1e-3)
+
+
+def test_bootstrap_pca_separation_and_parallel_reproducibility():
+    """Test aligned bootstrap scores, p-values and that pooled runs match serial runs."""
+    X, labels = _two_groups()
+    res = bootstrap_pca(X, labels, n_boot=12, n_perm=199, n_jobs=1, random_state=3)
+    assert res["boot_scores"].shape == (12, 40, 2)
+    assert res["perm_pvalue"] == pytest.approx(1 / 200)
+    lo, hi = res["separation_ci"]
+    assert lo <= res["separation"] <= hi + 0.05
+    # Procrustes alignment keeps bootstrap scores on the reference orientation
+    ref = res["reference"].scores_[:, 0]
+    for scores in res["boot_scores"]:
+        assert np.corrcoef(scores[:, 0], ref)[0, 1] > 0.95
+    assert list(res["group_ellipses"]["Class"]) == ["A", "B"]
+    assert len(res["sample_ellipses"]) == 40 and res["throughput"]["fits"] == 12
+
+    pooled = bootstrap_pca(X, labels, n_boot=12, n_perm=199, n_jobs=2, random_state=3)
+    np.testing.assert_allclose(pooled["boot_scores"], res["boot_scores"])
+
+    null = bootstrap_pca(*_two_groups(shift=0.0), n_boot=0, n_perm=199, n_jobs=1)
+    assert null["perm_pvalue"] > 0.05 and null["boot_scores"].shape[0] == 0
+    with pytest.raises(ValueError):
+        bootstrap_pca(X, ["A"] * 40, n_boot=2)
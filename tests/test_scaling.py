@@ -0,0 +1,43 @@
+"""
+Tests for scaling module.
+"""
+import pytest
+import numpy as np
+import cimcb_lite as cb
+from src.scaling import SCALE_METHODS, Scaler, scale
+
+
+@pytest.mark.parametrize("method", SCALE_METHODS)
+def test_scale_matches_cimcb(method):
+    """Test that every method matches cb.utils.scale, NaNs included."""
+    rng = np.random.default_rng(0)
+    X = rng.lognormal(size=(30, 12))
+    X[rng.random(X.shape) < 0.1] = np.nan
+
+    expected = cb.utils.scale(X, method=method)
+    result = scale(X, method=method, block_size=5)
+    np.testing.assert_allclose(result, expected, rtol=1e-10, equal_nan=True)
+
+
+def test_scaler_inplace_float32_and_transform_new_samples():
+    """Test in-place float32 scaling and reuse of fitted parameters."""
+    rng = np.random.default_rng(1)
+    X = rng.normal(5, 2, size=(40, 6))
+    X32 = X.astype(np.float32)
+
+    scaler = Scaler("pareto").fit(X[:30])
+    out = scaler.transform(X32, copy=False)
+    assert out is X32 and out.dtype == np.float32
+
+    refit_free = scaler.transform(X[30:])
+    expected = (X[30:] - X[:30].mean(axis=0)) / np.sqrt(X[:30].std(axis=0, ddof=1))
+    np.testing.assert_allclose(refit_free, expected, rtol=1e-10)
+
+    restored = Scaler.from_params(scaler.get_params())
+    np.testing.assert_allclose(restored.transform(X[30:]), refit_free)
+
+
+def test_scaler_rejects_unknown_method():
+    """Test that an invalid method raises ValueError."""
+    with pytest.raises(ValueError):
+        Scaler("minmax")
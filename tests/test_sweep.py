@@ -0,0 +1,63 @@
+"""
+Tests for sweep and parallel modules.
+"""
+import pytest
+import pandas as pd
+import numpy as np
+from src.parallel import map_shared, worker_array, worker_context
+from src.preprocess import build_feature_matrix
+from src.pca_utils import pca_summary
+from src.sweep import parameter_grid, run_sweep
+
+
+def _row_sum(i):
+    return float(worker_array()[i].sum()) * worker_context()["factor"]
+
+
+def _frames(n_samples=24, n_compounds=15):
+    rng = np.random.default_rng(0)
+    samples = [f"S{i}" for i in range(n_samples)]
+    compounds = [f"compound_{j:03d}" for j in range(n_compounds)]
+    values = rng.lognormal(5, 1, size=(n_compounds, n_samples))
+    values[:5, : n_samples // 2] *= 4.0  # separates the two classes
+    matrix = pd.DataFrame(values, columns=samples)
+    matrix.insert(0, "compound_id", compounds)
+    data_dict = pd.DataFrame({"compound_id": compounds, "BIOCHEMICAL": compounds})
+    meta = pd.DataFrame(
+        {
+            "sample_id": samples,
+            "Health": ["Diabetes"] * (n_samples // 2) + ["Healthy"] * (n_samples - n_samples // 2),
+        }
+    )
+    return matrix, data_dict, meta
+
+
+def test_map_shared_process_pool_matches_serial():
+    """Test that pooled tasks read the shared array and context like a serial run."""
+    X = np.arange(20, dtype=float).reshape(5, 4)
+    expected = [float(r.sum()) * 2 for r in X]
+    assert map_shared(_row_sum, range(5), X, {"factor": 2}, n_jobs=2) == expected
+    assert map_shared(_row_sum, range(5), X, {"factor": 2}, n_jobs=1) == expected
+
+
+def test_run_sweep_matches_build_feature_matrix():
+    """Test the comparison table against build_feature_matrix + pca_summary per configuration."""
+    matrix, data_dict, meta = _frames()
+    grid = parameter_grid(["auto", "pareto"], [3], [0.5, 1.0])
+    table = run_sweep(matrix, data_dict, meta, grid=grid, n_jobs=2)
+
+    assert len(table) == 4 and table.attrs["n_compounds"] == 15
+    assert list(table[["scale_method", "log_offset"]].itertuples(index=False, name=None)) == [
+        ("auto", 0.5), ("auto", 1.0), ("pareto", 0.5), ("pareto", 1.0)
+    ]
+    for row in table.itertuples():
+        hoja2, Xknn, _ = build_feature_matrix(
+            matrix, data_dict, meta, row.scale_method, row.knn_k, row.log_offset
+        )
+        summary = pca_summary(Xknn, hoja2["Class"])
+        assert row.pc1_var == pytest.approx(summary["pc1_var"])
+        assert row.silhouette == pytest.approx(summary["silhouette"])
+    assert (table["silhouette"] > 0).all()
+
+    with pytest.raises(ValueError):
+        parameter_grid(["zscore"])
@@ -0,0 +1,38 @@
+"""
+Tests for viz module.
+"""
+import numpy as np
+from src.config import get_viz_settings
+from src.pca_utils import PCAModel
+from src.viz import downsample_points, pca_scores_figure
+
+
+def test_downsample_points_keeps_outliers_and_small_groups():
+    """Test the size target, retained outliers and stratification of rare groups."""
+    rng = np.random.default_rng(0)
+    xy = np.vstack([rng.normal(size=(20000, 2)), [[12.0, 12.0], [-15.0, 2.0]]])
+    groups = np.array(["common"] * 20000 + ["common", "common"], dtype=object)
+    groups[:30] = "rare"
+
+    keep = downsample_points(xy, 2000, bins=50, groups=groups)
+    assert len(keep) <= 2000 and np.all(np.diff(keep) > 0)
+    assert {20000, 20001} <= set(keep)
+    assert (groups[keep] == "rare").sum() >= 1
+    np.testing.assert_array_equal(downsample_points(xy[:100], 2000), np.arange(100))
+
+
+def test_pca_scores_figure_switches_to_webgl_and_downsamples():
+    """Test SVG/WebGL switching and downsampling thresholds of the scores plot."""
+    rng = np.random.default_rng(1)
+    model = PCAModel(n_components=2).fit(rng.normal(size=(3000, 4)))
+    labels = np.where(rng.random(3000) < 0.5, "A", "B")
+
+    small = pca_scores_figure(model, labels, webgl_threshold=5000)
+    assert small.layout.meta["webgl"] is False and small.data[0].type == "scatter"
+
+    settings = get_viz_settings({"viz": {"webgl_threshold": 500, "downsample_threshold": 1000, "max_points": 800}})
+    fig = pca_scores_figure(model, labels, **settings)
+    assert fig.layout.meta["webgl"] is True and fig.data[0].type == "scattergl"
+    assert fig.layout.meta["n_points"] == 3000 and fig.layout.meta["n_shown"] <= 800
+    assert "of 3,000 samples" in fig.layout.title.text
+    assert sum(len(t.x) for t in fig.data) == fig.layout.meta["n_shown"]